@@ -128,12 +128,33 @@ async function loadSchedule() {
   const sidFromQuery = (params.get("sid") || "").trim();
   const sidFromCookie = (getCookie("sid") || "").trim();
   const sid = sidFromQuery || sidFromCookie;
-  if (sidFromQuery && sidFromQuery !== sidFromCookie) {
-    document.cookie = `sid=${encodeURIComponent(sidFromQuery)}; Max-Age=86400; Path=/; SameSite=Lax`;
-  }
   const hasSid = Boolean(sid);
   const scheduleUrl = hasSid ? `/schedule/${encodeURIComponent(sid)}.json` : null;
 
+  const jobId = (params.get("job") || "").trim();
+  const refreshJobId = (params.get("refresh") || "").trim();
+  if (jobId || refreshJobId || params.has("freshness")) {
+    ["job", "refresh", "freshness"].forEach((key) => params.delete(key));
+    const query = params.toString();
+    window.history.replaceState(null, "", `${window.location.pathname}${query ? `?${query}` : ""}`);
+  }
+  let signedIn = !jobId;
+  if (jobId) {
+    const job = await waitForScrapeJob(jobId);
+    signedIn = Boolean(job && job.state === "done");
+    if (job && job.state === "failed") {
+      showError("Sign-in failed: the university system rejected the credentials or could not be reached.");
+      setTimeout(() => {
+        window.location.href = "/";
+      }, 4000);
+      return;
+    }
+  }
+  // Remembered only once the sign-in it came with has gone through.
+  if (signedIn && sidFromQuery && sidFromQuery !== sidFromCookie) {
+    document.cookie = `sid=${encodeURIComponent(sidFromQuery)}; Max-Age=86400; Path=/; SameSite=Lax`;
+  }
+
   let data = null;
   let notFound = false;
   try {
@@ -170,6 +191,32 @@ async function loadSchedule() {
     return;
   }
 
+  renderSchedule(data);
+  initAttendancePanel(data.timetable ? data.timetable.map(normalizeCourse) : []);
+  hideError();
+
+  // A stale schedule was served; re-render quietly once the background refresh lands.
+  if (refreshJobId) {
+    const job = await waitForScrapeJob(refreshJobId, { quiet: true });
+    if (job && job.state === "done") {
+      try {
+        // Unchanged scrapes don't rewrite the file, so only refetch when the log has a new entry.
+        const since = job.started_at || 0;
+        const log = await fetch(`/api/schedule/changes?since=${encodeURIComponent(since)}`);
+        const changed = !log.ok || ((await log.json()).changes || []).length > 0;
+        if (changed) {
+          const res = await fetch(scheduleUrl);
+          if (res.ok) renderSchedule(await res.json(), { isRefresh: true });
+        }
+      } catch (err) {
+        console.warn("Failed to reload refreshed schedule", err);
+      }
+    }
+  }
+}
+
+// isRefresh skips the goal planner, which wires its controls once per page load.
+function renderSchedule(data, { isRefresh = false } = {}) {
   const timetable = data.timetable || [];
   const normalizedTimetable = timetable.map(normalizeCourse);
 
@@ -177,11 +224,36 @@ async function loadSchedule() {
   renderWeeklyTimetable(normalizedTimetable);
   renderCourseList(normalizedTimetable, data.grades || []);
   const progressData = renderProgress(data.grades || []);
-  const courseCount = countCurrentCourses(normalizedTimetable);
-  renderGoalPlanner(progressData, courseCount, normalizedTimetable, data.grades || []);
-  initAttendancePanel(normalizedTimetable);
+  if (!isRefresh) {
+    const courseCount = countCurrentCourses(normalizedTimetable);
+    renderGoalPlanner(progressData, courseCount, normalizedTimetable, data.grades || []);
+  }
   renderDegreeSummary();
-  hideError();
+}
+
+// Poll a login-triggered scrape job until it settles; resolves with the job (or null).
+async function waitForScrapeJob(jobId, { intervalMs = 1000, timeoutMs = 180000, quiet = false } = {}) {
+  const deadline = Date.now() + timeoutMs;
+  if (!quiet) showError("Fetching your schedule from the university system…");
+  try {
+    while (Date.now() < deadline) {
+      try {
+        const res = await fetch(`/api/scrape-jobs/${encodeURIComponent(jobId)}`);
+        if (res.status === 404) return null;
+        if (res.ok) {
+          const data = await res.json();
+          const job = data && data.job;
+          if (job && (job.state === "done" || job.state === "failed")) return job;
+        }
+      } catch (err) {
+        console.warn("Failed to poll scrape job", err);
+      }
+      await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+    return null;
+  } finally {
+    if (!quiet) hideError();
+  }
 }
 
 function normalizeDayLabel(value) {
@@ -678,9 +750,13 @@ function initMapViewer() {
   });
 
   viewer.addEventListener("error", () => {
+    // A missing preview is not fatal; the full model is on its way.
+    if (viewer.dataset.previewSrc && viewer.src.endsWith(viewer.dataset.previewSrc)) return;
     if (supportMsg) supportMsg.classList.remove("hidden");
   });
 
+  loadCampusModel(viewer, document.getElementById("mapLoadProgress"));
+
   if (resetBtn) {
     resetBtn.addEventListener("click", () => {
       if (defaults.orbit) viewer.setAttribute("camera-orbit", defaults.orbit);
@@ -691,6 +767,78 @@ function initMapViewer() {
   }
 }
 
+// Render the low-detail preview at once, then swap in the full model when it has
+// arrived. The full download resumes with Range/If-Range after a dropped connection.
+async function loadCampusModel(viewer, progressEl) {
+  const fullSrc = viewer.dataset.src;
+  const previewSrc = viewer.dataset.previewSrc;
+  if (!fullSrc) return;
+  if (!previewSrc || !window.fetch || !window.ReadableStream) {
+    viewer.src = fullSrc;
+    return;
+  }
+  viewer.src = previewSrc;
+
+  const showProgress = (loaded, total) => {
+    if (!progressEl) return;
+    progressEl.classList.remove("hidden");
+    progressEl.textContent = total
+      ? `Loading detailed model… ${Math.min(100, Math.round((loaded / total) * 100))}%`
+      : `Loading detailed model… ${(loaded / 1048576).toFixed(1)} MB`;
+  };
+  try {
+    // Hand the viewer the bytes already downloaded instead of having it fetch them again.
+    viewer.src = URL.createObjectURL(await downloadResumable(fullSrc, showProgress));
+  } catch (err) {
+    console.warn("Falling back to loading the model directly", err);
+    viewer.src = fullSrc;
+  } finally {
+    if (progressEl) progressEl.classList.add("hidden");
+  }
+}
+
+async function downloadResumable(url, onProgress, { attempts = 5 } = {}) {
+  let chunks = [];
+  let received = 0;
+  let total = 0;
+  let etag = "";
+  for (let attempt = 0; attempt < attempts; attempt++) {
+    const headers = {};
+    if (received > 0) {
+      headers.Range = `bytes=${received}-`;
+      if (etag) headers["If-Range"] = etag;
+    }
+    try {
+      const res = await fetch(url, { headers });
+      if (res.status === 206 && received > 0) {
+        const range = /\/(\d+)$/.exec(res.headers.get("Content-Range") || "");
+        if (range) total = Number(range[1]);
+      } else if (res.ok) {
+        // Full body: a fresh start, or the file changed and If-Range sent all of it.
+        chunks = [];
+        received = 0;
+        total = res.headers.get("Content-Encoding") ? 0 : Number(res.headers.get("Content-Length")) || 0;
+      } else {
+        throw new Error(`HTTP ${res.status}`);
+      }
+      etag = res.headers.get("ETag") || etag;
+      const reader = res.body.getReader();
+      for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        chunks.push(value);
+        received += value.length;
+        onProgress(received, total);
+      }
+      return new Blob(chunks, { type: "model/gltf-binary" });
+    } catch (err) {
+      if (attempt === attempts - 1) throw err;
+      await new Promise((resolve) => setTimeout(resolve, 1000 * 2 ** attempt));
+    }
+  }
+  throw new Error("download failed");
+}
+
 function initMobileMenu() {
   const toggle = document.getElementById("menuToggle");
   const overlay = document.getElementById("mobileMenuOverlay");
@@ -722,35 +870,93 @@ function initMobileMenu() {
 }
 
 let __teacherAttendancePoller = null;
+let __teacherAttendanceStream = null;
+
+function sortRoster(roster) {
+  return Array.from(roster.values()).sort((a, b) =>
+    (a.name || a.id).toLowerCase().localeCompare((b.name || b.id).toLowerCase())
+  );
+}
 
+// Live roster: Server-Sent Events when available, 3-second polling as the fallback.
 function startTeacherAttendancePolling(sessionId) {
   const renderStudentList = window.renderStudentList;
   const handleTeacherStatus = window.handleTeacherStatus;
   if (!sessionId || typeof renderStudentList !== "function") return;
 
+  const applyStatus = (data) => {
+    if (handleTeacherStatus && typeof handleTeacherStatus === "function") {
+      handleTeacherStatus(data);
+    } else if (data && Array.isArray(data.students)) {
+      renderStudentList(data.students);
+    }
+  };
+
   const fetchStatus = async () => {
     try {
       const res = await fetch(`/api/teacher/attendance/${encodeURIComponent(sessionId)}/status`);
       if (!res.ok) return;
-      const data = await res.json();
-      if (handleTeacherStatus && typeof handleTeacherStatus === "function") {
-        handleTeacherStatus(data);
-      } else if (data && Array.isArray(data.students)) {
-        renderStudentList(data.students);
-      }
+      applyStatus(await res.json());
     } catch (err) {
       console.warn("Failed to refresh attendance status", err);
     }
   };
 
-  if (__teacherAttendancePoller) {
-    clearInterval(__teacherAttendancePoller);
-  }
-  fetchStatus();
-  __teacherAttendancePoller = setInterval(fetchStatus, 3000);
-  window.addEventListener("beforeunload", () => {
+  const startPolling = () => {
     if (__teacherAttendancePoller) clearInterval(__teacherAttendancePoller);
-  });
+    fetchStatus();
+    __teacherAttendancePoller = setInterval(fetchStatus, 3000);
+  };
+
+  stopTeacherAttendancePolling();
+  if (typeof window.EventSource !== "function") {
+    startPolling();
+  } else {
+    const roster = new Map();
+    const stream = new EventSource(`/api/teacher/attendance/${encodeURIComponent(sessionId)}/events`);
+    __teacherAttendanceStream = stream;
+    const parse = (evt) => {
+      try {
+        return JSON.parse(evt.data);
+      } catch (err) {
+        return null;
+      }
+    };
+    stream.addEventListener("snapshot", (evt) => {
+      const data = parse(evt);
+      if (!data) return;
+      roster.clear();
+      (data.students || []).forEach((s) => roster.set(s.id, s));
+      applyStatus(data);
+      if (data.active === false) {
+        stream.close();
+        __teacherAttendanceStream = null;
+      }
+    });
+    stream.addEventListener("checkin", (evt) => {
+      const student = parse(evt);
+      if (!student || !student.id) return;
+      roster.set(student.id, student);
+      applyStatus({ students: sortRoster(roster) });
+    });
+    stream.addEventListener("code", (evt) => {
+      const data = parse(evt);
+      if (data && data.current_code) applyStatus({ current_code: data.current_code });
+    });
+    stream.addEventListener("stopped", () => {
+      stream.close();
+      __teacherAttendanceStream = null;
+    });
+    stream.onerror = () => {
+      // EventSource retries transient drops itself; CLOSED means it gave up.
+      if (stream.readyState === EventSource.CLOSED && __teacherAttendanceStream === stream) {
+        __teacherAttendanceStream = null;
+        startPolling();
+      }
+    };
+  }
+
+  window.addEventListener("beforeunload", stopTeacherAttendancePolling);
 }
 
 function stopTeacherAttendancePolling() {
@@ -758,6 +964,10 @@ function stopTeacherAttendancePolling() {
     clearInterval(__teacherAttendancePoller);
     __teacherAttendancePoller = null;
   }
+  if (__teacherAttendanceStream) {
+    __teacherAttendanceStream.close();
+    __teacherAttendanceStream = null;
+  }
 }
 
 function initTeacherAttendancePolling() {
@@ -776,6 +986,7 @@ document.addEventListener("DOMContentLoaded", () => {
     initMapViewer();
     initRunnerGame("runnerGameSmall", "gameStartBtnSmall", { height: 140 });
     initMobileMenu();
+    initOfflineAttendance();
   }
   initTeacherAttendancePolling();
 });
@@ -799,6 +1010,7 @@ async function giveAttendance() {
     return;
   }
 
+  const attemptedAt = Date.now();
   if (statusEl) statusEl.textContent = "Sending attendance…";
   if (statusTextEl) statusTextEl.textContent = "Sending attendance…";
   if (statusSubEl) statusSubEl.textContent = "";
@@ -830,13 +1042,145 @@ async function giveAttendance() {
     }
   } catch (err) {
     console.error(err);
-    if (statusEl) statusEl.textContent = "❌ Network error. Try again.";
-    if (statusTextEl) statusTextEl.textContent = "Network error. Try again.";
-    if (statusSubEl) statusSubEl.textContent = "";
+    // Offline or a dropped connection: keep the attempt and send it when back online.
+    const queued = await queueOfflineCheckin(sessionToken, attemptedAt);
+    if (queued) {
+      if (statusEl) statusEl.textContent = "🕓 Saved offline. It will be sent when you're back online.";
+      if (statusTextEl) statusTextEl.textContent = "Saved offline — will send when you're back online.";
+      if (statusSubEl) statusSubEl.textContent = "Keep this page open or come back to it later.";
+    } else {
+      if (statusEl) statusEl.textContent = "❌ Network error. Try again.";
+      if (statusTextEl) statusTextEl.textContent = "Network error. Try again.";
+      if (statusSubEl) statusSubEl.textContent = "";
+    }
     if (statusDot) statusDot.classList.remove("active");
   }
 }
 
+// -------- Offline check-in queue --------
+// Attempts made without a connection are kept in localStorage; the server checks each
+// code against the window that was current when it was typed in and refuses attempts
+// older than a few minutes. Each attempt names the account it was made by, so a queue
+// left on a shared device is never credited to the next person who logs in.
+const ATTENDANCE_QUEUE_KEY = "attendance-offline-queue";
+const ATTENDANCE_BATCH_SIZE = 50;
+let __attendanceFlushTimer = null;
+let __attendanceFlushing = false;
+
+function readAttendanceQueue() {
+  try {
+    const queue = JSON.parse(localStorage.getItem(ATTENDANCE_QUEUE_KEY) || "[]");
+    return Array.isArray(queue) ? queue : [];
+  } catch (_) {
+    return [];
+  }
+}
+
+function writeAttendanceQueue(queue) {
+  if (queue.length) {
+    localStorage.setItem(ATTENDANCE_QUEUE_KEY, JSON.stringify(queue));
+  } else {
+    localStorage.removeItem(ATTENDANCE_QUEUE_KEY);
+  }
+}
+
+function loggedInStudentId() {
+  const match = document.cookie.match(/(?:^|;\s*)sid=([^;]*)/);
+  return match ? decodeURIComponent(match[1]) : "";
+}
+
+function currentPosition(timeoutMs) {
+  return new Promise((resolve) => {
+    if (!navigator.geolocation) return resolve(null);
+    navigator.geolocation.getCurrentPosition(
+      (pos) => resolve(pos.coords),
+      () => resolve(null),
+      { enableHighAccuracy: true, timeout: timeoutMs, maximumAge: 60000 }
+    );
+  });
+}
+
+async function queueOfflineCheckin(sessionToken, attemptedAt) {
+  const studentId = loggedInStudentId();
+  if (!studentId) return false;
+
+  const coords = await currentPosition(5000);
+  try {
+    const queue = readAttendanceQueue();
+    queue.push({
+      student_id: studentId,
+      code: sessionToken,
+      at: attemptedAt,
+      lat: coords ? Number(coords.latitude.toFixed(6)) : null,
+      lng: coords ? Number(coords.longitude.toFixed(6)) : null,
+    });
+    writeAttendanceQueue(queue);
+  } catch (err) {
+    console.error(err);
+    return false;
+  }
+  scheduleAttendanceFlush();
+  return true;
+}
+
+function scheduleAttendanceFlush() {
+  if (__attendanceFlushTimer || !readAttendanceQueue().length) return;
+  __attendanceFlushTimer = setInterval(flushAttendanceQueue, 30000);
+}
+
+async function flushAttendanceQueue() {
+  if (__attendanceFlushing || navigator.onLine === false) return;
+  let queue = readAttendanceQueue();
+  if (!queue.length) {
+    clearInterval(__attendanceFlushTimer);
+    __attendanceFlushTimer = null;
+    return;
+  }
+  __attendanceFlushing = true;
+  let recorded = 0;
+  try {
+    while (queue.length) {
+      const batch = queue.slice(0, ATTENDANCE_BATCH_SIZE);
+      const res = await fetch("/api/student/attendance/checkin/batch", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ sent_at: Date.now(), checkins: batch }),
+      });
+      // Not logged in, server trouble or a race with a stopping session: try again later.
+      if (res.status === 401 || res.status === 409 || res.status >= 500) break;
+      const data = await res.json();
+      // Every other answer is final for the attempts in this batch.
+      recorded += data.ok ? (data.results || []).filter((r) => r && r.ok).length : 0;
+      queue = queue.slice(batch.length);
+      writeAttendanceQueue(queue);
+    }
+  } catch (_) {
+    // Still offline; the timer or the next "online" event retries.
+  } finally {
+    __attendanceFlushing = false;
+  }
+
+  if (recorded) {
+    const statusTextEl = document.getElementById("attendanceStatusText");
+    const statusSubEl = document.getElementById("attendanceSubtext");
+    const statusDot = document.getElementById("attendanceStatusDot");
+    if (statusTextEl) statusTextEl.textContent = "Offline attendance recorded successfully.";
+    if (statusSubEl) statusSubEl.textContent = "Sent after reconnecting.";
+    if (statusDot) statusDot.classList.add("active");
+  }
+  if (!readAttendanceQueue().length && __attendanceFlushTimer) {
+    clearInterval(__attendanceFlushTimer);
+    __attendanceFlushTimer = null;
+  }
+}
+
+function initOfflineAttendance() {
+  if (!document.getElementById("session-token-input")) return;
+  window.addEventListener("online", flushAttendanceQueue);
+  flushAttendanceQueue();
+  scheduleAttendanceFlush();
+}
+
 function renderGoalPlanner(progressData, courseCountOverride = 0, timetable = [], grades = []) {
   const gpaEl = document.getElementById("plannerCurrentGpa");
   const creditsEl = document.getElementById("plannerCompletedCredits");
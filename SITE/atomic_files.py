@@ -0,0 +1,35 @@
+"""
+Atomic file replacement shared by every module that rewrites a file in place.
+
+The payload is written to a temp file next to the target, which then replaces it
+with os.replace, so a reader sees the old file or the new one and never a partial
+write. The temp file is removed when anything on the way fails.
+"""
+import os
+import threading
+
+
+def atomic_write(path: str, payload, fsync: bool = False) -> None:
+    """
+    Replace path with payload (bytes, or str written as UTF-8), creating its directory.
+    fsync=True forces the data to disk before the rename, for callers that are about
+    to drop another copy of it.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    data = payload.encode("utf-8") if isinstance(payload, str) else payload
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
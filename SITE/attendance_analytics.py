@@ -0,0 +1,332 @@
+"""
+Precomputed attendance analytics per term/course/section/teacher/student.
+
+Aggregates are updated incrementally as each session is stopped and persisted to
+data/attendance_analytics.json, so every query is a walk over one course's student
+counters rather than over data/attendance_history:
+
+  {"version": 2,
+   "courses": {"2026-08|190-203|B|T1": {"term", "course_code", "section", "teacher_id",
+                             "sessions": [{"session_id", "date", "head_count"}, ...],
+                             "students": {student_id: {"name", "present", "late",
+                                                        "late_minutes", "streak",
+                                                        "best_streak", "last_index"}}}}}
+
+A term is named by the month it starts in (ATTENDANCE_TERM_START_MONTHS, "1,6,8" by
+default: second semester, summer, first semester), and a session belongs to the term
+of its start date. Each teacher's sessions are aggregated separately, so a report
+only ever covers the asking teacher's own sessions; sessions nobody owns form their
+own aggregate, which every teacher may read. Only
+the newest ATTENDANCE_ANALYTICS_TERMS terms are kept; the session lists double as
+the record of what has been counted, so that record is pruned along with them.
+
+A student's roster is everyone who has checked in to the course at least once;
+`total` is every session of that aggregate. Sessions are numbered (for streaks) in
+the order they were stopped, which is the order record_session sees them, and
+rebuild replays the archives in that same order.
+
+Usage:
+  python attendance_analytics.py rebuild [--db data/attendance.sqlite3]
+"""
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from atomic_files import atomic_write
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ANALYTICS_PATH = os.path.join(BASE_DIR, "data", "attendance_analytics.json")
+# A check-in more than this many minutes after the session started counts as late.
+LATE_AFTER_MINUTES = int(os.environ.get("ATTENDANCE_LATE_AFTER_MINUTES", "15"))
+# Months (1-12) in which a term starts, and how many of the newest terms are kept.
+TERM_START_MONTHS = sorted({int(m) for m in os.environ.get("ATTENDANCE_TERM_START_MONTHS", "1,6,8").split(",") if m.strip()})
+KEEP_TERMS = int(os.environ.get("ATTENDANCE_ANALYTICS_TERMS", "4"))
+FORMAT_VERSION = 2
+
+
+def term_of(date: str) -> str:
+    """The term a YYYY-MM-DD date falls in, named by its first month ("2026-08"); "" if unparseable."""
+    try:
+        year, month = int(date[:4]), int(date[5:7])
+    except (TypeError, ValueError):
+        return ""
+    started = [m for m in TERM_START_MONTHS if m <= month]
+    if started:
+        return f"{year:04d}-{started[-1]:02d}"
+    return f"{year - 1:04d}-{TERM_START_MONTHS[-1]:02d}"
+
+
+def current_term() -> str:
+    return term_of(datetime.now().strftime("%Y-%m-%d"))
+
+
+def course_key(term: str, course_code: str, section: str, teacher_id: str) -> str:
+    return f"{term}|{(course_code or '').strip().upper()}|{(section or '').strip().upper()}|{(teacher_id or '').strip()}"
+
+
+def _doc_key(doc: dict) -> str:
+    return course_key(
+        term_of((doc.get("timestamp") or "")[:10]),
+        doc.get("course_code") or doc.get("course_id") or "",
+        doc.get("section") or "",
+        doc.get("teacher_id") or "",
+    )
+
+
+def minutes_after_start(session_timestamp: str, checkin_time: str) -> Optional[int]:
+    """
+    Minutes between the session start (UTC ISO timestamp, as start_session writes it)
+    and a check-in "HH:MM" (server local time, as student_checkin writes it).
+    """
+    try:
+        started = datetime.fromisoformat(session_timestamp).replace(tzinfo=timezone.utc).astimezone()
+        hour, minute = (int(part) for part in checkin_time.split(":")[:2])
+    except (TypeError, ValueError):
+        return None
+    checked_in = started.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    delta = checked_in - started
+    # A check-in just past local midnight belongs to the next day, and vice versa.
+    if delta < timedelta(hours=-12):
+        delta += timedelta(days=1)
+    elif delta > timedelta(hours=12):
+        delta -= timedelta(days=1)
+    return int(delta.total_seconds() // 60)
+
+
+class AttendanceAnalytics:
+    def __init__(self, path: str = DEFAULT_ANALYTICS_PATH, logger=None):
+        self.path = path
+        self.logger = logger
+        self._lock = threading.Lock()
+        # False when the file is missing, unreadable or in an older format: rebuild it.
+        self.loaded = False
+        self._data = self._load()
+        self._processed = {s["session_id"] for c in self._data["courses"].values() for s in c["sessions"]}
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict) and data.get("version") == FORMAT_VERSION and isinstance(data.get("courses"), dict):
+                self.loaded = True
+                return data
+        except FileNotFoundError:
+            pass
+        except Exception:
+            if self.logger is not None:
+                self.logger.exception("Failed to read attendance analytics")
+        return {"version": FORMAT_VERSION, "courses": {}}
+
+    def _save(self) -> None:
+        atomic_write(self.path, json.dumps(self._data, ensure_ascii=False, separators=(",", ":")))
+
+    # -------- Updates --------
+    def _apply(self, doc: dict) -> bool:
+        session_id = doc.get("session_id") or ""
+        if not session_id or session_id in self._processed:
+            return False
+        timestamp = doc.get("timestamp") or ""
+        course = self._data["courses"].setdefault(
+            _doc_key(doc),
+            {
+                "term": term_of(timestamp[:10]),
+                "course_code": doc.get("course_code") or doc.get("course_id") or "",
+                "section": doc.get("section") or "",
+                "teacher_id": (doc.get("teacher_id") or "").strip(),
+                "sessions": [],
+                "students": {},
+            },
+        )
+        index = len(course["sessions"])
+        present = {
+            sid: info
+            for sid, info in (doc.get("students") or {}).items()
+            if isinstance(info, dict) and (info.get("status") or "present") == "present"
+        }
+        course["sessions"].append({"session_id": session_id, "date": timestamp[:10], "head_count": len(present)})
+        for sid, info in present.items():
+            self._count_present(course, index, timestamp, sid, info)
+        self._processed.add(session_id)
+        return True
+
+    def _prune(self) -> None:
+        """Drop every aggregate older than the newest KEEP_TERMS terms."""
+        courses = self._data["courses"]
+        kept = sorted({c["term"] for c in courses.values()}, reverse=True)[: max(1, KEEP_TERMS)]
+        for key in [k for k, c in courses.items() if c["term"] not in kept]:
+            for s in courses.pop(key)["sessions"]:
+                self._processed.discard(s["session_id"])
+
+    @staticmethod
+    def _count_present(course: dict, index: int, timestamp: str, student_id: str, info: dict) -> None:
+        student = course["students"].setdefault(
+            student_id, {"name": student_id, "present": 0, "late": 0, "late_minutes": 0, "streak": 0, "best_streak": 0, "last_index": -1}
+        )
+        student["name"] = info.get("name") or student["name"]
+        student["present"] += 1
+        student["streak"] = student["streak"] + 1 if student["last_index"] == index - 1 else 1
+        student["best_streak"] = max(student["best_streak"], student["streak"])
+        student["last_index"] = index
+        late_by = minutes_after_start(timestamp, info.get("time") or "")
+        if late_by is not None and late_by > LATE_AFTER_MINUTES:
+            student["late"] += 1
+            student["late_minutes"] += late_by
+
+    def record_session(self, doc: dict) -> bool:
+        """Fold one stopped session into the aggregates (a session is only counted once)."""
+        with self._lock:
+            changed = self._apply(doc)
+            if changed:
+                self._prune()
+                self._save()
+            return changed
+
+    def record_checkin(self, doc: dict, student_id: str, info: dict) -> bool:
+        """
+        Count a check-in added to an archived session after it was recorded (an offline
+        claim replayed after the stop); doc is the archive, check-in included. Only the
+        newest session of a course can be amended in place: False means the caller
+        should rebuild instead.
+        """
+        with self._lock:
+            session_id = doc.get("session_id") or ""
+            if session_id not in self._processed:
+                changed = self._apply(doc)
+                if changed:
+                    self._prune()
+            else:
+                course = self._data["courses"].get(_doc_key(doc))
+                sessions = course["sessions"] if course else []
+                if not sessions or sessions[-1]["session_id"] != session_id:
+                    return False
+                index = len(sessions) - 1
+                student = course["students"].get(student_id)
+                changed = (info.get("status") or "present") == "present" and (student is None or student["last_index"] != index)
+                if changed:
+                    sessions[index]["head_count"] += 1
+                    self._count_present(course, index, doc.get("timestamp") or "", student_id, info)
+            if changed:
+                self._save()
+            return True
+
+    def rebuild(self, docs) -> int:
+        """Recompute everything from archived session documents."""
+        ordered = sorted(docs, key=lambda d: (d.get("stopped_at") or d.get("timestamp") or "", d.get("session_id") or ""))
+        with self._lock:
+            self._data = {"version": FORMAT_VERSION, "courses": {}}
+            self._processed = set()
+            for doc in ordered:
+                self._apply(doc)
+            self._prune()
+            self._save()
+            self.loaded = True
+            return len(self._processed)
+
+    # -------- Queries --------
+    @staticmethod
+    def _visible(course: dict, teacher_id: Optional[str]) -> bool:
+        """Own sessions and sessions nobody owns, like list_history; None sees everything."""
+        return teacher_id is None or course["teacher_id"] in ("", teacher_id)
+
+    def _find(self, term: str, course_code: str, section: str, teacher_id: Optional[str]) -> Optional[dict]:
+        courses = self._data["courses"]
+        return courses.get(course_key(term, course_code, section, teacher_id or "")) or courses.get(
+            course_key(term, course_code, section, "")
+        )
+
+    @staticmethod
+    def _student_row(student_id: str, student: dict, total: int) -> dict:
+        last = total - 1
+        present = student["present"]
+        return {
+            "student_id": student_id,
+            "name": student["name"],
+            "present": present,
+            "total": total,
+            "rate": round(present / total, 4) if total else 0.0,
+            "current_streak": student["streak"] if student["last_index"] == last else 0,
+            "best_streak": student["best_streak"],
+            "consecutive_absences": last - student["last_index"],
+            "late": student["late"],
+            "avg_late_minutes": round(student["late_minutes"] / student["late"], 1) if student["late"] else 0.0,
+        }
+
+    def courses(self, teacher_id: Optional[str] = None, term: Optional[str] = None) -> List[dict]:
+        """Aggregates visible to teacher_id, in one term or (term=None) in every kept term."""
+        with self._lock:
+            out = []
+            for course in self._data["courses"].values():
+                if not self._visible(course, teacher_id) or (term is not None and course["term"] != term):
+                    continue
+                sessions = course["sessions"]
+                out.append(
+                    {
+                        "term": course["term"],
+                        "teacher_id": course["teacher_id"],
+                        "course_code": course["course_code"],
+                        "section": course["section"],
+                        "sessions": len(sessions),
+                        "students": len(course["students"]),
+                        "avg_head_count": round(sum(s["head_count"] for s in sessions) / len(sessions), 1) if sessions else 0.0,
+                        "first_date": sessions[0]["date"] if sessions else "",
+                        "last_date": sessions[-1]["date"] if sessions else "",
+                    }
+                )
+            return sorted(out, key=lambda c: (c["term"], c["course_code"], c["section"], c["teacher_id"]))
+
+    def course_report(
+        self, course_code: str, section: str, teacher_id: Optional[str] = None, term: Optional[str] = None
+    ) -> Optional[dict]:
+        """
+        Per-student rate, streaks and late arrivals for one course/section in one term
+        (the current one by default), over teacher_id's sessions or, failing those, the
+        ones nobody owns. None when there are none.
+        """
+        with self._lock:
+            course = self._find(term or current_term(), course_code, section, teacher_id)
+            if course is None:
+                return None
+            total = len(course["sessions"])
+            students = [self._student_row(sid, s, total) for sid, s in course["students"].items()]
+            return {
+                "term": course["term"],
+                "course_code": course["course_code"],
+                "section": course["section"],
+                "sessions": total,
+                "late_after_minutes": LATE_AFTER_MINUTES,
+                "students": sorted(students, key=lambda r: (r["name"] or r["student_id"]).lower()),
+            }
+
+    def at_risk(
+        self,
+        course_code: str,
+        section: str,
+        threshold: float = 0.8,
+        teacher_id: Optional[str] = None,
+        term: Optional[str] = None,
+    ) -> Optional[List[dict]]:
+        """Students below threshold, lowest rate first."""
+        report = self.course_report(course_code, section, teacher_id, term)
+        if report is None:
+            return None
+        rows = [r for r in report["students"] if r["rate"] < threshold]
+        return sorted(rows, key=lambda r: (r["rate"], -r["consecutive_absences"], r["student_id"]))
+
+
+if __name__ == "__main__":
+    import sys
+
+    import attendance_store
+
+    args = sys.argv[1:]
+    if not args or args[0] != "rebuild":
+        print("Usage: python attendance_analytics.py rebuild [--db PATH]")
+        sys.exit(2)
+    if "--db" in args[:-1]:
+        store = attendance_store.SqliteAttendanceStore(args[args.index("--db") + 1])
+    else:
+        store = attendance_store.JsonAttendanceStore()
+    count = AttendanceAnalytics().rebuild(store.list_history(None))
+    print(f"Rebuilt analytics from {count} archived sessions")
@@ -0,0 +1,99 @@
+"""
+In-process event bus for live attendance sessions, consumed by the teacher page's
+Server-Sent Events stream.
+
+Events are (seq, type, data) with one sequence counter for the whole process, so an
+SSE id is just "{boot}-{seq}". A reconnecting client sends its Last-Event-ID and gets
+the events it missed replayed from a bounded per-session backlog; if the id is from an
+earlier server process or has fallen out of the backlog, the caller sends a fresh
+snapshot instead.
+"""
+import threading
+import time
+import uuid
+from collections import deque
+from typing import List, Optional
+
+EVENT_BACKLOG = 500  # events kept per session for replay
+CLOSED_RETENTION_SECONDS = 10 * 60  # stopped sessions stay replayable this long
+
+
+class SessionEventBus:
+    def __init__(self, backlog: int = EVENT_BACKLOG):
+        self.backlog = backlog
+        self.boot = uuid.uuid4().hex[:8]
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._events: dict = {}  # session_id -> deque[(seq, type, data)]
+        self._evicted: dict = {}  # session_id -> highest seq dropped from the backlog
+        self._closed: dict = {}  # session_id -> time the session stopped
+        self._stats = {"published": 0, "streams": 0, "streams_open": 0}
+
+    # -------- Ids --------
+    def format_id(self, seq: int) -> str:
+        return f"{self.boot}-{seq}"
+
+    def parse_id(self, event_id: str) -> Optional[int]:
+        """Sequence number of an id issued by this process, else None."""
+        boot, _, seq = (event_id or "").partition("-")
+        if boot != self.boot or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def current_seq(self) -> int:
+        with self._cond:
+            return self._seq
+
+    # -------- Publish / consume --------
+    def publish(self, session_id: str, event: str, data: dict, closes: bool = False) -> int:
+        with self._cond:
+            self._prune()
+            self._seq += 1
+            events = self._events.setdefault(session_id, deque())
+            events.append((self._seq, event, data))
+            if len(events) > self.backlog:
+                self._evicted[session_id] = events.popleft()[0]
+            if closes:
+                self._closed[session_id] = time.time()
+            self._stats["published"] += 1
+            self._cond.notify_all()
+            return self._seq
+
+    def events_after(self, session_id: str, seq: int) -> Optional[List[tuple]]:
+        """Events for session_id newer than seq, or None if some were already evicted."""
+        with self._cond:
+            if seq < self._evicted.get(session_id, 0):
+                return None
+            return [e for e in self._events.get(session_id, ()) if e[0] > seq]
+
+    def wait(self, session_id: str, seq: int, timeout: float) -> List[tuple]:
+        """Block up to timeout for events newer than seq."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                events = [e for e in self._events.get(session_id, ()) if e[0] > seq]
+                remaining = deadline - time.monotonic()
+                if events or remaining <= 0:
+                    return events
+                self._cond.wait(remaining)
+
+    def _prune(self) -> None:
+        cutoff = time.time() - CLOSED_RETENTION_SECONDS
+        for session_id in [sid for sid, closed_at in self._closed.items() if closed_at < cutoff]:
+            self._closed.pop(session_id, None)
+            self._events.pop(session_id, None)
+            self._evicted.pop(session_id, None)
+
+    # -------- Stream accounting --------
+    def stream_opened(self) -> None:
+        with self._cond:
+            self._stats["streams"] += 1
+            self._stats["streams_open"] += 1
+
+    def stream_closed(self) -> None:
+        with self._cond:
+            self._stats["streams_open"] -= 1
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"sessions": len(self._events), "seq": self._seq, **self._stats}
@@ -0,0 +1,916 @@
+"""
+Attendance storage backends.
+
+A session is the JSON document the server has always used:
+
+  {"session_id", "course_id", "course_title", "course_code", "section", "teacher_id",
+   "timestamp", "active", "stopped_at", "code_secret", "last_checkin_at",
+   "students": {student_id: {"name", "status", "time"}}}
+
+last_checkin_at (epoch seconds of the newest check-in) is maintained by the store.
+
+JsonAttendanceStore keeps one file per session in data/attendance/ and archived copies
+in data/attendance_history/ (the original layout, handy for development). Check-ins
+are appended to {session_id}.log next to the session file and folded in on read; the
+log is compacted into the document every CHECKIN_LOG_COMPACT_LINES lines and on archive.
+Archives are listed from a catalog (data/attendance_history_catalog.json) that is
+updated on archive and rebuilt from the files when missing or on request.
+SqliteAttendanceStore keeps sessions and check-ins as rows in a WAL-mode database, so
+a check-in is a single-row upsert instead of a rewrite of the whole document.
+
+Usage:
+  python attendance_store.py migrate [--db data/attendance.sqlite3]   # import JSON files into SQLite
+  python attendance_store.py rebuild-catalog                          # re-index JSON history archives
+"""
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Iterator, List, Optional
+
+from atomic_files import atomic_write
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ATTENDANCE_DIR = os.path.join(BASE_DIR, "data", "attendance")
+DEFAULT_HISTORY_DIR = os.path.join(BASE_DIR, "data", "attendance_history")
+DEFAULT_DB_PATH = os.path.join(BASE_DIR, "data", "attendance.sqlite3")
+DEFAULT_CATALOG_PATH = os.path.join(BASE_DIR, "data", "attendance_history_catalog.json")
+
+CHECKIN_LOG_COMPACT_LINES = int(os.environ.get("CHECKIN_LOG_COMPACT_LINES", "256"))
+
+# Columns of the sessions table; any other document key is kept in sessions.extra.
+SESSION_FIELDS = ("course_id", "course_title", "course_code", "section", "teacher_id", "timestamp", "stopped_at")
+
+
+def _history_filename(payload: dict, session_id: str) -> str:
+    def clean(value: str) -> str:
+        return "".join(ch for ch in (value or "") if ch.isalnum() or ch in ("-", "_"))
+
+    course_code = clean(payload.get("course_code") or payload.get("course_id") or "course")
+    section = clean(payload.get("section") or "sec")
+    date_str = time.strftime("%Y%m%d", time.gmtime())
+    return f"{course_code or 'course'}_{section or 'sec'}_{date_str}_{session_id}.json"
+
+
+# Fields of a history catalog entry (plus head_count and, for JSON, the archive file).
+CATALOG_FIELDS = ("session_id", "teacher_id", "course_id", "course_title", "course_code", "section", "timestamp", "stopped_at")
+
+
+def _catalog_entry(doc: dict, session_id: str) -> dict:
+    entry = {field: str(doc.get(field) or "") for field in CATALOG_FIELDS}
+    entry["session_id"] = entry["session_id"] or session_id
+    entry["head_count"] = len(doc.get("students") or {})
+    return entry
+
+
+def _sort_key(entry: dict) -> str:
+    return entry.get("stopped_at") or entry.get("timestamp") or ""
+
+
+def encode_cursor(entry: dict) -> str:
+    raw = json.dumps([_sort_key(entry), entry["session_id"]], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[tuple]:
+    """(sort_key, session_id) of the last entry on the previous page, or None if invalid."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_key, session_id = json.loads(raw)
+        return str(sort_key), str(session_id)
+    except (ValueError, TypeError):
+        return None
+
+
+class AttendanceStore(ABC):
+    """Interface shared by the backends."""
+
+    name = "base"
+
+    @abstractmethod
+    def load_session(self, session_id: str) -> Optional[dict]:
+        """The live session document with its check-ins, or None."""
+
+    @abstractmethod
+    def save_session(self, session_id: str, payload: dict) -> None:
+        """Create or replace a session document (start/stop); check-ins already recorded are kept."""
+
+    @abstractmethod
+    def active_sessions(self) -> Iterator[tuple]:
+        """(session_id, document) for every session that has not been stopped."""
+
+    @abstractmethod
+    def record_checkin(self, session_id: str, student_id: str, record: dict) -> None:
+        """
+        Set students[student_id] = record without losing concurrent check-ins; a student
+        who already checked in keeps the first record. Raises KeyError once the session
+        is stopped or archived.
+        """
+
+    @abstractmethod
+    def record_checkins(self, checkins: List[tuple]) -> None:
+        """
+        Apply many (session_id, student_id, record) check-ins at once: all of them or,
+        if any session is missing (KeyError), none.
+        """
+
+    @abstractmethod
+    def stop_session(self, session_id: str, fields: dict) -> Optional[dict]:
+        """
+        Mark a session stopped (active False plus fields) only if it is still active, and
+        return the stopped document with its check-ins. None when it was already stopped
+        or is gone, so of two concurrent stops exactly one goes on to archive it.
+        Check-ins for a stopped session raise KeyError.
+        """
+
+    @abstractmethod
+    def archive_session(self, session_id: str, payload: dict) -> None:
+        """Move a stopped session into history, with every check-in recorded until now."""
+
+    @abstractmethod
+    def record_late_checkin(self, session_id: str, student_id: str, record: dict) -> bool:
+        """
+        Add a check-in made before the stop to an archived session, unless the student
+        already has one. Returns whether it was added; KeyError if it is not archived.
+        """
+
+    def prune_stopped(self) -> int:
+        """Drop live copies of sessions that are stopped and archived; returns how many."""
+        return 0
+
+    @abstractmethod
+    def list_history(self, teacher_id: Optional[str]) -> List[dict]:
+        """Archived sessions owned by teacher_id (or by no one; None means all), students included."""
+
+    @abstractmethod
+    def load_history(self, session_id: str) -> Optional[dict]:
+        """An archived session document with its check-ins, or None."""
+
+    @abstractmethod
+    def query_history(
+        self,
+        teacher_id: str,
+        course_code: str = "",
+        section: str = "",
+        date_from: str = "",
+        date_to: str = "",
+        cursor: str = "",
+        limit: int = 50,
+    ) -> tuple:
+        """
+        One page of catalog entries (no students, newest first) visible to teacher_id,
+        optionally filtered by course/section and by an inclusive YYYY-MM-DD range on the
+        session date. Returns (entries, next_cursor or None).
+        """
+
+    @abstractmethod
+    def rebuild_catalog(self) -> int:
+        """Re-index every archive; returns the number of catalogued sessions."""
+
+
+class _CheckinLog:
+    """
+    Append-only NDJSON check-in logs with group commit: every append is durable when
+    it returns, but concurrent appends share one fsync per file instead of one each.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._cond = threading.Condition()
+        self._files: dict = {}  # session_id -> open append handle
+        self._lines: dict = {}  # session_id -> lines currently in the log
+        self._dirty: set = set()
+        self._seq = 0
+        self._synced = 0
+        self._syncing = False
+        self.stats = {"appends": 0, "fsyncs": 0, "compactions": 0}
+
+    @property
+    def lock(self):
+        """The lock appends check exists() under; holding it keeps new entries out."""
+        return self._cond
+
+    def path(self, session_id: str) -> str:
+        return os.path.join(self.directory, f"{session_id}.log")
+
+    def _handle(self, session_id: str):
+        f = self._files.get(session_id)
+        if f is None:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.path(session_id)
+            if session_id not in self._lines:
+                self._lines[session_id] = len(self.read(session_id))
+            f = self._files[session_id] = open(path, "a", encoding="utf-8")
+        return f
+
+    def append(self, session_id: str, entry: dict, exists=None) -> int:
+        """Append one entry and wait until it is fsynced. Returns the log's line count."""
+        return self.append_many({session_id: [entry]}, exists)[session_id]
+
+    def append_many(self, by_session: dict, exists=None) -> dict:
+        """
+        Append {session_id: entries} with a single write per log, so a crash keeps at most
+        a torn last line, and one shared fsync. exists(session_id) is checked for every
+        session first, under the lock compaction holds to fold and drop a log: if any is
+        false nothing is written and KeyError is raised. Returns each log's line count.
+        """
+        with self._cond:
+            if exists is not None:
+                for session_id in by_session:
+                    if not exists(session_id):
+                        raise KeyError(session_id)
+            lines = {}
+            for session_id, entries in by_session.items():
+                f = self._handle(session_id)
+                f.write("".join(json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n" for e in entries))
+                f.flush()
+                self._dirty.add(session_id)
+                self._lines[session_id] += len(entries)
+                lines[session_id] = self._lines[session_id]
+                self.stats["appends"] += len(entries)
+            self._seq += 1
+            mine = self._seq
+            while self._synced < mine:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+                # Become the leader: fsync everything appended so far, outside the lock.
+                self._syncing = True
+                target = self._seq
+                handles = [self._files[sid] for sid in self._dirty if sid in self._files]
+                self._dirty = set()
+                self._cond.release()
+                try:
+                    for handle in handles:
+                        os.fsync(handle.fileno())
+                finally:
+                    self._cond.acquire()
+                    self._syncing = False
+                    self._synced = max(self._synced, target)
+                    self.stats["fsyncs"] += len(handles)
+                    self._cond.notify_all()
+        return lines
+
+    def read(self, session_id: str) -> List[dict]:
+        try:
+            with open(self.path(session_id), "r", encoding="utf-8") as f:
+                raw = f.readlines()
+        except OSError:
+            return []
+        entries = []
+        for line in raw:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue  # a torn last line from a crash mid-append
+        return entries
+
+    def snapshot(self, session_id: str, read_document) -> tuple:
+        """
+        (read_document(), entries) taken together. A compaction folds and drops the log
+        under the same lock, so every entry is in exactly one of the two.
+        """
+        with self._cond:
+            return read_document(), self.read(session_id)
+
+    def compact(self, session_id: str, fold, min_lines: int = 0) -> None:
+        """
+        Fold the log into the session document via fold(entries), then drop the log.
+        Appends and snapshots are held off meanwhile, so a reader never sees the document
+        from before the fold together with the log from after it; replaying an
+        already-folded entry is harmless. Skipped when the log has fewer than min_lines (another thread compacted first).
+        """
+        with self._cond:
+            while self._syncing:
+                self._cond.wait()
+            if min_lines and self._lines.get(session_id, 0) < min_lines:
+                return
+            fold(self.read(session_id))
+            f = self._files.pop(session_id, None)
+            if f is not None:
+                f.close()
+            self._dirty.discard(session_id)
+            self._lines[session_id] = 0
+            try:
+                os.remove(self.path(session_id))
+            except FileNotFoundError:
+                pass
+            self.stats["compactions"] += 1
+
+
+class JsonAttendanceStore(AttendanceStore):
+    name = "json"
+
+    def __init__(
+        self,
+        attendance_dir: str = DEFAULT_ATTENDANCE_DIR,
+        history_dir: str = DEFAULT_HISTORY_DIR,
+        logger=None,
+        catalog_path: Optional[str] = None,
+    ):
+        self.attendance_dir = attendance_dir
+        self.history_dir = history_dir
+        self.logger = logger
+        self.catalog_path = catalog_path or (
+            DEFAULT_CATALOG_PATH
+            if history_dir == DEFAULT_HISTORY_DIR
+            else os.path.join(os.path.dirname(history_dir), "attendance_history_catalog.json")
+        )
+        self._catalog: Optional[dict] = None  # session_id -> entry, mirrors catalog_path
+        self._catalog_lock = threading.Lock()
+        # Serialises whole-document writes within this process.
+        self._lock = threading.Lock()
+        self.checkin_log = _CheckinLog(attendance_dir)
+        # Stopped but not archived yet: check-ins are refused like for an archived session.
+        self._stopped: set = set()
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.attendance_dir, f"{session_id}.json")
+
+    def _read(self, path: str) -> Optional[dict]:
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            if self.logger is not None:
+                self.logger.exception("Failed to read attendance file %s", path)
+            return None
+
+    @staticmethod
+    def _write(path: str, payload: dict, fsync: bool = False) -> None:
+        # fsync when a log is about to be dropped: the folded document must be on disk first.
+        atomic_write(path, json.dumps(payload, ensure_ascii=False, indent=2), fsync=fsync)
+
+    @staticmethod
+    def _fold(attendance: dict, entries: List[dict]) -> dict:
+        students = attendance.get("students")
+        if not isinstance(students, dict):
+            students = attendance["students"] = {}
+        for entry in entries:
+            student_id = entry.get("student_id")
+            if student_id and student_id not in students:
+                students[student_id] = {k: entry.get(k, "") for k in ("name", "status", "time")}
+            at = entry.get("at")
+            if isinstance(at, (int, float)) and at > (attendance.get("last_checkin_at") or 0):
+                attendance["last_checkin_at"] = at
+        return attendance
+
+    def load_session(self, session_id: str) -> Optional[dict]:
+        attendance, entries = self.checkin_log.snapshot(session_id, lambda: self._read(self._path(session_id)))
+        if attendance is None:
+            return None
+        return self._fold(attendance, entries)
+
+    def save_session(self, session_id: str, payload: dict) -> None:
+        with self._lock:
+            # payload may predate a compaction; check-ins already folded into the file stay.
+            current = self._read(self._path(session_id)) or {}
+            students = current.get("students") if isinstance(current.get("students"), dict) else {}
+            merged = {**payload, "students": {**(payload.get("students") or {}), **students}}
+            last_checkin_at = max(payload.get("last_checkin_at") or 0, current.get("last_checkin_at") or 0)
+            if last_checkin_at:
+                merged["last_checkin_at"] = last_checkin_at
+            self._write(self._path(session_id), merged)
+
+    def active_sessions(self) -> Iterator[tuple]:
+        if not os.path.isdir(self.attendance_dir):
+            return
+        for filename in os.listdir(self.attendance_dir):
+            if not filename.endswith(".json"):
+                continue
+            session_id = filename.rsplit(".", 1)[0]
+            attendance = self.load_session(session_id)
+            if attendance and attendance.get("active") is not False:
+                yield session_id, attendance
+
+    def _live(self, session_id: str) -> bool:
+        return session_id not in self._stopped and os.path.isfile(self._path(session_id))
+
+    def record_checkin(self, session_id: str, student_id: str, record: dict) -> None:
+        entry = {"student_id": student_id, **record, "at": time.time()}
+        if self.checkin_log.append(session_id, entry, self._live) >= CHECKIN_LOG_COMPACT_LINES:
+            self.compact(session_id, min_lines=CHECKIN_LOG_COMPACT_LINES)
+
+    def record_checkins(self, checkins: List[tuple]) -> None:
+        by_session: dict = {}
+        for session_id, student_id, record in checkins:
+            by_session.setdefault(session_id, []).append({"student_id": student_id, **record, "at": time.time()})
+        # One append per session touched, all sharing one fsync.
+        for session_id, lines in self.checkin_log.append_many(by_session, self._live).items():
+            if lines >= CHECKIN_LOG_COMPACT_LINES:
+                self.compact(session_id, min_lines=CHECKIN_LOG_COMPACT_LINES)
+
+    def compact(self, session_id: str, min_lines: int = 0) -> None:
+        """Fold the check-in log into the session file and truncate it."""
+
+        def fold(entries: List[dict]) -> None:
+            with self._lock:
+                attendance = self._read(self._path(session_id))
+                if attendance is not None:
+                    self._write(self._path(session_id), self._fold(attendance, entries), fsync=True)
+
+        self.checkin_log.compact(session_id, fold, min_lines)
+
+    def stop_session(self, session_id: str, fields: dict) -> Optional[dict]:
+        with self.checkin_log.lock, self._lock:
+            attendance = self._read(self._path(session_id))
+            if attendance is None or attendance.get("active") is False or session_id in self._stopped:
+                return None
+            attendance.update(fields, active=False)
+            self._write(self._path(session_id), attendance)
+            self._stopped.add(session_id)
+            return self._fold(attendance, self.checkin_log.read(session_id))
+
+    def archive_session(self, session_id: str, payload: dict) -> None:
+        filename = _history_filename(payload, session_id)
+        archived = {**payload, "students": dict(payload.get("students") or {})}
+
+        def fold(entries: List[dict]) -> None:
+            # Check-ins recorded after payload was loaded (folded into the live file or
+            # still in the log) belong in the archive. The live file goes in the same
+            # step, so a later check-in finds no session (KeyError) instead of landing in
+            # a log nothing will read.
+            live = self._read(self._path(session_id)) or {}
+            if isinstance(live.get("students"), dict):
+                archived["students"].update(live["students"])
+            self._fold(archived, entries)
+            self._write(os.path.join(self.history_dir, filename), archived, fsync=True)
+            self._remove_live(session_id)
+            self._stopped.discard(session_id)
+
+        self.checkin_log.compact(session_id, fold)
+        with self._catalog_lock:
+            catalog = self._load_catalog()
+            catalog[session_id] = {**_catalog_entry(archived, session_id), "file": filename}
+            self._write(self.catalog_path, catalog)
+
+    def record_late_checkin(self, session_id: str, student_id: str, record: dict) -> bool:
+        with self._lock:
+            path = self._find_history_file(session_id)
+            archived = self._read(path) if path else None
+            if archived is None:
+                raise KeyError(session_id)
+            if student_id in (archived.get("students") or {}):
+                return False
+            self._fold(archived, [{"student_id": student_id, **record}])
+            self._write(path, archived, fsync=True)
+        with self._catalog_lock:
+            catalog = self._load_catalog()
+            if session_id in catalog:
+                catalog[session_id] = {**_catalog_entry(archived, session_id), "file": os.path.basename(path)}
+                self._write(self.catalog_path, catalog)
+        return True
+
+    def _remove_live(self, session_id: str) -> None:
+        with self._lock:
+            try:
+                os.remove(self._path(session_id))
+            except FileNotFoundError:
+                pass
+
+    def prune_stopped(self) -> int:
+        """
+        Clear stopped session files left in data/attendance/ by older versions,
+        archiving any that never reached history first.
+        """
+        if not os.path.isdir(self.attendance_dir):
+            return 0
+        with self._catalog_lock:
+            archived = set(self._load_catalog())
+        pruned = 0
+        for filename in os.listdir(self.attendance_dir):
+            session_id, ext = os.path.splitext(filename)
+            if ext != ".json" or session_id in self._stopped:
+                continue  # a stop in progress archives its own session
+            attendance = self.load_session(session_id)
+            if attendance is None or attendance.get("active") is not False:
+                continue
+            if session_id in archived:
+                self.compact(session_id)
+                self._remove_live(session_id)
+            else:
+                self.archive_session(session_id, {k: v for k, v in attendance.items() if k != "code_secret"})
+            pruned += 1
+        return pruned
+
+    # -------- History catalog --------
+    def _load_catalog(self) -> dict:
+        """The in-memory catalog, read from disk (or rebuilt) on first use. Hold _catalog_lock."""
+        if self._catalog is None:
+            catalog = self._read(self.catalog_path)
+            self._catalog = catalog if isinstance(catalog, dict) else self._scan_catalog()
+            if not isinstance(catalog, dict):
+                self._write(self.catalog_path, self._catalog)
+        return self._catalog
+
+    def _scan_catalog(self) -> dict:
+        catalog = {}
+        for filename in self._history_files():
+            data = self._read(os.path.join(self.history_dir, filename))
+            if not isinstance(data, dict):
+                continue
+            session_id = data.get("session_id") or filename.rsplit(".", 1)[0]
+            catalog[session_id] = {**_catalog_entry(data, session_id), "file": filename}
+        return catalog
+
+    def rebuild_catalog(self) -> int:
+        with self._catalog_lock:
+            self._catalog = self._scan_catalog()
+            self._write(self.catalog_path, self._catalog)
+            return len(self._catalog)
+
+    def query_history(
+        self,
+        teacher_id: str,
+        course_code: str = "",
+        section: str = "",
+        date_from: str = "",
+        date_to: str = "",
+        cursor: str = "",
+        limit: int = 50,
+    ) -> tuple:
+        with self._catalog_lock:
+            entries = list(self._load_catalog().values())
+        after = decode_cursor(cursor) if cursor else None
+        matches = []
+        for entry in entries:
+            if entry.get("teacher_id") and entry["teacher_id"] != teacher_id:
+                continue
+            if course_code and entry.get("course_code", "").upper() != course_code.upper():
+                continue
+            if section and entry.get("section", "").upper() != section.upper():
+                continue
+            key = _sort_key(entry)
+            if date_from and key[:10] < date_from:
+                continue
+            if date_to and key[:10] > date_to:
+                continue
+            if after is not None and (key, entry["session_id"]) >= after:
+                continue
+            matches.append(entry)
+        matches.sort(key=lambda e: (_sort_key(e), e["session_id"]), reverse=True)
+        page = [{k: v for k, v in e.items() if k != "file"} for e in matches[:limit]]
+        next_cursor = encode_cursor(page[-1]) if len(matches) > limit else None
+        return page, next_cursor
+
+    def _history_files(self) -> List[str]:
+        if not os.path.isdir(self.history_dir):
+            return []
+        return [f for f in os.listdir(self.history_dir) if f.endswith(".json")]
+
+    def list_history(self, teacher_id: Optional[str]) -> List[dict]:
+        records = []
+        for filename in self._history_files():
+            data = self._read(os.path.join(self.history_dir, filename))
+            if not isinstance(data, dict):
+                continue
+            if teacher_id is not None and data.get("teacher_id") and data.get("teacher_id") != teacher_id:
+                continue
+            data.setdefault("session_id", filename.rsplit(".", 1)[0])
+            records.append(data)
+        return records
+
+    def _find_history_file(self, session_id: str) -> Optional[str]:
+        """Locate an archived session by id (in the filename, else in the contents)."""
+        filenames = self._history_files()
+        for filename in filenames:
+            if session_id in filename:
+                return os.path.join(self.history_dir, filename)
+        for filename in filenames:
+            path = os.path.join(self.history_dir, filename)
+            data = self._read(path)
+            if isinstance(data, dict) and (data.get("session_id") or "") == session_id:
+                return path
+        return None
+
+    def load_history(self, session_id: str) -> Optional[dict]:
+        with self._catalog_lock:
+            entry = self._load_catalog().get(session_id)
+        if entry is not None:
+            data = self._read(os.path.join(self.history_dir, entry["file"]))
+            if data is not None:
+                return data
+        # Archives written by hand or before the catalog existed.
+        path = self._find_history_file(session_id)
+        return self._read(path) if path else None
+
+
+class SqliteAttendanceStore(AttendanceStore):
+    name = "sqlite"
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id   TEXT PRIMARY KEY,
+        teacher_id   TEXT NOT NULL DEFAULT '',
+        course_id    TEXT NOT NULL DEFAULT '',
+        course_title TEXT NOT NULL DEFAULT '',
+        course_code  TEXT NOT NULL DEFAULT '',
+        section      TEXT NOT NULL DEFAULT '',
+        timestamp    TEXT NOT NULL DEFAULT '',
+        stopped_at   TEXT NOT NULL DEFAULT '',
+        active       INTEGER NOT NULL DEFAULT 1,
+        archived     INTEGER NOT NULL DEFAULT 0,
+        extra        TEXT NOT NULL DEFAULT '{}'
+    );
+    CREATE TABLE IF NOT EXISTS checkins (
+        session_id  TEXT NOT NULL REFERENCES sessions(session_id) ON DELETE CASCADE,
+        student_id  TEXT NOT NULL,
+        name        TEXT NOT NULL DEFAULT '',
+        status      TEXT NOT NULL DEFAULT 'present',
+        time        TEXT NOT NULL DEFAULT '',
+        recorded_at REAL NOT NULL,
+        PRIMARY KEY (session_id, student_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_sessions_active ON sessions(active) WHERE active = 1;
+    CREATE INDEX IF NOT EXISTS idx_sessions_teacher ON sessions(teacher_id, archived, stopped_at);
+    CREATE INDEX IF NOT EXISTS idx_sessions_course ON sessions(course_code, section);
+    CREATE INDEX IF NOT EXISTS idx_checkins_student ON checkins(student_id);
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers run alongside the single writer."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _read(self) -> "_Transaction":
+        return _Transaction(self._conn(), "BEGIN")
+
+    def _write(self) -> "_Transaction":
+        return _Transaction(self._conn(), "BEGIN IMMEDIATE")
+
+    # -------- Row <-> document --------
+    @staticmethod
+    def _session_row(session_id: str, payload: dict, archived: bool) -> tuple:
+        extra = {
+            k: v for k, v in payload.items() if k not in SESSION_FIELDS + ("session_id", "active", "students", "last_checkin_at")
+        }
+        return (
+            session_id,
+            *[str(payload.get(field) or "") for field in SESSION_FIELDS],
+            0 if payload.get("active") is False else 1,
+            1 if archived else 0,
+            json.dumps(extra, ensure_ascii=False, separators=(",", ":")),
+        )
+
+    def _documents(self, conn: sqlite3.Connection, rows: list) -> List[dict]:
+        docs = {}
+        for row in rows:
+            doc = json.loads(row["extra"] or "{}")
+            doc.update({field: row[field] for field in SESSION_FIELDS})
+            doc["session_id"] = row["session_id"]
+            doc["active"] = bool(row["active"])
+            doc["students"] = {}
+            docs[row["session_id"]] = doc
+        if docs:
+            marks = ",".join("?" * len(docs))
+            for c in conn.execute(
+                f"SELECT * FROM checkins WHERE session_id IN ({marks}) ORDER BY recorded_at", list(docs)
+            ):
+                doc = docs[c["session_id"]]
+                doc["students"][c["student_id"]] = {"name": c["name"], "status": c["status"], "time": c["time"]}
+                doc["last_checkin_at"] = c["recorded_at"]  # rows come oldest first
+        return list(docs.values())
+
+    def _upsert_session(self, conn, session_id: str, payload: dict, archived: bool) -> None:
+        conn.execute(
+            """
+            INSERT INTO sessions (session_id, course_id, course_title, course_code, section, teacher_id,
+                                  timestamp, stopped_at, active, archived, extra)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(session_id) DO UPDATE SET
+                course_id=excluded.course_id, course_title=excluded.course_title,
+                course_code=excluded.course_code, section=excluded.section,
+                teacher_id=excluded.teacher_id, timestamp=excluded.timestamp,
+                stopped_at=excluded.stopped_at, active=excluded.active,
+                archived=MAX(sessions.archived, excluded.archived), extra=excluded.extra
+            """,
+            self._session_row(session_id, payload, archived),
+        )
+
+    def _replace_checkins(self, conn, session_id: str, students: dict) -> None:
+        conn.execute("DELETE FROM checkins WHERE session_id = ?", (session_id,))
+        now = time.time()
+        conn.executemany(
+            "INSERT INTO checkins (session_id, student_id, name, status, time, recorded_at) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (session_id, sid, str(info.get("name") or sid), str(info.get("status") or "present"), str(info.get("time") or ""), now)
+                for sid, info in (students or {}).items()
+                if isinstance(info, dict)
+            ],
+        )
+
+    # -------- AttendanceStore --------
+    def load_session(self, session_id: str) -> Optional[dict]:
+        with self._read() as conn:
+            rows = conn.execute("SELECT * FROM sessions WHERE session_id = ?", (session_id,)).fetchall()
+            docs = self._documents(conn, rows)
+        return docs[0] if docs else None
+
+    def save_session(self, session_id: str, payload: dict) -> None:
+        # Check-ins are owned by record_checkin; the document's students map is not
+        # written back, so a save never clobbers a concurrent check-in.
+        with self._write() as conn:
+            self._upsert_session(conn, session_id, payload, archived=False)
+
+    def active_sessions(self) -> Iterator[tuple]:
+        with self._read() as conn:
+            rows = conn.execute("SELECT * FROM sessions WHERE active = 1").fetchall()
+            docs = self._documents(conn, rows)
+        for doc in docs:
+            yield doc["session_id"], doc
+
+    # A student's first check-in stands, as on the live path; repeats are no-ops.
+    _INSERT_CHECKIN = """
+        INSERT INTO checkins (session_id, student_id, name, status, time, recorded_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(session_id, student_id) DO NOTHING
+    """
+    _OPEN_SESSION = "SELECT 1 FROM sessions WHERE session_id = ? AND active = 1 AND archived = 0"
+
+    @staticmethod
+    def _checkin_row(session_id: str, student_id: str, record: dict) -> tuple:
+        return (
+            session_id,
+            student_id,
+            str(record.get("name") or student_id),
+            str(record.get("status") or "present"),
+            str(record.get("time") or ""),
+            time.time(),
+        )
+
+    def record_checkin(self, session_id: str, student_id: str, record: dict) -> None:
+        with self._write() as conn:
+            if conn.execute(self._OPEN_SESSION, (session_id,)).fetchone() is None:
+                raise KeyError(session_id)
+            conn.execute(self._INSERT_CHECKIN, self._checkin_row(session_id, student_id, record))
+
+    def record_checkins(self, checkins: List[tuple]) -> None:
+        session_ids = sorted({session_id for session_id, _, _ in checkins})
+        with self._write() as conn:
+            for session_id in session_ids:
+                if conn.execute(self._OPEN_SESSION, (session_id,)).fetchone() is None:
+                    raise KeyError(session_id)
+            conn.executemany(self._INSERT_CHECKIN, [self._checkin_row(*checkin) for checkin in checkins])
+
+    def stop_session(self, session_id: str, fields: dict) -> Optional[dict]:
+        with self._write() as conn:
+            rows = conn.execute("SELECT * FROM sessions WHERE session_id = ? AND active = 1", (session_id,)).fetchall()
+            if not rows:
+                return None
+            doc = self._documents(conn, rows)[0]
+            doc.update(fields, active=False)
+            self._upsert_session(conn, session_id, doc, archived=False)
+        return doc
+
+    def archive_session(self, session_id: str, payload: dict) -> None:
+        with self._write() as conn:
+            self._upsert_session(conn, session_id, payload, archived=True)
+
+    def record_late_checkin(self, session_id: str, student_id: str, record: dict) -> bool:
+        with self._write() as conn:
+            if conn.execute("SELECT 1 FROM sessions WHERE session_id = ? AND archived = 1", (session_id,)).fetchone() is None:
+                raise KeyError(session_id)
+            added = conn.execute(self._INSERT_CHECKIN, self._checkin_row(session_id, student_id, record))
+            return added.rowcount > 0
+
+    def list_history(self, teacher_id: Optional[str]) -> List[dict]:
+        with self._read() as conn:
+            if teacher_id is None:
+                rows = conn.execute("SELECT * FROM sessions WHERE archived = 1").fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT * FROM sessions WHERE archived = 1 AND (teacher_id = ? OR teacher_id = '')", (teacher_id,)
+                ).fetchall()
+            return self._documents(conn, rows)
+
+    def load_history(self, session_id: str) -> Optional[dict]:
+        with self._read() as conn:
+            rows = conn.execute("SELECT * FROM sessions WHERE session_id = ? AND archived = 1", (session_id,)).fetchall()
+            docs = self._documents(conn, rows)
+        return docs[0] if docs else None
+
+    def query_history(
+        self,
+        teacher_id: str,
+        course_code: str = "",
+        section: str = "",
+        date_from: str = "",
+        date_to: str = "",
+        cursor: str = "",
+        limit: int = 50,
+    ) -> tuple:
+        # The sessions table is the catalog; head counts come off the checkins primary key.
+        sort_key = "COALESCE(NULLIF(s.stopped_at, ''), s.timestamp)"
+        where = ["s.archived = 1", "(s.teacher_id = ? OR s.teacher_id = '')"]
+        params: list = [teacher_id]
+        if course_code:
+            where.append("UPPER(s.course_code) = UPPER(?)")
+            params.append(course_code)
+        if section:
+            where.append("UPPER(s.section) = UPPER(?)")
+            params.append(section)
+        if date_from:
+            where.append(f"substr({sort_key}, 1, 10) >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append(f"substr({sort_key}, 1, 10) <= ?")
+            params.append(date_to)
+        after = decode_cursor(cursor) if cursor else None
+        if after is not None:
+            where.append(f"({sort_key} < ? OR ({sort_key} = ? AND s.session_id < ?))")
+            params.extend([after[0], after[0], after[1]])
+        columns = ", ".join(f"s.{field}" for field in CATALOG_FIELDS)
+        sql = (
+            f"SELECT {columns}, (SELECT COUNT(*) FROM checkins c WHERE c.session_id = s.session_id) AS head_count "
+            f"FROM sessions s WHERE {' AND '.join(where)} "
+            f"ORDER BY {sort_key} DESC, s.session_id DESC LIMIT ?"
+        )
+        with self._read() as conn:
+            rows = conn.execute(sql, params + [limit + 1]).fetchall()
+        page = [dict(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(page[-1]) if len(rows) > limit else None
+        return page, next_cursor
+
+    def rebuild_catalog(self) -> int:
+        with self._read() as conn:
+            return conn.execute("SELECT COUNT(*) FROM sessions WHERE archived = 1").fetchone()[0]
+
+    # -------- Migration --------
+    def import_json(self, source: JsonAttendanceStore) -> dict:
+        """
+        One-shot import of a JSON store: live session files first, then history
+        archives (which mark the session archived). Re-running it is harmless.
+        """
+        counts = {"sessions": 0, "archived": 0, "checkins": 0}
+        with self._write() as conn:
+            if os.path.isdir(source.attendance_dir):
+                for filename in sorted(os.listdir(source.attendance_dir)):
+                    if not filename.endswith(".json"):
+                        continue
+                    session_id = filename.rsplit(".", 1)[0]
+                    doc = source.load_session(session_id)
+                    if not isinstance(doc, dict):
+                        continue
+                    self._upsert_session(conn, session_id, doc, archived=False)
+                    self._replace_checkins(conn, session_id, doc.get("students") or {})
+                    counts["sessions"] += 1
+                    counts["checkins"] += len(doc.get("students") or {})
+            for doc in source.list_history(teacher_id=None):
+                session_id = doc.get("session_id") or ""
+                if not session_id:
+                    continue
+                doc["active"] = False
+                self._upsert_session(conn, session_id, doc, archived=True)
+                self._replace_checkins(conn, session_id, doc.get("students") or {})
+                counts["archived"] += 1
+        return counts
+
+
+class _Transaction:
+    """Run a `with` block in one transaction: a consistent snapshot for reads, the write lock for writes."""
+
+    def __init__(self, conn: sqlite3.Connection, begin: str):
+        self.conn = conn
+        self.begin = begin
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute(self.begin)
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+if __name__ == "__main__":
+    import sys
+
+    args = sys.argv[1:]
+    if args and args[0] == "rebuild-catalog":
+        print(f"Catalogued {JsonAttendanceStore().rebuild_catalog()} archived sessions")
+        sys.exit(0)
+    if not args or args[0] != "migrate":
+        print("Usage: python attendance_store.py migrate [--db PATH] | rebuild-catalog")
+        sys.exit(2)
+    db_path = args[args.index("--db") + 1] if "--db" in args[:-1] else DEFAULT_DB_PATH
+    result = SqliteAttendanceStore(db_path).import_json(JsonAttendanceStore())
+    print(f"Imported {result['sessions']} sessions, {result['archived']} archives, {result['checkins']} check-ins into {db_path}")
@@ -0,0 +1,217 @@
+"""
+Attendance check-in / status latency benchmark.
+
+Drives the real Flask handlers through the test client against a throwaway data
+directory and a simulated clock: N live sessions, the teacher page polling /status
+for every session each 3 s, and a burst of student check-ins every simulated second.
+Reports latency per endpoint and how many store writes were made.
+
+--stress N instead fires N check-ins at one session from N threads at once and exits
+non-zero unless every one of them was recorded.
+
+Usage:
+  python bench_attendance.py [--sessions 30] [--seconds 60] [--checkins 10] [--backend json|sqlite]
+  python bench_attendance.py --stress 500 [--backend json|sqlite]
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+# The sweeper would auto-stop sessions on the real clock mid-run; the password hashing
+# pool is only started by a login, which the benchmark never makes.
+os.environ.setdefault("ATTENDANCE_SWEEP_INTERVAL_SECONDS", "0")
+
+import attendance_analytics
+import attendance_store
+import server
+
+
+class _SimulatedTime:
+    """Stand-in for the time module inside server, with a clock the benchmark advances."""
+
+    def __init__(self, start: float):
+        self.now = start
+
+    def time(self) -> float:
+        return self.now
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+def _summary(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        "requests": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3) if ordered else 0.0,
+        "p95_ms": round(ordered[int(len(ordered) * 0.95)] * 1000, 3) if ordered else 0.0,
+    }
+
+
+class _CountingStore:
+    """Wraps an attendance store and counts the calls that write."""
+
+    WRITES = ("save_session", "record_checkin", "record_checkins", "archive_session")
+
+    def __init__(self, store):
+        self.store = store
+        self.writes = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self.store, name)
+        if name not in self.WRITES:
+            return attr
+
+        def counted(*args, **kwargs):
+            self.writes += 1
+            return attr(*args, **kwargs)
+
+        return counted
+
+
+def _open_store(backend: str, data_dir: str):
+    if backend == "sqlite":
+        return attendance_store.SqliteAttendanceStore(f"{data_dir}/attendance.sqlite3")
+    return attendance_store.JsonAttendanceStore(f"{data_dir}/attendance", f"{data_dir}/attendance_history")
+
+
+@contextlib.contextmanager
+def _swapped_storage(store, data_dir: str):
+    """Point server at `store` and at analytics under data_dir, restoring both afterwards."""
+    previous = server.attendance_storage, server.attendance_stats
+    server.attendance_storage = store
+    server.attendance_stats = attendance_analytics.AttendanceAnalytics(f"{data_dir}/attendance_analytics.json")
+    server._rebuild_code_index()
+    try:
+        yield
+    finally:
+        server.attendance_storage, server.attendance_stats = previous
+        server._rebuild_code_index()
+
+
+def run(sessions: int = 30, seconds: int = 60, checkins: int = 10, backend: str = "json", seed: int = 7) -> dict:
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory(prefix="bench_attendance_") as data_dir:
+        return _run(rng, sessions, seconds, checkins, backend, data_dir)
+
+
+def _run(rng: random.Random, sessions: int, seconds: int, checkins: int, backend: str, data_dir: str) -> dict:
+    counting = _CountingStore(_open_store(backend, data_dir))
+    with _swapped_storage(counting, data_dir):
+        clock = _SimulatedTime(time.time())
+        server.time = clock
+        try:
+            teacher = server.app.test_client()
+            with teacher.session_transaction() as sess:
+                sess["teacher_id"] = "BENCH"
+            session_ids = []
+            for i in range(sessions):
+                resp = teacher.post("/api/teacher/attendance/start", json={"course_code": f"100-{i:03d}", "section": "1"})
+                session_ids.append(resp.get_json()["session_id"])
+            counting.writes = 0
+
+            student = server.app.test_client()
+            status_times, checkin_times = [], []
+            failed = 0
+            for second in range(seconds):
+                clock.now += 1
+                if second % 3 == 0:
+                    for session_id in session_ids:
+                        started = time.perf_counter()
+                        teacher.get(f"/api/teacher/attendance/{session_id}/status")
+                        status_times.append(time.perf_counter() - started)
+                for n in range(checkins):
+                    session_id = rng.choice(session_ids)
+                    code = teacher.get(f"/api/teacher/attendance/{session_id}/status").get_json()["current_code"]
+                    with student.session_transaction() as sess:
+                        sess["sid"] = f"66{second:04d}{n:04d}"
+                    started = time.perf_counter()
+                    resp = student.post("/api/student/attendance/checkin", json={"session_token": code})
+                    checkin_times.append(time.perf_counter() - started)
+                    failed += resp.status_code != 200
+        finally:
+            server.time = time
+    return {
+        "backend": backend,
+        "sessions": sessions,
+        "simulated_seconds": seconds,
+        "checkin": {**_summary(checkin_times), "failed": failed},
+        "status": _summary(status_times),
+        "store_writes": counting.writes,
+    }
+
+
+def stress(checkins: int = 500, backend: str = "json") -> dict:
+    """Fire `checkins` simultaneous check-ins at one session and count what was kept."""
+    with tempfile.TemporaryDirectory(prefix="stress_attendance_") as data_dir:
+        return _stress(checkins, backend, data_dir)
+
+
+def _stress(checkins: int, backend: str, data_dir: str) -> dict:
+    store = _open_store(backend, data_dir)
+    with _swapped_storage(store, data_dir):
+        teacher = server.app.test_client()
+        with teacher.session_transaction() as sess:
+            sess["teacher_id"] = "STRESS"
+        session_id = teacher.post("/api/teacher/attendance/start", json={"course_code": "100-000"}).get_json()["session_id"]
+
+        clients = []
+        for n in range(checkins):
+            client = server.app.test_client()
+            with client.session_transaction() as sess:
+                sess["sid"] = f"66{n:08d}"
+            clients.append(client)
+        barrier = threading.Barrier(checkins)
+        statuses = []
+
+        def check_in(client):
+            barrier.wait()
+            code = teacher.get(f"/api/teacher/attendance/{session_id}/status").get_json()["current_code"]
+            statuses.append(client.post("/api/student/attendance/checkin", json={"session_token": code}).status_code)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=check_in, args=(client,)) for client in clients]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        recorded = len(store.load_session(session_id)["students"])
+        teacher.post("/api/teacher/attendance/stop", json={"session_id": session_id})
+        archived = len(store.load_history(session_id)["students"])
+        result = {
+            "backend": backend,
+            "checkins": checkins,
+            "accepted": statuses.count(200),
+            "recorded": recorded,
+            "archived": archived,
+            "elapsed_s": round(elapsed, 3),
+        }
+        log = getattr(store, "checkin_log", None)
+        if log is not None:
+            result["log"] = dict(log.stats)
+        return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=30)
+    parser.add_argument("--seconds", type=int, default=60)
+    parser.add_argument("--checkins", type=int, default=10, help="check-ins per simulated second")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--stress", type=int, metavar="N", help="N parallel check-ins to one session")
+    args = parser.parse_args()
+    if args.stress:
+        outcome = stress(args.stress, args.backend)
+        print(json.dumps(outcome, indent=2))
+        sys.exit(0 if outcome["recorded"] == outcome["archived"] == args.stress else 1)
+    print(json.dumps(run(args.sessions, args.seconds, args.checkins, args.backend), indent=2))
@@ -0,0 +1,210 @@
+"""
+Static asset build: minify, fingerprint and precompress the front-end files.
+
+Every asset is written to dist/ under a content-hashed name (app.3f9c0a1b2d4e.js), with
+.gz and, when the brotli package is installed, .br copies for the types that compress.
+dist/manifest.json maps each source name to its build:
+
+  {"version": 1, "assets": {"app.js": {"file": "app.3f9c0a1b2d4e.js", "sha256": str,
+                                       "size": int, "encodings": {"gzip": int, "br": int}}}}
+
+A low-detail prototype.preview.glb is (re)generated from prototype.glb first (see
+model_preview); when there is one, the model viewer (data-src="prototype.glb") gets a
+data-preview-src pointing at it. index.html and login.html are copied into dist/ with
+their references rewritten to the fingerprinted names. The server serves dist/ under /assets/ as
+immutable, so a repeat visit only revalidates the HTML. Re-run after editing any
+asset; without a manifest the server keeps serving the sources as before.
+
+JavaScript is minified with rjsmin and CSS with rcssmin when installed; otherwise CSS
+gets a conservative built-in pass (comments and redundant whitespace) and JavaScript
+is shipped as written, relying on compression.
+
+Usage:
+  python build_assets.py [--out dist]
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+import model_preview
+from atomic_files import atomic_write
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip copies are written
+    brotli = None
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUT_DIR = os.path.join(BASE_DIR, "dist")
+MANIFEST_NAME = "manifest.json"
+ASSET_URL_PREFIX = "/assets/"
+
+# Source files (relative to BASE_DIR); missing ones are skipped.
+ASSETS = ("app.js", "style.css", "prototype.glb", "prototype.preview.glb")
+IMAGE_DIR = "images"
+IMAGE_TYPES = (".svg", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".ico")
+PAGES = ("index.html", "login.html")
+# Already-compressed formats gain nothing from gzip/brotli.
+COMPRESSIBLE = (".js", ".css", ".svg", ".glb", ".json", ".html")
+HASH_LENGTH = 12
+
+
+# -------- Minifiers --------
+_CSS_STRINGS_AND_COMMENTS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|/\*.*?\*/)', re.S)
+
+
+def minify_css(text: str) -> str:
+    if rcssmin is not None:
+        return rcssmin.cssmin(text)
+    out = []
+    for piece in _CSS_STRINGS_AND_COMMENTS.split(text):
+        if piece.startswith(("'", '"')):
+            out.append(piece)  # string literals stay as written
+        elif not piece.startswith("/*"):
+            piece = re.sub(r"\s+", " ", piece)
+            out.append(re.sub(r"\s*([{};,>])\s*", r"\1", piece))
+    return "".join(out).replace(";}", "}").strip() + "\n"
+
+
+def minify_js(text: str) -> str:
+    return rjsmin.jsmin(text) + "\n" if rjsmin is not None else text
+
+
+def _minified(name: str, raw: bytes) -> bytes:
+    if name.endswith(".css"):
+        return minify_css(raw.decode("utf-8")).encode("utf-8")
+    if name.endswith(".js"):
+        return minify_js(raw.decode("utf-8")).encode("utf-8")
+    return raw
+
+
+# -------- Build --------
+def fingerprinted_name(name: str, digest: str) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest[:HASH_LENGTH]}{ext}"
+
+
+def _emit(out_dir: str, name: str, payload: bytes) -> dict:
+    """Write payload as a fingerprinted file (plus compressed copies); returns its manifest entry."""
+    digest = hashlib.sha256(payload).hexdigest()
+    filename = fingerprinted_name(name, digest)
+    path = os.path.join(out_dir, filename)
+    atomic_write(path, payload)
+    encodings = {}
+    if name.lower().endswith(COMPRESSIBLE):
+        gz = gzip.compress(payload, compresslevel=9, mtime=0)
+        if len(gz) < len(payload):
+            atomic_write(f"{path}.gz", gz)
+            encodings["gzip"] = len(gz)
+        if brotli is not None:
+            br = brotli.compress(payload, quality=11)
+            if len(br) < len(payload):
+                atomic_write(f"{path}.br", br)
+                encodings["br"] = len(br)
+    return {"file": filename, "sha256": digest, "size": len(payload), "encodings": encodings}
+
+
+def _source_names(base_dir: str) -> list:
+    names = [name for name in ASSETS if os.path.isfile(os.path.join(base_dir, name))]
+    image_dir = os.path.join(base_dir, IMAGE_DIR)
+    if os.path.isdir(image_dir):
+        for filename in sorted(os.listdir(image_dir)):
+            if filename.lower().endswith(IMAGE_TYPES):
+                names.append(f"{IMAGE_DIR}/{filename}")
+    return names
+
+
+def rewrite_references(html: str, assets: dict) -> str:
+    """Point src/href attributes naming a built asset ("app.js", "/app.js") at its fingerprinted URL."""
+
+    def replace(match: re.Match) -> str:
+        entry = assets.get(match.group(3))
+        if entry is None:
+            return match.group(0)
+        return f'{match.group(1)}={match.group(2)}{ASSET_URL_PREFIX}{entry["file"]}{match.group(2)}'
+
+    return re.sub(r'\b(src|href)=(["\'])/?([^"\'?#]+)\2', replace, html)
+
+
+def add_model_preview(html: str) -> str:
+    """Give the model viewer loading prototype.glb a data-preview-src for the preview."""
+    return re.sub(
+        r'(\bdata-src=(["\'])/?prototype\.glb\2)(?![^>]*\bdata-preview-src=)',
+        r'\1 data-preview-src=\2prototype.preview.glb\2',
+        html,
+    )
+
+
+def build(base_dir: str = BASE_DIR, out_dir: str = DEFAULT_OUT_DIR) -> dict:
+    staging = f"{out_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    model = os.path.join(base_dir, "prototype.glb")
+    preview = os.path.join(base_dir, "prototype.preview.glb")
+    if os.path.isfile(model) and not model_preview.preview_current(model, preview):
+        try:
+            model_preview.build_preview(model, preview)
+        except Exception as exc:  # the dashboard falls back to loading the full model
+            print(f"Skipping the model preview: {exc}")
+
+    assets = {}
+    for name in _source_names(base_dir):
+        with open(os.path.join(base_dir, name), "rb") as f:
+            assets[name] = _emit(staging, name, _minified(name, f.read()))
+
+    pages = {}
+    for page in PAGES:
+        source = os.path.join(base_dir, page)
+        if not os.path.isfile(source):
+            continue
+        with open(source, "r", encoding="utf-8") as f:
+            html = f.read()
+        if "prototype.preview.glb" in assets:
+            html = add_model_preview(html)
+        html = rewrite_references(html, assets)
+        atomic_write(os.path.join(staging, page), html.encode("utf-8"))
+        pages[page] = page
+
+    manifest = {"version": 1, "assets": assets, "pages": pages}
+    atomic_write(os.path.join(staging, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+
+    # Swap the whole directory so the server never sees a half-built manifest.
+    previous = f"{out_dir}.{os.getpid()}.old"
+    if os.path.isdir(out_dir):
+        os.replace(out_dir, previous)
+    os.replace(staging, out_dir)
+    shutil.rmtree(previous, ignore_errors=True)
+    return manifest
+
+
+def load_manifest(out_dir: str = DEFAULT_OUT_DIR) -> dict:
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if isinstance(manifest, dict) and isinstance(manifest.get("assets"), dict):
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"version": 1, "assets": {}, "pages": {}}
+
+
+if __name__ == "__main__":
+    out = sys.argv[sys.argv.index("--out") + 1] if "--out" in sys.argv[:-1] else DEFAULT_OUT_DIR
+    result = build(BASE_DIR, os.path.abspath(out))
+    for source, entry in sorted(result["assets"].items()):
+        sizes = ", ".join(f"{enc} {size}" for enc, size in sorted(entry["encodings"].items()))
+        print(f"{source:32} -> {entry['file']:40} {entry['size']:>9} B" + (f"  ({sizes})" if sizes else ""))
+    print(f"Wrote {len(result['assets'])} assets and {len(result['pages'])} pages to {out}")
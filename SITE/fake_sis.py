@@ -0,0 +1,95 @@
+"""
+Local fake SIS that replays captured registrar pages, for scraping without the network.
+
+Pages live in data/sis_fixtures/ (login, landing, menu, time_table, grade). A student
+directory (data/sis_fixtures/<student_id>/) overrides any page for that account.
+Accounts come from data/sis_fixtures/accounts.json ({"student_id": "password"}).
+
+Usage:
+  python fake_sis.py                      # serves on http://127.0.0.1:5055
+  SIS_ROOT=http://127.0.0.1:5055 python generate_schedule_json.py 6605140000 fake-sis --json
+"""
+import json
+import os
+import secrets
+
+from flask import Flask, abort, make_response, redirect, request
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.environ.get("FAKE_SIS_FIXTURES", os.path.join(BASE_DIR, "data", "sis_fixtures"))
+SESSION_COOKIE = "ASPSESSIONIDFAKE"
+
+app = Flask(__name__, static_folder=None)
+# session token -> student id
+_sessions: dict = {}
+
+
+def _accounts() -> dict:
+    path = os.path.join(FIXTURE_DIR, "accounts.json")
+    if not os.path.isfile(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _page(name: str, student_id: str = "", **values) -> str:
+    candidates = []
+    if student_id:
+        candidates.append(os.path.join(FIXTURE_DIR, student_id, f"{name}.html"))
+    candidates.append(os.path.join(FIXTURE_DIR, f"{name}.html"))
+    for path in candidates:
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                html = f.read()
+            # Every page gets a fresh dynamic link token, like the real portal.
+            values.setdefault("avs", f"avs{secrets.randbelow(10**8):08d}")
+            values.setdefault("student_id", student_id)
+            for key, value in values.items():
+                html = html.replace("{" + key + "}", str(value))
+            return html
+    abort(404, description=f"fixture {name}.html not found")
+
+
+def _current_student() -> str:
+    student_id = _sessions.get(request.cookies.get(SESSION_COOKIE, ""))
+    if not student_id:
+        abort(redirect("/registrar/login.asp?lang=2"))
+    return student_id
+
+
+@app.get("/registrar/login.asp")
+def login_page():
+    return _page("login", error="")
+
+
+@app.post("/registrar/login_chk.asp")
+def login_check():
+    student_id = (request.form.get("f_uid") or "").strip()
+    password = request.form.get("f_pwd") or ""
+    if not student_id or _accounts().get(student_id) != password:
+        return _page("login", error="<p><b>Invalid student ID or password</b></p>")
+    token = secrets.token_hex(12)
+    _sessions[token] = student_id
+    resp = make_response(_page("landing", student_id))
+    resp.set_cookie(SESSION_COOKIE, token, httponly=True)
+    return resp
+
+
+@app.get("/registrar/student.asp")
+def student_menu():
+    return _page("menu", _current_student())
+
+
+@app.get("/registrar/time_table.asp")
+def time_table():
+    return _page("time_table", _current_student())
+
+
+@app.get("/registrar/grade.asp")
+def grades():
+    return _page("grade", _current_student())
+
+
+if __name__ == "__main__":
+    port = int(os.environ.get("FAKE_SIS_PORT", "5055"))
+    app.run(host="127.0.0.1", port=port, threaded=True)
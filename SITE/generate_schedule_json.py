@@ -1,11 +1,14 @@
 import csv
+import logging
 import sys
 import time
-import re
 import json
 import os
+import shutil
+import threading
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Iterator, List, Optional
 
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service as ChromeService
@@ -13,12 +16,102 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 from webdriver_manager.chrome import ChromeDriverManager
-
-
-DEFAULT_BASE_URL = "http://home.sis.siam.edu/registrar/login.asp?lang=2"
-TIMETABLE_URL = "http://home.sis.siam.edu/registrar/time_table.asp?lang=2"
+from webdriver_manager.core.driver_cache import DriverCacheManager
+
+import schedule_changes
+from atomic_files import atomic_write
+from sis_parsers import (
+    _normalize_code,
+    parse_exam_tables,
+    parse_grade_tables,
+    parse_largest_table,
+    parse_timetable_tables,
+    resolve_dom_snapshot,
+)
+
+
+# SIS host; point at a fake_sis.py instance to scrape without the network.
+SIS_ROOT = os.environ.get("SIS_ROOT", "http://home.sis.siam.edu").rstrip("/")
+DEFAULT_BASE_URL = f"{SIS_ROOT}/registrar/login.asp?lang=2"
+TIMETABLE_URL = f"{SIS_ROOT}/registrar/time_table.asp?lang=2"
+
+# "http" scrapes with plain requests (see sis_http.py) and falls back to Selenium on
+# anything but rejected credentials, including a timetable that parsed to no rows;
+# "selenium" always drives Chrome.
+SCRAPER_ENGINE = os.environ.get("SCRAPER_ENGINE", "http").strip().lower()
+
+# Seconds each readiness condition may wait before the scrape moves on.
+# SCRAPER_WAIT_TIMEOUT overrides every step; pass wait_timeouts= for per-step values.
+DEFAULT_WAIT_TIMEOUTS = {
+    "menu": 15.0,
+    "timetable": 15.0,
+    "exam_table": 10.0,
+    "grades": 15.0,
+    "page_load": 15.0,
+}
+if os.environ.get("SCRAPER_WAIT_TIMEOUT"):
+    DEFAULT_WAIT_TIMEOUTS = {k: float(os.environ["SCRAPER_WAIT_TIMEOUT"]) for k in DEFAULT_WAIT_TIMEOUTS}
+
+# XPath readiness conditions for each page the flow scrapes.
+MENU_READY_XPATH = "//img[contains(@src,'time_table_1.gif') or contains(@src,'grade_1.gif')]"
+TIMETABLE_READY_XPATH = "//tr[contains(translate(normalize-space(.),'dayitme','DAYITME'),'DAY/TIME')]"
+EXAM_READY_XPATH = (
+    "//tr[contains(translate(normalize-space(.),'coursemidt','COURSEMIDT'),'COURSECODE')"
+    " and contains(translate(normalize-space(.),'coursemidt','COURSEMIDT'),'MIDTERM')]"
+)
+GRADES_READY_XPATH = (
+    "//tr[contains(translate(normalize-space(.),'coursegad','COURSEGAD'),'COURSECODE')"
+    " and contains(translate(normalize-space(.),'coursegad','COURSEGAD'),'GRADE')]"
+)
+
+# Serializes every <table> on the page in one WebDriver call. Rows and cells are
+# emitted once and referenced by index: a table lists all descendant <tr>s (like
+# find_elements(By.TAG_NAME, "tr")), a row lists its direct th/td children and
+# all descendant <td>s, and a cell carries its text, colspan and first anchor.
+DOM_SNAPSHOT_JS = """
+const trs = Array.from(document.querySelectorAll("tr"));
+const cells = Array.from(document.querySelectorAll("td, th"));
+const trIndex = new Map(trs.map((el, i) => [el, i]));
+const cellIndex = new Map(cells.map((el, i) => [el, i]));
+return {
+  tables: Array.from(document.querySelectorAll("table")).map(
+    (t) => Array.from(t.querySelectorAll("tr")).map((tr) => trIndex.get(tr))
+  ),
+  rows: trs.map((tr) => ({
+    text: tr.innerText || "",
+    cells: Array.from(tr.children)
+      .filter((c) => c.tagName === "TD" || c.tagName === "TH")
+      .map((c) => cellIndex.get(c)),
+    tds: Array.from(tr.querySelectorAll("td")).map((c) => cellIndex.get(c)),
+  })),
+  cells: cells.map((c) => {
+    const a = c.querySelector("a");
+    return {
+      tag: c.tagName.toLowerCase(),
+      text: c.innerText || "",
+      colspan: c.getAttribute("colspan"),
+      a_text: a ? a.innerText || "" : null,
+      a_title: a ? a.getAttribute("title") : null,
+    };
+  }),
+};
+"""
+
+# Explicit chromedriver binary; skips all discovery when set.
+CHROMEDRIVER_PATH = os.environ.get("CHROMEDRIVER_PATH", "").strip()
+# Local cache searched (and populated by webdriver-manager) when no explicit path is given.
+CHROMEDRIVER_CACHE_DIR = os.environ.get(
+    "CHROMEDRIVER_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".drivers")
+)
+
+# Long-lived headless browsers shared across scrapes (0 disables pooling).
+SCRAPER_POOL_SIZE = int(os.environ.get("SCRAPER_POOL_SIZE", "2"))
+# Recycle a pooled browser after this many scrapes to cap memory growth.
+SCRAPER_POOL_MAX_USES = int(os.environ.get("SCRAPER_POOL_MAX_USES", "25"))
+# Seconds a scrape may wait for a free browser before giving up.
+SCRAPER_POOL_LEASE_TIMEOUT = float(os.environ.get("SCRAPER_POOL_LEASE_TIMEOUT", "120"))
 
 
 @dataclass
@@ -27,6 +120,41 @@ class Credentials:
     password: str
 
 
+class SISLoginError(RuntimeError):
+    """The SIS rejected the submitted credentials (either engine); retrying cannot help."""
+
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimings:
+    """Per-stage scrape durations across every scrape in this process, for /dev/metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: dict = {}  # "engine:step" -> {"count", "total_s", "max_s"}
+
+    def record(self, engine: str, timings: dict) -> None:
+        with self._lock:
+            for step, seconds in timings.items():
+                stage = self._stages.setdefault(f"{engine}:{step}", {"count": 0, "total_s": 0.0, "max_s": 0.0})
+                stage["count"] += 1
+                stage["total_s"] += seconds
+                stage["max_s"] = max(stage["max_s"], seconds)
+        logger.info("%s scrape stage timings: %s", engine, ", ".join(f"{k}={v:.2f}s" for k, v in timings.items()))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                name: {"count": s["count"], "avg_s": round(s["total_s"] / s["count"], 4), "max_s": round(s["max_s"], 4)}
+                for name, s in sorted(self._stages.items())
+            }
+
+
+# Filled by both engines, pooled browsers included.
+stage_timings = StageTimings()
+
+
 class AxiomFlowToPython:
     """
     Replicates the Axiom automation defined in axiom_new_automation.json using Selenium.
@@ -43,33 +171,32 @@ class AxiomFlowToPython:
     - Scrape the timetable table and save to CSV
     """
 
-    def __init__(self, creds: Credentials, headless: bool = False, base_url: str = DEFAULT_BASE_URL):
+    def __init__(
+        self,
+        creds: Credentials,
+        headless: bool = False,
+        base_url: str = DEFAULT_BASE_URL,
+        driver: Optional[webdriver.Chrome] = None,
+        wait_timeouts: Optional[dict] = None,
+    ):
         self.creds = creds
         self.base_url = base_url
-        self.driver: Optional[webdriver.Chrome] = None
-        self.wait: Optional[WebDriverWait] = None
+        self.driver: Optional[webdriver.Chrome] = driver
+        self.wait: Optional[WebDriverWait] = WebDriverWait(driver, 20) if driver else None
         self.headless = headless
+        # A leased (pooled) driver is owned by the pool; never quit it here.
+        self._owns_driver = driver is None
+        self.wait_timeouts = {**DEFAULT_WAIT_TIMEOUTS, **(wait_timeouts or {})}
+        # Seconds spent per flow step and per readiness wait, in execution order.
+        self.timings: dict = {}
 
     # -------- Browser setup --------
     def start(self) -> None:
-        options = webdriver.ChromeOptions()
-        if self.headless:
-            options.add_argument("--headless=new")
-        options.add_argument("--ignore-certificate-errors")
-        options.add_argument("--ignore-ssl-errors")
-        options.add_argument("--disable-extensions")
-        options.add_argument("--disable-popup-blocking")
-        options.add_argument("--disable-notifications")
-        options.add_experimental_option("detach", True)
-
-        service = ChromeService(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=service, options=options)
-        self.driver.maximize_window()
-        self.driver.set_page_load_timeout(45)
+        self.driver = build_chrome_driver(self.headless)
         self.wait = WebDriverWait(self.driver, 20)
 
     def stop(self) -> None:
-        if self.driver:
+        if self.driver and self._owns_driver:
             try:
                 self.driver.quit()
             except Exception:
@@ -99,6 +226,41 @@ class AxiomFlowToPython:
             print(f"Timed out waiting for field: {desc}")
             return False
 
+    def _wait_for_xpath(self, xpath: str, step: str, desc: str) -> bool:
+        """Block until xpath is present (bounded by wait_timeouts[step]) and record the wait."""
+        started = time.perf_counter()
+        try:
+            WebDriverWait(self.driver, self.wait_timeouts[step]).until(
+                EC.presence_of_element_located((By.XPATH, xpath))
+            )
+            return True
+        except TimeoutException:
+            print(f"Timed out waiting for {desc}")
+            return False
+        finally:
+            self.timings[f"wait:{step}"] = self.timings.get(f"wait:{step}", 0.0) + time.perf_counter() - started
+
+    def _wait_for_page_load(self) -> bool:
+        started = time.perf_counter()
+        try:
+            WebDriverWait(self.driver, self.wait_timeouts["page_load"]).until(
+                lambda d: d.execute_script("return document.readyState") == "complete"
+            )
+            return True
+        except TimeoutException:
+            print("Timed out waiting for page load")
+            return False
+        finally:
+            self.timings["wait:page_load"] = self.timings.get("wait:page_load", 0.0) + time.perf_counter() - started
+
+    @contextmanager
+    def _timed(self, step: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[step] = self.timings.get(step, 0.0) + time.perf_counter() - started
+
     def _on_login_page(self) -> bool:
         try:
             return bool(self.driver.find_elements(By.NAME, "f_uid"))
@@ -130,7 +292,7 @@ class AxiomFlowToPython:
         try:
             print("Navigating directly to timetable page…")
             self.driver.get(TIMETABLE_URL)
-            time.sleep(1.0)
+            self._wait_for_page_load()
             return True
         except Exception as exc:
             print(f"Direct timetable navigation failed: {exc}")
@@ -163,7 +325,7 @@ class AxiomFlowToPython:
                 el.click()
             except Exception:
                 self.driver.execute_script("arguments[0].click();", el)
-            time.sleep(1.0)
+            self._wait_for_xpath(MENU_READY_XPATH, "menu", "student menu")
             return True
         except TimeoutException:
             print("Could not find the Go Back button (goback_1.gif)")
@@ -174,190 +336,38 @@ class AxiomFlowToPython:
         return self._safe_click(By.XPATH, "//img[contains(@src,'time_table_1.gif')]/ancestor::a[1]", "Time table link")
 
     # -------- Scraping --------
-    def _extract_largest_table(self) -> List[List[str]]:
-        """Heuristic: grab the largest visible table's text as a 2D list."""
+    def _snapshot_tables(self) -> List[List[dict]]:
+        """Serialize every table on the page in a single execute_script round trip."""
         assert self.driver is not None
-        tables = self.driver.find_elements(By.TAG_NAME, "table")
-        max_cells = 0
-        best: Optional[webdriver.remote.webelement.WebElement] = None
-        for t in tables:
-            try:
-                rows = t.find_elements(By.TAG_NAME, "tr")
-                cells = sum(len(r.find_elements(By.XPATH, "./th|./td")) for r in rows)
-                if cells > max_cells:
-                    max_cells = cells
-                    best = t
-            except Exception:
-                continue
+        started = time.perf_counter()
+        try:
+            snapshot = self.driver.execute_script(DOM_SNAPSHOT_JS)
+        finally:
+            self.timings["snapshot"] = self.timings.get("snapshot", 0.0) + time.perf_counter() - started
+        return resolve_dom_snapshot(snapshot)
 
-        result: List[List[str]] = []
-        if not best:
-            return result
-        for r in best.find_elements(By.TAG_NAME, "tr"):
-            row: List[str] = []
-            for c in r.find_elements(By.XPATH, "./th|./td"):
-                try:
-                    row.append(c.text.strip())
-                except Exception:
-                    row.append("")
-            if any(cell for cell in row):
-                result.append(row)
-        return result
+    def _extract_largest_table(self) -> List[List[str]]:
+        """Heuristic: grab the largest visible table's text as a 2D list."""
+        return parse_largest_table(self._snapshot_tables())
 
     def scrape_timetable(self) -> List[List[str]]:
         print("Scraping timetable table (raw)…")
         # Kept for reference/debug; not used for final CSV now
-        time.sleep(0.8)
+        self._wait_for_xpath(TIMETABLE_READY_XPATH, "timetable", "timetable grid")
         return self._extract_largest_table()
 
     def scrape_timetable_structured(self) -> List[List[str]]:
         """
         Produce a clean, daily schedule with columns:
         [day, location, course_name, start_time, end_time, course_code]
-
-        - Derives start/end from cell colspans (5-min slots) starting 09:00.
-        - Extracts course name from the anchor title; code from anchor text.
-        - Formats location as "Building X Room YYY" from text like "2-202" or "2-308-9".
+        See parse_timetable_tables for how grid cells are interpreted.
         """
         assert self.driver is not None
         print("Scraping timetable table (structured)…")
-        time.sleep(0.8)
-
-        def find_timetable_table():
-            tables = self.driver.find_elements(By.TAG_NAME, "table")
-            for tb in tables:
-                try:
-                    trs = tb.find_elements(By.TAG_NAME, "tr")
-                    if len(trs) < 3:
-                        continue
-                    header_txt = " ".join(trs[1].text.split()).upper()
-                    if "DAY/TIME" in header_txt and "9:00-10:00" in header_txt:
-                        return tb
-                except Exception:
-                    continue
-            return None
-
-        tb = find_timetable_table()
-        if not tb:
+        self._wait_for_xpath(TIMETABLE_READY_XPATH, "timetable", "timetable grid")
+        out = parse_timetable_tables(self._snapshot_tables())
+        if not out:
             print("Timetable grid not found; returning empty.")
-            return []
-
-        # Build output
-        out: List[List[str]] = [["day", "location", "course_name", "start_time", "end_time", "course_code"]]
-
-        # Time helpers
-        base_hour = 9  # grid starts at 09:00
-        minutes_per_slot = 5
-
-        def slot_to_hhmm(slot_idx: int) -> str:
-            total_minutes = base_hour * 60 + slot_idx * minutes_per_slot
-            hh = total_minutes // 60
-            mm = total_minutes % 60
-            return f"{hh:02d}:{mm:02d}"
-
-        # Parse rows for each day
-        day_names = {"MON": "Mon", "TUE": "Tue", "WED": "Wed", "THU": "Thu", "FRI": "Fri", "SAT": "Sat", "SUN": "Sun"}
-
-        rows = tb.find_elements(By.TAG_NAME, "tr")
-        for tr in rows:
-            tds = tr.find_elements(By.TAG_NAME, "td")
-            if not tds:
-                continue
-            # Identify day cell (first td often with day label)
-            day_cell_text = (tds[0].text or "").strip().upper()
-            day_key = None
-            for key in day_names.keys():
-                if key in day_cell_text:
-                    day_key = key
-                    break
-            if not day_key:
-                continue
-
-            day_label = day_names[day_key]
-
-            # current slot index from 09:00; skip the first day label cell by subtracting its colspan
-            current_slot = 0
-
-            # Iterate over cells after the day label cell
-            for td in tds[1:]:
-                # Determine colspan (slots)
-                colsp_attr = td.get_attribute("colspan") or "1"
-                try:
-                    span = int(colsp_attr)
-                except Exception:
-                    span = 1
-
-                # A class block typically has a link with the course code and colored background
-                anchors = td.find_elements(By.TAG_NAME, "a")
-                if anchors:
-                    a = anchors[0]
-                    course_code = (a.text or "").strip()
-                    course_name = a.get_attribute("title") or ""
-                    cell_text = td.text or ""
-
-                    # Lines inside the cell often are:
-                    #   <code> (from link)
-                    #   (x) y, B-ROOM or B-ROOM-ROOM
-                    #   B   (building number again on its own line)
-                    lines = [ln.strip() for ln in cell_text.splitlines() if ln.strip()]
-
-                    # Building: prefer last non-empty line numeric
-                    building = ""
-                    if lines:
-                        nums = re.findall(r"\d+", lines[-1])
-                        if nums:
-                            building = nums[-1]
-
-                    # Find a hyphen group in the cell that is NOT the course code
-                    hyphen_groups = re.findall(r"\b\d+-\d+(?:-\d+)?\b", cell_text)
-                    hyphen_groups = [g for g in hyphen_groups if _normalize_code(g) != _normalize_code(course_code)]
-
-                    rooms_display = ""
-                    if hyphen_groups:
-                        candidate = hyphen_groups[0]
-                        # Remove building prefix if present
-                        if building and candidate.startswith(f"{building}-"):
-                            rooms_str = candidate[len(building) + 1 :]
-                        else:
-                            parts = candidate.split("-", 1)
-                            rooms_str = parts[1] if len(parts) > 1 else candidate
-
-                        # Expand shorthand like 308-9 -> 308, 309
-                        room_parts = rooms_str.split("-") if rooms_str else []
-                        if room_parts:
-                            base = room_parts[0]
-                            rooms: list[str] = [base]
-                            for p in room_parts[1:]:
-                                if len(p) < len(base):
-                                    rooms.append(base[: len(base) - len(p)] + p)
-                                else:
-                                    rooms.append(p)
-                            # Deduplicate preserving order
-                            seen = set()
-                            ordered = []
-                            for r in rooms:
-                                if r not in seen:
-                                    seen.add(r)
-                                    ordered.append(r)
-                            rooms_display = ", ".join(ordered)
-
-                    if building and rooms_display:
-                        location = f"Building {building} Room {rooms_display}"
-                    elif building:
-                        location = f"Building {building}"
-                    elif rooms_display:
-                        location = f"Room {rooms_display}"
-                    else:
-                        location = ""
-
-                    start_time = slot_to_hhmm(current_slot)
-                    end_time = slot_to_hhmm(current_slot + span)
-
-                    out.append([day_label, location, course_name, start_time, end_time, course_code])
-
-                # advance slots by the colspan regardless
-                current_slot += span
-
         return out
 
     def scrape_exam_table(self) -> List[List[str]]:
@@ -366,37 +376,11 @@ class AxiomFlowToPython:
         """
         assert self.driver is not None
         print("Scraping exam timetable…")
-        time.sleep(0.5)
-
-        tables = self.driver.find_elements(By.TAG_NAME, "table")
-        for tb in tables:
-            try:
-                trs = tb.find_elements(By.TAG_NAME, "tr")
-                if not trs:
-                    continue
-                header = " ".join(trs[0].text.split()).upper()
-                # Look for header keywords in any of the first two rows
-                if not ("COURSECODE" in header and "COURSENAME" in header and "GROUP" in header and "MIDTERM" in header and "FINALS" in header and "SEAT" in header):
-                    if len(trs) > 1:
-                        header2 = " ".join(trs[1].text.split()).upper()
-                        if not ("COURSECODE" in header2 and "COURSENAME" in header2 and "GROUP" in header2 and "MIDTERM" in header2 and "FINALS" in header2 and "SEAT" in header2):
-                            continue
-                # Found the exam table; extract rows after the header
-                rows_out: List[List[str]] = [["coursecode", "coursename", "group", "midterm", "finals", "seat"]]
-                for tr in trs[1:]:
-                    tds = tr.find_elements(By.TAG_NAME, "td")
-                    if len(tds) < 6:
-                        continue
-                    vals = [td.text.strip().replace("\xa0", " ") for td in tds[:6]]
-                    # Normalize course code cell (remove surrounding spaces)
-                    vals[0] = vals[0].replace(" ", "")
-                    rows_out.append(vals)
-                return rows_out
-            except Exception:
-                continue
-
-        print("Exam timetable not found.")
-        return []
+        self._wait_for_xpath(EXAM_READY_XPATH, "exam_table", "exam timetable")
+        rows_out = parse_exam_tables(self._snapshot_tables())
+        if not rows_out:
+            print("Exam timetable not found.")
+        return rows_out
 
     # -------- Grades navigation --------
     def navigate_back_to_menu(self) -> None:
@@ -406,7 +390,7 @@ class AxiomFlowToPython:
         if not self._safe_click(By.XPATH, "//img[contains(@src,'goback_1.gif')]/ancestor::a[1]", "Go Back"):
             try:
                 self.driver.back()
-                time.sleep(0.8)
+                self._wait_for_xpath(MENU_READY_XPATH, "menu", "student menu")
             except Exception:
                 pass
 
@@ -426,113 +410,387 @@ class AxiomFlowToPython:
         Sections include 'TRANSFER COURSE' and 'SEMESTER X/YYYY'.
         """
         print("Scraping grades…")
-        time.sleep(1.0)
+        self._wait_for_xpath(GRADES_READY_XPATH, "grades", "grade table header")
         assert self.driver is not None
+        return parse_grade_tables(self._snapshot_tables())
 
-        rows_out: List[List[str]] = [["section", "coursecode", "coursename", "credit", "grade"]]
-
-        # Find all tables that contain the header labels COURSECODE/COURSENAME
-        tables = self.driver.find_elements(By.TAG_NAME, "table")
-        for t in tables:
-            try:
-                trs = t.find_elements(By.TAG_NAME, "tr")
-                if not trs:
-                    continue
-
-                # Identify if this table is a grade table by header presence
-                header_found = False
-                section_label = ""
-                start_idx = 0
-                for idx, tr in enumerate(trs):
-                    txt = tr.text.strip().upper()
-                    if not txt:
-                        continue
-                    # Section row often has bold title and colspan=4
-                    if ("TRANSFER COURSE" in txt) or ("SEMESTER" in txt):
-                        section_label = tr.text.strip()
-                        continue
-                    # Header row with column labels
-                    if ("COURSECODE" in txt) and ("COURSENAME" in txt) and ("CREDIT" in txt) and ("GRADE" in txt):
-                        header_found = True
-                        start_idx = idx + 1
-                        break
+    # -------- Orchestration --------
+    def run(self) -> tuple[List[List[str]], List[List[str]]]:
+        self.timings = {}
+        if self._owns_driver:
+            with self._timed("start"):
+                self.start()
+        try:
+            with self._timed("login"):
+                self.open_home()
+                # Language toggle is optional; try it but continue even if it fails
+                try:
+                    self.click_english_flag()
+                except Exception:
+                    pass
+
+                if not self.click_login_link():
+                    raise RuntimeError("Could not click login link")
+
+                if not self.fill_credentials_and_submit():
+                    raise RuntimeError("Could not submit login form")
+
+                # After login, click the dynamic Go Back button
+                if not self.click_go_back():
+                    if self._on_login_page():
+                        raise SISLoginError("SIS rejected the credentials")
+                    print("Warning: Go Back button not clicked. Flow may still work if already on student page.")
+
+            with self._timed("timetable"):
+                # Open timetable
+                opened_timetable = self.click_time_table()
+                if not opened_timetable:
+                    opened_timetable = self.open_timetable_direct()
+                if not opened_timetable:
+                    raise RuntimeError("Could not open timetable page")
+
+                # Scrape structured timetable
+                timetable = self.scrape_timetable_structured()
+                if not timetable:
+                    # Retry once via direct navigation if the first scrape was empty
+                    if self.open_timetable_direct():
+                        timetable = self.scrape_timetable_structured()
+
+            with self._timed("grades"):
+                # Navigate back to the menu, open Grade Results, and scrape
+                self.navigate_back_to_menu()
+                if not self.click_grade_results():
+                    raise RuntimeError("Could not open grade results page")
+                grades = self.scrape_grades()
 
-                if not header_found:
-                    continue
-
-                # Collect subsequent data rows until a row that looks like a new section/header or empty
-                for tr in trs[start_idx:]:
-                    tds = tr.find_elements(By.XPATH, "./td")
-                    if len(tds) < 4:
-                        # Possibly reached end of this table's data region
-                        continue
-                    # If this row looks like a new header/section, stop
-                    text_up = tr.text.strip().upper()
-                    if ("COURSECODE" in text_up and "COURSENAME" in text_up) or ("SEMESTER" in text_up) or ("TRANSFER COURSE" in text_up):
-                        break
+            return timetable, grades
+        finally:
+            if self._owns_driver:
+                if not self.headless:
+                    # Keep a visible browser open a moment for inspection, then close
+                    time.sleep(1.0)
+                self.stop()
+            stage_timings.record("selenium", self.timings)
+
+
+_chromedriver_path: Optional[str] = None
+_chromedriver_lock = threading.Lock()
+
+
+def _find_cached_chromedriver(cache_dir: str) -> Optional[str]:
+    """Return the newest chromedriver executable under cache_dir, if any."""
+    names = ("chromedriver", "chromedriver.exe")
+    found = []
+    for root, _dirs, files in os.walk(cache_dir):
+        for name in files:
+            if name in names:
+                path = os.path.join(root, name)
+                if os.access(path, os.X_OK):
+                    found.append(path)
+    if not found:
+        return None
+    return max(found, key=os.path.getmtime)
+
+
+def resolve_chromedriver_path(refresh: bool = False) -> str:
+    """
+    Locate the chromedriver binary once per process and memoize it.
 
-                    # Extract the four columns
-                    code = tds[0].text.strip().lstrip("\xa0 ")
-                    name = tds[1].text.strip()
-                    credit = tds[2].text.strip()
-                    grade = tds[3].text.strip().lstrip("\xa0 ")
+    Lookup order: CHROMEDRIVER_PATH, a driver already in CHROMEDRIVER_CACHE_DIR,
+    chromedriver on PATH, and only then webdriver-manager (which may hit the network)
+    downloading into CHROMEDRIVER_CACHE_DIR. refresh=True skips the cache and PATH and
+    asks webdriver-manager for the driver matching the installed Chrome, for when the
+    one found before no longer starts (Chrome updated underneath it).
+    """
+    global _chromedriver_path
+    with _chromedriver_lock:
+        if _chromedriver_path and not refresh:
+            return _chromedriver_path
+
+        path = None
+        if CHROMEDRIVER_PATH:
+            if not os.path.isfile(CHROMEDRIVER_PATH):
+                raise RuntimeError(f"CHROMEDRIVER_PATH does not exist: {CHROMEDRIVER_PATH}")
+            path = CHROMEDRIVER_PATH
+        if not path and not refresh and os.path.isdir(CHROMEDRIVER_CACHE_DIR):
+            path = _find_cached_chromedriver(CHROMEDRIVER_CACHE_DIR)
+        if not path and not refresh:
+            path = shutil.which("chromedriver")
+        if not path:
+            os.makedirs(CHROMEDRIVER_CACHE_DIR, exist_ok=True)
+            path = ChromeDriverManager(cache_manager=DriverCacheManager(root_dir=CHROMEDRIVER_CACHE_DIR)).install()
+
+        _chromedriver_path = path
+        return path
+
+
+def benchmark_startup(rounds: int = 3, headless: bool = True, webdriver_manager: bool = False) -> dict:
+    """
+    Time driver resolution (cold vs memoized) and browser launch, in seconds; with
+    webdriver_manager=True also a plain ChromeDriverManager().install(), which needs
+    the network.
+    """
+    global _chromedriver_path
+    result = {}
+    if webdriver_manager:
+        t0 = time.perf_counter()
+        ChromeDriverManager().install()
+        result["webdriver_manager_install"] = time.perf_counter() - t0
+
+    with _chromedriver_lock:
+        _chromedriver_path = None
+    t0 = time.perf_counter()
+    resolve_chromedriver_path()
+    result["resolve_cold"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        resolve_chromedriver_path()
+    result["resolve_memoized"] = (time.perf_counter() - t0) / rounds
+
+    launches = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        driver = build_chrome_driver(headless)
+        launches.append(time.perf_counter() - t0)
+        driver.quit()
+    result["browser_launch"] = sum(launches) / len(launches)
+    return {k: round(v, 4) for k, v in result.items()}
+
+
+def build_chrome_driver(headless: bool) -> webdriver.Chrome:
+    """Launch a configured Chrome instance (used for one-off runs and pooled workers)."""
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless=new")
+    options.add_argument("--ignore-certificate-errors")
+    options.add_argument("--ignore-ssl-errors")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-popup-blocking")
+    options.add_argument("--disable-notifications")
+    options.add_experimental_option("detach", True)
 
-                    # Skip empty lines
-                    if not (code or name or credit or grade):
-                        continue
+    try:
+        driver = webdriver.Chrome(service=ChromeService(resolve_chromedriver_path()), options=options)
+    except WebDriverException as exc:
+        if CHROMEDRIVER_PATH:
+            raise
+        # Most often a cached driver left behind by a Chrome update; fetch a matching one once.
+        print(f"Chrome failed to start ({exc.msg}); retrying with a refreshed chromedriver")
+        driver = webdriver.Chrome(service=ChromeService(resolve_chromedriver_path(refresh=True)), options=options)
+    driver.maximize_window()
+    driver.set_page_load_timeout(45)
+    return driver
+
+
+class _PooledBrowser:
+    def __init__(self, driver: webdriver.Chrome):
+        self.driver = driver
+        self.uses = 0
+        self.created_at = time.time()
+
+
+class BrowserPool:
+    """
+    Bounded pool of pre-warmed headless Chrome sessions.
 
-                    rows_out.append([section_label, code, name, credit, grade])
-            except Exception:
-                continue
+    Scrapes lease a browser with `with pool.lease() as driver:`. Between leases the
+    browser is reset (cookies, web storage, blank page) so no student state leaks into
+    the next scrape. A browser is recycled after `max_uses` leases, or as soon as it
+    stops responding.
+    """
 
-        return rows_out
+    def __init__(
+        self,
+        size: int = SCRAPER_POOL_SIZE,
+        max_uses: int = SCRAPER_POOL_MAX_USES,
+        headless: bool = True,
+        lease_timeout: float = SCRAPER_POOL_LEASE_TIMEOUT,
+    ):
+        self.size = max(1, size)
+        self.max_uses = max(1, max_uses)
+        self.headless = headless
+        self.lease_timeout = lease_timeout
+        self._cond = threading.Condition()
+        self._idle: List[_PooledBrowser] = []
+        self._total = 0  # idle + leased + being launched
+        self._waiting = 0
+        self._closed = False
+        self._stats = {
+            "leases": 0,
+            "launched": 0,
+            "recycled": 0,
+            "crashed": 0,
+            "lease_timeouts": 0,
+            "lease_wait_total_s": 0.0,
+            "lease_wait_max_s": 0.0,
+        }
+
+    # -------- Worker lifecycle --------
+    def _launch(self) -> _PooledBrowser:
+        try:
+            worker = _PooledBrowser(build_chrome_driver(self.headless))
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["launched"] += 1
+        return worker
+
+    def _discard(self, worker: _PooledBrowser) -> None:
+        try:
+            worker.driver.quit()
+        except Exception:
+            pass
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _reset(driver: webdriver.Chrome) -> None:
+        driver.delete_all_cookies()
+        try:
+            driver.execute_script("try { localStorage.clear(); sessionStorage.clear(); } catch (e) {}")
+        except Exception:
+            pass
+        driver.get("about:blank")
 
-    # -------- Orchestration --------
-    def run(self) -> tuple[List[List[str]], List[List[str]]]:
-        self.start()
+    @staticmethod
+    def _is_alive(driver: webdriver.Chrome) -> bool:
         try:
-            self.open_home()
-            # Language toggle is optional; try it but continue even if it fails
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def warm(self, count: Optional[int] = None) -> None:
+        """Launch browsers in the background until `count` (default: pool size) exist."""
+        target = min(self.size, count if count is not None else self.size)
+
+        def _fill():
+            while True:
+                with self._cond:
+                    if self._closed or self._total >= target:
+                        return
+                    self._total += 1
+                try:
+                    worker = self._launch()
+                except Exception as exc:
+                    print(f"Browser pool warm-up failed: {exc}")
+                    return
+                with self._cond:
+                    self._idle.append(worker)
+                    self._cond.notify()
+
+        threading.Thread(target=_fill, name="browser-pool-warm", daemon=True).start()
+
+    # -------- Leasing --------
+    def _acquire(self) -> _PooledBrowser:
+        started = time.monotonic()
+        deadline = started + self.lease_timeout
+        with self._cond:
+            self._waiting += 1
             try:
-                self.click_english_flag()
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Browser pool is closed")
+                    if self._idle:
+                        worker = self._idle.pop()
+                        launch = False
+                        break
+                    if self._total < self.size:
+                        self._total += 1
+                        worker = None
+                        launch = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["lease_timeouts"] += 1
+                        raise TimeoutError("Timed out waiting for a free browser")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            waited = time.monotonic() - started
+            self._stats["leases"] += 1
+            self._stats["lease_wait_total_s"] += waited
+            self._stats["lease_wait_max_s"] = max(self._stats["lease_wait_max_s"], waited)
+        if launch:
+            worker = self._launch()
+        return worker
+
+    def _release(self, worker: _PooledBrowser, healthy: bool) -> None:
+        worker.uses += 1
+        recycle = not healthy or worker.uses >= self.max_uses or self._closed
+        if not recycle:
+            try:
+                self._reset(worker.driver)
             except Exception:
-                pass
-
-            if not self.click_login_link():
-                raise RuntimeError("Could not click login link")
+                healthy = False
+                recycle = True
+        if recycle:
+            with self._cond:
+                self._stats["recycled" if healthy else "crashed"] += 1
+            self._discard(worker)
+            return
+        with self._cond:
+            self._idle.append(worker)
+            self._cond.notify()
+
+    @contextmanager
+    def lease(self) -> Iterator[webdriver.Chrome]:
+        worker = self._acquire()
+        healthy = True
+        try:
+            yield worker.driver
+        except Exception:
+            healthy = self._is_alive(worker.driver)
+            raise
+        finally:
+            self._release(worker, healthy)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for worker in idle:
+            self._discard(worker)
+
+    def stats(self) -> dict:
+        with self._cond:
+            leases = self._stats["leases"]
+            return {
+                "size": self.size,
+                "total": self._total,
+                "idle": len(self._idle),
+                "in_use": self._total - len(self._idle),
+                "queue_depth": self._waiting,
+                "lease_wait_avg_s": round(self._stats["lease_wait_total_s"] / leases, 4) if leases else 0.0,
+                **{k: round(v, 4) if isinstance(v, float) else v for k, v in self._stats.items()},
+            }
 
-            if not self.fill_credentials_and_submit():
-                raise RuntimeError("Could not submit login form")
 
-            # After login, click the dynamic Go Back button
-            if not self.click_go_back():
-                print("Warning: Go Back button not clicked. Flow may still work if already on student page.")
+_browser_pool: Optional[BrowserPool] = None
+_browser_pool_lock = threading.Lock()
 
-            # Open timetable
-            opened_timetable = self.click_time_table()
-            if not opened_timetable:
-                opened_timetable = self.open_timetable_direct()
-            if not opened_timetable:
-                raise RuntimeError("Could not open timetable page")
 
-            # Scrape structured timetable
-            timetable = self.scrape_timetable_structured()
-            if not timetable:
-                # Retry once via direct navigation if the first scrape was empty
-                if self.open_timetable_direct():
-                    timetable = self.scrape_timetable_structured()
+def get_browser_pool() -> Optional[BrowserPool]:
+    """Return the shared headless browser pool, creating and pre-warming it on first use."""
+    global _browser_pool
+    if SCRAPER_POOL_SIZE <= 0:
+        return None
+    with _browser_pool_lock:
+        if _browser_pool is None:
+            _browser_pool = BrowserPool()
+            _browser_pool.warm()
+        return _browser_pool
 
-            # Navigate back to the menu, open Grade Results, and scrape
-            self.navigate_back_to_menu()
-            if not self.click_grade_results():
-                raise RuntimeError("Could not open grade results page")
-            grades = self.scrape_grades()
 
-            return timetable, grades
-        finally:
-            # Keep the browser open a moment for visibility, then close
-            time.sleep(1.0)
-            self.stop()
+def current_browser_pool() -> Optional[BrowserPool]:
+    """The shared pool if one has been started, without starting it (for metrics)."""
+    return _browser_pool
 
 
 def save_csv(rows: List[List[str]], path: str) -> None:
@@ -546,10 +804,6 @@ def save_csv(rows: List[List[str]], path: str) -> None:
     print(f"Saved CSV to {path}")
 
 
-def _normalize_code(code: str) -> str:
-    return (code or "").upper().replace(" ", "").strip()
-
-
 def _dedupe_grades(grades: List[List[str]]) -> List[List[str]]:
     """Deduplicate grade rows by course code, keeping first occurrence."""
     if not grades:
@@ -640,17 +894,44 @@ def merge_timetable_and_exams(timetable: List[List[str]], exams: List[List[str]]
     return merged
 
 
-def get_schedule_json(username: str, password: str, headless: bool = True) -> dict:
+def _scrape_selenium(creds: Credentials, headless: bool) -> tuple[List[List[str]], List[List[str]]]:
+    pool = get_browser_pool() if headless else None
+    if pool is not None:
+        with pool.lease() as driver:
+            return AxiomFlowToPython(creds=creds, headless=headless, driver=driver).run()
+    flow = AxiomFlowToPython(creds=creds, headless=headless)
+    return flow.run()
+
+
+def get_schedule_json(username: str, password: str, headless: bool = True, engine: Optional[str] = None) -> dict:
     """
     Programmatic API to get schedule and grades as JSON-friendly dict.
+    engine: "http" (browserless, Selenium fallback) or "selenium"; defaults to SCRAPER_ENGINE.
 
     Returns:
       { "timetable": [ {day, location, course_name, start_time, end_time, course_code}, ... ],
         "grades":    [ {section, coursecode, coursename, credit, grade}, ... ] }
     """
     creds = Credentials(username=username, password=password)
-    flow = AxiomFlowToPython(creds=creds, headless=headless)
-    timetable, grades = flow.run()
+    engine = (engine or SCRAPER_ENGINE).lower()
+    if engine == "http":
+        import sis_http
+
+        try:
+            timetable, grades = sis_http.SISHttpScraper(creds).run()
+        except SISLoginError:
+            raise
+        except Exception as exc:
+            print(f"HTTP scrape failed ({exc}); falling back to Selenium.")
+            timetable, grades = _scrape_selenium(creds, headless)
+        else:
+            # An empty table is more likely markup the HTTP parser missed than a student
+            # with no classes; let the browser flow have the last word.
+            if len(timetable) <= 1:
+                print("HTTP scrape found no timetable rows; falling back to Selenium.")
+                timetable, grades = _scrape_selenium(creds, headless)
+    else:
+        timetable, grades = _scrape_selenium(creds, headless)
     grades = _dedupe_grades(grades)
 
     def _rows_to_dicts(rows: list[list[str]]) -> list[dict]:
@@ -668,33 +949,42 @@ def get_schedule_json(username: str, password: str, headless: bool = True) -> di
 
 
 def save_json(data: dict, path: str) -> None:
-    directory = os.path.dirname(path)
-    if directory and not os.path.exists(directory):
-        os.makedirs(directory, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    """Write JSON via a temp file + os.replace so readers never see a partial file."""
+    atomic_write(path, json.dumps(data, ensure_ascii=False, indent=2))
 
-def run_scraper(student_id: str, password: str, headless: bool = True) -> str:
+
+def run_scraper(student_id: str, password: str, headless: bool = True, engine: Optional[str] = None) -> str:
     """
     Run the scraper using provided credentials and save schedule_{student_id}.json next to this script.
+    The file is only rewritten when the scraped content changed (see schedule_changes).
     Returns the output path.
     """
-    data = get_schedule_json(student_id, password, headless=headless)
+    data = get_schedule_json(student_id, password, headless=headless, engine=engine)
     script_dir = os.path.dirname(os.path.abspath(__file__))
     out_path = os.path.join(script_dir, f"schedule_{student_id}.json")
-    save_json(data, out_path)
-    print(f"Saved JSON to {out_path}")
+    result = schedule_changes.record_scrape(student_id, out_path, data, save_json)
+    if result["changed"]:
+        print(f"Saved JSON to {out_path}")
+    else:
+        print(f"Schedule unchanged ({result['hash'][:12]}), kept {out_path}")
     return out_path
 
 
 if __name__ == "__main__":
     # Simple CLI:
-    #   python generate_schedule_json.py [username] [password] [--headless] [--json]
+    #   python generate_schedule_json.py [username] [password] [--headless] [--json] [--engine=http|selenium]
+    #   python generate_schedule_json.py --bench-startup [--webdriver-manager]
     # Default behavior: saves JSON to schedule_{username}.json next to this script
+    # Stage timings go to stderr, so --json output stays clean.
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     args = sys.argv[1:]
+    if "--bench-startup" in args:
+        print(json.dumps(benchmark_startup(headless=True, webdriver_manager="--webdriver-manager" in args), indent=2))
+        sys.exit(0)
     headless = "--headless" in args
     json_out = "--json" in args
-    args = [a for a in args if a not in ("--headless", "--json")]
+    engine = next((a.split("=", 1)[1] for a in args if a.startswith("--engine=")), None)
+    args = [a for a in args if a not in ("--headless", "--json") and not a.startswith("--engine=")]
 
     if len(args) >= 2:
         username, password = args[0], args[1]
@@ -704,9 +994,9 @@ if __name__ == "__main__":
 
     try:
         if json_out:
-            data = get_schedule_json(username, password, headless=headless)
+            data = get_schedule_json(username, password, headless=headless, engine=engine)
             print(json.dumps(data, ensure_ascii=False))
         else:
-            run_scraper(username, password, headless=headless)
+            run_scraper(username, password, headless=headless, engine=engine)
     except Exception as e:
         print(f"Automation failed: {e}")
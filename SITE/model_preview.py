@@ -0,0 +1,216 @@
+"""
+Low-detail preview of the campus model (prototype.glb -> prototype.preview.glb).
+
+The dashboard shows the preview first and swaps in the full model once it has
+downloaded, so phones get something on screen after a fraction of the bytes.
+
+With gltfpack (meshoptimizer) on PATH the preview is a simplified mesh
+(PREVIEW_SIMPLIFY of the triangles). Without it, the preview is the same geometry
+with every texture, image and texture-coordinate/tangent stream removed and the
+binary chunk repacked, which is where most of a photogrammetry-style model's weight
+sits. Only self-contained GLBs (one embedded buffer, no Draco/meshopt compression)
+can be stripped this way.
+
+Usage:
+  python model_preview.py [prototype.glb] [prototype.preview.glb]
+"""
+import json
+import os
+import shutil
+import struct
+import subprocess
+import sys
+
+from atomic_files import atomic_write
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL_PATH = os.path.join(BASE_DIR, "prototype.glb")
+DEFAULT_PREVIEW_PATH = os.path.join(BASE_DIR, "prototype.preview.glb")
+PREVIEW_SIMPLIFY = float(os.environ.get("MODEL_PREVIEW_SIMPLIFY", "0.2"))
+
+GLB_MAGIC = b"glTF"
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+# Extensions that only matter for textures; dropped along with them.
+TEXTURE_EXTENSIONS = {"KHR_texture_transform", "KHR_texture_basisu", "EXT_texture_webp", "EXT_texture_avif"}
+# Compressed geometry whose buffer views we cannot safely repack.
+UNSUPPORTED_EXTENSIONS = {"KHR_draco_mesh_compression", "EXT_meshopt_compression"}
+DROPPED_ATTRIBUTES = ("TEXCOORD_", "TANGENT")
+
+
+class PreviewError(Exception):
+    pass
+
+
+# -------- GLB container --------
+def read_glb(data: bytes) -> tuple:
+    """(gltf JSON, BIN chunk bytes or b"") of a binary glTF."""
+    if len(data) < 20 or data[:4] != GLB_MAGIC:
+        raise PreviewError("not a binary glTF file")
+    version, length = struct.unpack_from("<II", data, 4)
+    if version != 2:
+        raise PreviewError(f"glTF version {version} is not supported")
+    offset, gltf, binary = 12, None, b""
+    while offset + 8 <= min(length, len(data)):
+        chunk_length, chunk_type = struct.unpack_from("<II", data, offset)
+        chunk = data[offset + 8 : offset + 8 + chunk_length]
+        if chunk_type == CHUNK_JSON:
+            gltf = json.loads(chunk.decode("utf-8"))
+        elif chunk_type == CHUNK_BIN and not binary:
+            binary = bytes(chunk)
+        offset += 8 + chunk_length
+    if gltf is None:
+        raise PreviewError("GLB has no JSON chunk")
+    return gltf, binary
+
+
+def write_glb(gltf: dict, binary: bytes) -> bytes:
+    payload = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    payload += b" " * (-len(payload) % 4)
+    chunks = struct.pack("<II", len(payload), CHUNK_JSON) + payload
+    if binary:
+        binary += b"\0" * (-len(binary) % 4)
+        chunks += struct.pack("<II", len(binary), CHUNK_BIN) + binary
+    return GLB_MAGIC + struct.pack("<II", 2, 12 + len(chunks)) + chunks
+
+
+# -------- Stripping --------
+def _drop_texture_refs(value):
+    """Remove every *Texture reference (textureInfo objects) from a material tree."""
+    if isinstance(value, dict):
+        return {
+            k: _drop_texture_refs(v)
+            for k, v in value.items()
+            if not (k.endswith("Texture") and isinstance(v, dict) and "index" in v) and k not in TEXTURE_EXTENSIONS
+        }
+    if isinstance(value, list):
+        return [_drop_texture_refs(v) for v in value]
+    return value
+
+
+def _accessor_slots(gltf: dict):
+    """Yield (container, key) for every place that holds an accessor index."""
+    for mesh in gltf.get("meshes", []):
+        for primitive in mesh.get("primitives", []):
+            if "indices" in primitive:
+                yield primitive, "indices"
+            for attributes in [primitive.get("attributes", {})] + primitive.get("targets", []):
+                for name in attributes:
+                    yield attributes, name
+    for animation in gltf.get("animations", []):
+        for sampler in animation.get("samplers", []):
+            yield sampler, "input"
+            yield sampler, "output"
+    for skin in gltf.get("skins", []):
+        if "inverseBindMatrices" in skin:
+            yield skin, "inverseBindMatrices"
+
+
+def _view_slots(gltf: dict):
+    """Yield (container, key) for every place that holds a bufferView index."""
+    for accessor in gltf.get("accessors", []):
+        if "bufferView" in accessor:
+            yield accessor, "bufferView"
+        sparse = accessor.get("sparse")
+        if sparse:
+            yield sparse["indices"], "bufferView"
+            yield sparse["values"], "bufferView"
+
+
+def strip_textures(gltf: dict, binary: bytes) -> tuple:
+    """Geometry-only copy of (gltf, binary) with unused data dropped from the buffer."""
+    used_extensions = set(gltf.get("extensionsUsed", []))
+    if used_extensions & UNSUPPORTED_EXTENSIONS:
+        raise PreviewError("compressed geometry needs gltfpack to build a preview")
+    buffers = gltf.get("buffers", [])
+    if len(buffers) > 1 or any("uri" in b for b in buffers):
+        raise PreviewError("only GLBs with a single embedded buffer can be stripped")
+
+    gltf = json.loads(json.dumps(gltf))
+    for key in ("images", "textures", "samplers"):
+        gltf.pop(key, None)
+    gltf["materials"] = [_drop_texture_refs(m) for m in gltf.get("materials", [])]
+    for mesh in gltf.get("meshes", []):
+        for primitive in mesh.get("primitives", []):
+            attributes = primitive.get("attributes", {})
+            for name in [n for n in attributes if n.startswith(DROPPED_ATTRIBUTES)]:
+                del attributes[name]
+    for key in ("extensionsUsed", "extensionsRequired"):
+        if key in gltf:
+            gltf[key] = [e for e in gltf[key] if e not in TEXTURE_EXTENSIONS]
+            if not gltf[key]:
+                del gltf[key]
+
+    # Keep only the accessors and buffer views still referenced, renumbered in order.
+    accessors = gltf.get("accessors", [])
+    kept_accessors = sorted({container[key] for container, key in _accessor_slots(gltf)})
+    accessor_map = {old: new for new, old in enumerate(kept_accessors)}
+    for container, key in list(_accessor_slots(gltf)):
+        container[key] = accessor_map[container[key]]
+    gltf["accessors"] = [accessors[i] for i in kept_accessors]
+
+    views = gltf.get("bufferViews", [])
+    kept_views = sorted({container[key] for container, key in _view_slots(gltf)})
+    view_map = {old: new for new, old in enumerate(kept_views)}
+    packed = bytearray()
+    new_views = []
+    for old in kept_views:
+        view = dict(views[old])
+        start = view.get("byteOffset", 0)
+        packed += b"\0" * (-len(packed) % 4)  # 4-byte alignment suits every component type
+        view["byteOffset"] = len(packed)
+        view["buffer"] = 0
+        packed += binary[start : start + view["byteLength"]]
+        new_views.append(view)
+    for container, key in list(_view_slots(gltf)):
+        container[key] = view_map[container[key]]
+    gltf["bufferViews"] = new_views
+    if new_views:
+        gltf["buffers"] = [{"byteLength": len(packed)}]
+    else:
+        gltf.pop("buffers", None)
+        gltf.pop("bufferViews", None)
+    return gltf, bytes(packed)
+
+
+# -------- Build --------
+def build_preview(source: str = DEFAULT_MODEL_PATH, target: str = DEFAULT_PREVIEW_PATH) -> dict:
+    """Write target from source; returns {"method", "size", "source_size"}."""
+    gltfpack = shutil.which("gltfpack")
+    if gltfpack:
+        tmp_path = f"{target}.{os.getpid()}.tmp.glb"
+        try:
+            subprocess.run([gltfpack, "-i", source, "-o", tmp_path, "-si", str(PREVIEW_SIMPLIFY)], check=True, capture_output=True)
+            os.replace(tmp_path, target)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        method = "gltfpack"
+    else:
+        with open(source, "rb") as f:
+            gltf, binary = read_glb(f.read())
+        atomic_write(target, write_glb(*strip_textures(gltf, binary)))
+        method = "strip-textures"
+    return {"method": method, "size": os.path.getsize(target), "source_size": os.path.getsize(source)}
+
+
+def preview_current(source: str = DEFAULT_MODEL_PATH, target: str = DEFAULT_PREVIEW_PATH) -> bool:
+    try:
+        return os.stat(target).st_mtime_ns >= os.stat(source).st_mtime_ns
+    except OSError:
+        return False
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    src = args[0] if args else DEFAULT_MODEL_PATH
+    dst = args[1] if len(args) > 1 else DEFAULT_PREVIEW_PATH
+    try:
+        result = build_preview(src, dst)
+    except (OSError, PreviewError, subprocess.CalledProcessError) as exc:
+        print(f"Could not build a preview of {src}: {exc}")
+        sys.exit(1)
+    print(f"Wrote {dst} ({result['size']} of {result['source_size']} bytes, {result['method']})")
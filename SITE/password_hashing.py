@@ -0,0 +1,236 @@
+"""
+Password hashing off the request threads.
+
+scrypt/PBKDF2 are CPU-bound and hold the GIL, so a burst of logins hashed on the
+request threads serializes the whole server. PasswordHasher runs them in a process
+pool sized to the machine's cores; at most `max_pending` hashes may be queued or
+running, and a login arriving past that waits up to `wait_seconds` for a slot before
+HasherBusy is raised (the server answers 503 with Retry-After). The pool is created
+on the first hash, not at import, so a reloader parent or a script that merely
+imports the server never forks workers. A pool broken by a dying worker is replaced
+and the hash retried once.
+
+Successful verifications are remembered for `cache_seconds`, keyed by an HMAC of the
+stored hash and the password under a per-process key, so re-submitted logins and
+several tabs signing in at once do not hash again, and a changed hash never matches.
+
+The hash policy is a werkzeug method string ("scrypt", "scrypt:65536:8:1",
+"pbkdf2:sha256:600000"); needs_rehash() tells whether a stored hash was made with a
+different one, so the server can upgrade it on the next successful login.
+
+Usage:
+  python password_hashing.py bench [--seconds 5] [--workers N] [--method scrypt]
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = "scrypt"
+CACHE_MAX_ENTRIES = 10_000
+
+
+class HasherBusy(Exception):
+    """Every hashing slot stayed taken for the whole wait."""
+
+
+def policy_prefix(method: str) -> str:
+    """The prefix werkzeug writes for `method`, with its defaults filled in ("scrypt" -> "scrypt:32768:8:1")."""
+    return generate_password_hash("policy", method).split("$", 1)[0]
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        method: str = DEFAULT_METHOD,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        wait_seconds: float = 5.0,
+        cache_seconds: float = 300.0,
+    ):
+        self.method = method
+        self.prefix = policy_prefix(method)
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_pending = max(1, max_pending or self.workers * 4)
+        self.wait_seconds = wait_seconds
+        self.cache_seconds = cache_seconds
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._cache_key = secrets.token_bytes(32)
+        self._cache: "OrderedDict[bytes, float]" = OrderedDict()  # fingerprint -> expires at
+        self._cache_lock = threading.Lock()
+        self._stats = {"hashes": 0, "verifies": 0, "cache_hits": 0, "rejected_busy": 0, "rehash_needed": 0, "pool_restarts": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def _discard(self, pool: ProcessPoolExecutor) -> None:
+        with self._pool_lock:
+            if self._pool is not pool:
+                return  # another caller already replaced it
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        self._count("pool_restarts")
+
+    def start(self) -> None:
+        """Launch the worker processes now rather than on the first login."""
+        # The first task makes the executor launch every worker at once.
+        self._submit(int)
+
+    def _submit(self, fn, *args):
+        pool = self._executor()
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            self._discard(pool)
+            raise
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.wait_seconds):
+            self._count("rejected_busy")
+            raise HasherBusy()
+        try:
+            try:
+                return self._submit(fn, *args)
+            except BrokenProcessPool:
+                # A worker died (OOM killer, a crash); the next pool gets one more try.
+                return self._submit(fn, *args)
+        finally:
+            self._slots.release()
+
+    # -------- Verified-credential cache --------
+    def _fingerprint(self, pwhash: str, password: str) -> bytes:
+        return hmac.new(self._cache_key, f"{pwhash}\0{password}".encode("utf-8"), hashlib.sha256).digest()
+
+    def _cached(self, fingerprint: bytes) -> bool:
+        with self._cache_lock:
+            expires_at = self._cache.get(fingerprint)
+            if expires_at is None:
+                return False
+            if expires_at < time.time():
+                del self._cache[fingerprint]
+                return False
+            self._cache.move_to_end(fingerprint)
+            return True
+
+    def _remember(self, fingerprint: bytes) -> None:
+        with self._cache_lock:
+            self._cache[fingerprint] = time.time() + self.cache_seconds
+            self._cache.move_to_end(fingerprint)
+            while len(self._cache) > CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+
+    # -------- Public API --------
+    def hash(self, password: str) -> str:
+        self._count("hashes")
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        if not pwhash:
+            return False
+        fingerprint = self._fingerprint(pwhash, password)
+        if self.cache_seconds > 0 and self._cached(fingerprint):
+            self._count("cache_hits")
+            return True
+        self._count("verifies")
+        ok = self._run(check_password_hash, pwhash, password)
+        if ok and self.cache_seconds > 0:
+            self._remember(fingerprint)
+        return ok
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        stale = bool(pwhash) and pwhash.split("$", 1)[0] != self.prefix
+        if stale:
+            self._count("rehash_needed")
+        return stale
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        with self._cache_lock:
+            stats["cached_credentials"] = len(self._cache)
+        return {"method": self.prefix, "workers": self.workers, "max_pending": self.max_pending, **stats}
+
+    def shutdown(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+def bench(seconds: float = 5.0, workers: Optional[int] = None, method: str = DEFAULT_METHOD) -> dict:
+    """Logins per second hashed inline on one thread vs. through the pool from many threads."""
+    pwhash = generate_password_hash("correct horse", method)
+
+    inline = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        check_password_hash(pwhash, "correct horse")
+        inline += 1
+
+    hasher = PasswordHasher(method, workers=workers, cache_seconds=0, wait_seconds=seconds * 2)
+    hasher.start()  # outside the timing, before the login threads
+    pooled = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def login_loop() -> None:
+        nonlocal pooled
+        while time.perf_counter() < deadline:
+            hasher.verify(pwhash, "correct horse")
+            with lock:
+                pooled += 1
+
+    threads = [threading.Thread(target=login_loop) for _ in range(hasher.max_pending)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    hasher.shutdown()
+
+    cached = PasswordHasher(method, workers=1)
+    cached.verify(pwhash, "correct horse")
+    started = time.perf_counter()
+    for _ in range(10_000):
+        cached.verify(pwhash, "correct horse")
+    cached_rate = 10_000 / (time.perf_counter() - started)
+    cached.shutdown()
+
+    return {
+        "method": hasher.prefix,
+        "workers": hasher.workers,
+        "inline_logins_per_s": round(inline / seconds, 1),
+        "pooled_logins_per_s": round(pooled / seconds, 1),
+        "pooled_logins_per_s_per_core": round(pooled / seconds / hasher.workers, 1),
+        "cached_logins_per_s": round(cached_rate, 1),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=("bench",))
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--method", default=DEFAULT_METHOD)
+    args = parser.parse_args()
+    print(json.dumps(bench(args.seconds, args.workers, args.method), indent=2))
@@ -0,0 +1,207 @@
+"""
+Differential schedule refresh.
+
+Every scrape is hashed (canonical JSON) and diffed against the schedule already on
+disk. schedule_{id}.json is only rewritten when the hash changes, and each change is
+appended to a compact per-student log in data/schedule_changes/{id}.json:
+
+  {"hash": str, "checked_at": float, "changed_at": float,
+   "changes": [{"at": float, "hash": str, "diff": {...}}, ...]}
+
+Whenever the JSON is written, its canonical (compact, sorted-key) form is also saved
+next to it as schedule_{id}.min.json, with .gz and, when the brotli package is
+installed, .br copies. The canonical bytes are exactly what content_hash hashes, so
+the server can use the hash as a strong ETag and serve the precompressed bytes as is.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import List, Optional
+
+from atomic_files import atomic_write
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip variants are written
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SCHEDULE_CHANGES_DIR = os.path.join(BASE_DIR, "data", "schedule_changes")
+MAX_LOGGED_CHANGES = 50
+
+_lock = threading.Lock()
+
+
+def canonical_bytes(data: dict) -> bytes:
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def content_hash(data: dict) -> str:
+    return hashlib.sha256(canonical_bytes(data)).hexdigest()
+
+
+# -------- Precompressed variants --------
+def variant_paths(json_path: str) -> dict:
+    """Content-Encoding -> file for the compact copies of json_path."""
+    base = f"{json_path[:-5] if json_path.endswith('.json') else json_path}.min.json"
+    paths = {"identity": base, "gzip": f"{base}.gz"}
+    if brotli is not None:
+        paths["br"] = f"{base}.br"
+    return paths
+
+
+def write_variants(json_path: str, data: dict) -> str:
+    """(Re)write the compact and precompressed copies of json_path; returns the content hash."""
+    canonical = canonical_bytes(data)
+    paths = variant_paths(json_path)
+    # Compressed copies first: the identity file's mtime marks the set as complete.
+    atomic_write(paths["gzip"], gzip.compress(canonical, compresslevel=9, mtime=0))
+    if "br" in paths:
+        atomic_write(paths["br"], brotli.compress(canonical, quality=11))
+    atomic_write(paths["identity"], canonical)
+    return hashlib.sha256(canonical).hexdigest()
+
+
+def variants_current(json_path: str) -> bool:
+    """True when every variant exists and is no older than json_path."""
+    try:
+        source_mtime = os.stat(json_path).st_mtime_ns
+        return all(os.stat(path).st_mtime_ns >= source_mtime for path in variant_paths(json_path).values())
+    except OSError:
+        return False
+
+
+def _code(value: str) -> str:
+    return (value or "").upper().replace(" ", "").strip()
+
+
+def _sessions_by_course(timetable: List[dict]) -> dict:
+    courses: dict = {}
+    for row in timetable or []:
+        code = _code(row.get("course_code", ""))
+        if not code:
+            continue
+        entry = courses.setdefault(code, {"course_name": row.get("course_name", ""), "sessions": []})
+        entry["sessions"].append(
+            {
+                "day": row.get("day", ""),
+                "start_time": row.get("start_time", ""),
+                "end_time": row.get("end_time", ""),
+                "location": row.get("location", ""),
+            }
+        )
+    for entry in courses.values():
+        entry["sessions"].sort(key=lambda s: (s["day"], s["start_time"], s["end_time"], s["location"]))
+    return courses
+
+
+def _grades_by_course(grades: List[dict]) -> dict:
+    return {_code(g.get("coursecode", "")): g for g in grades or [] if _code(g.get("coursecode", ""))}
+
+
+def _times(sessions: List[dict]) -> list:
+    return [(s["day"], s["start_time"], s["end_time"]) for s in sessions]
+
+
+def _rooms(sessions: List[dict]) -> list:
+    return [s["location"] for s in sessions]
+
+
+def diff_schedules(old: Optional[dict], new: dict) -> dict:
+    """Structural diff of two get_schedule_json payloads; empty lists mean no change."""
+    old = old or {}
+    before = _sessions_by_course(old.get("timetable") or [])
+    after = _sessions_by_course(new.get("timetable") or [])
+    added = [{"course_code": c, "course_name": after[c]["course_name"]} for c in sorted(after.keys() - before.keys())]
+    removed = [{"course_code": c, "course_name": before[c]["course_name"]} for c in sorted(before.keys() - after.keys())]
+    changed = []
+    for code in sorted(before.keys() & after.keys()):
+        b, a = before[code]["sessions"], after[code]["sessions"]
+        if b == a:
+            continue
+        fields = []
+        if _times(b) != _times(a):
+            fields.append("time")
+        if _rooms(b) != _rooms(a):
+            fields.append("location")
+        changed.append(
+            {"course_code": code, "course_name": after[code]["course_name"], "fields": fields, "before": b, "after": a}
+        )
+
+    old_grades = _grades_by_course(old.get("grades") or [])
+    new_grades = _grades_by_course(new.get("grades") or [])
+    grades_new = [new_grades[c] for c in sorted(new_grades.keys() - old_grades.keys())]
+    grades_changed = [
+        {"coursecode": c, "before": old_grades[c].get("grade", ""), "after": new_grades[c].get("grade", "")}
+        for c in sorted(new_grades.keys() & old_grades.keys())
+        if old_grades[c].get("grade", "") != new_grades[c].get("grade", "")
+    ]
+    grades_removed = [old_grades[c] for c in sorted(old_grades.keys() - new_grades.keys())]
+
+    return {
+        "courses_added": added,
+        "courses_removed": removed,
+        "courses_changed": changed,
+        "grades_new": grades_new,
+        "grades_changed": grades_changed,
+        "grades_removed": grades_removed,
+    }
+
+
+def _log_path(student_id: str) -> str:
+    return os.path.join(SCHEDULE_CHANGES_DIR, f"{student_id}.json")
+
+
+def load_log(student_id: str) -> Optional[dict]:
+    try:
+        with open(_log_path(student_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_log(student_id: str, log: dict) -> None:
+    atomic_write(_log_path(student_id), json.dumps(log, ensure_ascii=False, separators=(",", ":")))
+
+
+def last_checked(student_id: str) -> Optional[float]:
+    """When the schedule was last confirmed against the SIS (changed or not)."""
+    log = load_log(student_id)
+    return float(log["checked_at"]) if log and log.get("checked_at") else None
+
+
+def record_scrape(student_id: str, out_path: str, data: dict, write_json) -> dict:
+    """
+    Compare a fresh scrape with out_path, write it via write_json(data, path) only if the
+    content hash changed, and log the diff. Returns {"changed", "hash", "diff"}.
+    """
+    new_hash = content_hash(data)
+    now = time.time()
+    with _lock:
+        log = load_log(student_id) or {"hash": "", "checked_at": 0, "changed_at": 0, "changes": []}
+        previous = None
+        if os.path.isfile(out_path):
+            try:
+                with open(out_path, "r", encoding="utf-8") as f:
+                    previous = json.load(f)
+            except (OSError, ValueError):
+                previous = None
+        old_hash = content_hash(previous) if previous is not None else ""
+
+        changed = new_hash != old_hash
+        diff = diff_schedules(previous, data) if changed else {}
+        if changed:
+            write_json(data, out_path)
+            write_variants(out_path, data)
+            log["changed_at"] = now
+            log["changes"].append({"at": now, "hash": new_hash, "diff": diff})
+            log["changes"] = log["changes"][-MAX_LOGGED_CHANGES:]
+        elif not variants_current(out_path):
+            write_variants(out_path, previous)
+        log["hash"] = new_hash
+        log["checked_at"] = now
+        _save_log(student_id, log)
+    return {"changed": changed, "hash": new_hash, "diff": diff}
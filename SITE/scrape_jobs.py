@@ -0,0 +1,283 @@
+"""
+Background SIS scrape jobs, so /login returns immediately instead of holding a
+request thread for the whole scrape.
+
+Jobs run on a fixed number of worker threads, are de-duplicated per student (a
+second login while a scrape is queued or running gets the same job), and are retried
+with exponential backoff unless the failure is marked non-retryable (e.g. rejected
+credentials). A job's on_success callback (e.g. creating the local account) runs
+after the scrape; if it fails, the retry runs only the callback, not the scrape.
+SingleFlight coalesces any remaining concurrent scrapes of one student.
+"""
+import hashlib
+import heapq
+import itertools
+import threading
+import time
+import uuid
+from typing import Any, Callable, Optional
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# Finished jobs stay queryable this long so the dashboard can read the outcome.
+JOB_RETENTION_SECONDS = 15 * 60
+
+
+def credential_key(student_id: str, password: str) -> tuple:
+    return student_id, hashlib.sha256(password.encode("utf-8")).hexdigest()
+
+
+class ScrapeJob:
+    def __init__(self, student_id: str, password: str, on_success: Optional[Callable[[], None]] = None):
+        self.id = uuid.uuid4().hex[:16]
+        self.student_id = student_id
+        self.state = JOB_QUEUED
+        self.attempts = 0
+        self.error = ""
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.next_attempt_at = self.created_at
+        self.scraped = False  # the runner succeeded; retries only redo on_success
+        # Identifies the credentials without keeping them: only identical logins share a job.
+        self.credential = credential_key(student_id, password)
+        # Credentials live only in memory and are dropped once the job settles.
+        self._password: Optional[str] = password
+        self._on_success = on_success
+
+    @property
+    def active(self) -> bool:
+        return self.state in (JOB_QUEUED, JOB_RUNNING)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "student_id": self.student_id,
+            "state": self.state,
+            "attempts": self.attempts,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ScrapeJobQueue:
+    def __init__(
+        self,
+        runner: Callable[[str, str], object],
+        workers: int = 4,
+        max_attempts: int = 3,
+        backoff_seconds: float = 5.0,
+        retryable: Callable[[Exception], bool] = lambda exc: True,
+        logger=None,
+    ):
+        self.runner = runner
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_seconds = backoff_seconds
+        self.retryable = retryable
+        self.logger = logger
+        self._cond = threading.Condition()
+        self._heap: list = []  # (ready_at, seq, job)
+        self._seq = itertools.count()
+        self._jobs: dict = {}  # job id -> ScrapeJob
+        self._by_credential: dict = {}  # (student id, password digest) -> active ScrapeJob
+        self._running = 0
+        self._started = False
+        self._stats = {
+            "submitted": 0,
+            "deduplicated": 0,
+            "completed": 0,
+            "failed": 0,
+            "retries": 0,
+            "started": 0,
+            "wait_total_s": 0.0,
+            "wait_max_s": 0.0,
+            "run_total_s": 0.0,
+            "run_max_s": 0.0,
+            "runs": 0,
+        }
+
+    # -------- Public API --------
+    def submit(self, student_id: str, password: str, on_success: Optional[Callable[[], None]] = None) -> ScrapeJob:
+        """
+        Queue a scrape for student_id, or return the one already queued/running with the
+        same password. A login with a different password always gets its own job, so it
+        can neither ride on nor spoil someone else's.
+        """
+        with self._cond:
+            self._ensure_workers()
+            self._prune()
+            existing = self._by_credential.get(credential_key(student_id, password))
+            if existing is not None and existing.active:
+                self._stats["deduplicated"] += 1
+                return existing
+            job = ScrapeJob(student_id, password, on_success)
+            self._jobs[job.id] = job
+            self._by_credential[job.credential] = job
+            heapq.heappush(self._heap, (job.next_attempt_at, next(self._seq), job))
+            self._stats["submitted"] += 1
+            self._cond.notify()
+            return job
+
+    def get(self, job_id: str) -> Optional[ScrapeJob]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def active_job_for(self, student_id: str, password: str) -> Optional[ScrapeJob]:
+        with self._cond:
+            job = self._by_credential.get(credential_key(student_id, password))
+            return job if job is not None and job.active else None
+
+    def stats(self) -> dict:
+        with self._cond:
+            runs = self._stats["runs"]
+            started = self._stats["started"]
+            return {
+                "workers": self.workers,
+                "queue_depth": len(self._heap),
+                "running": self._running,
+                "wait_avg_s": round(self._stats["wait_total_s"] / started, 4) if started else 0.0,
+                "run_avg_s": round(self._stats["run_total_s"] / runs, 4) if runs else 0.0,
+                **{k: round(v, 4) if isinstance(v, float) else v for k, v in self._stats.items()},
+            }
+
+    # -------- Workers --------
+    def _ensure_workers(self) -> None:
+        if self._started:
+            return
+        self._started = True
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"scrape-worker-{i}", daemon=True).start()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        stale = [jid for jid, job in self._jobs.items() if not job.active and (job.finished_at or 0) < cutoff]
+        for jid in stale:
+            job = self._jobs.pop(jid)
+            if self._by_credential.get(job.credential) is job:
+                del self._by_credential[job.credential]
+
+    def _next_job(self) -> ScrapeJob:
+        with self._cond:
+            while True:
+                now = time.time()
+                if self._heap and self._heap[0][0] <= now:
+                    _, _, job = heapq.heappop(self._heap)
+                    job.state = JOB_RUNNING
+                    job.attempts += 1
+                    if job.attempts == 1:
+                        job.started_at = now
+                        self._stats["started"] += 1
+                        waited = now - job.created_at
+                        self._stats["wait_total_s"] += waited
+                        self._stats["wait_max_s"] = max(self._stats["wait_max_s"], waited)
+                    self._running += 1
+                    return job
+                timeout = self._heap[0][0] - now if self._heap else None
+                self._cond.wait(timeout)
+
+    def _worker(self) -> None:
+        while True:
+            job = self._next_job()
+            started = time.perf_counter()
+            error: Optional[Exception] = None
+            try:
+                if not job.scraped:
+                    self.runner(job.student_id, job._password or "")
+                    job.scraped = True
+                if job._on_success is not None:
+                    job._on_success()
+            except Exception as exc:
+                error = exc
+            elapsed = time.perf_counter() - started
+            self._settle(job, error, elapsed)
+
+    def _settle(self, job: ScrapeJob, error: Optional[Exception], elapsed: float) -> None:
+        with self._cond:
+            self._running -= 1
+            self._stats["runs"] += 1
+            self._stats["run_total_s"] += elapsed
+            self._stats["run_max_s"] = max(self._stats["run_max_s"], elapsed)
+            if error is None:
+                job.state = JOB_DONE
+                job.error = ""
+                self._stats["completed"] += 1
+            elif job.attempts < self.max_attempts and self.retryable(error):
+                job.state = JOB_QUEUED
+                job.error = str(error)
+                job.next_attempt_at = time.time() + self.backoff_seconds * (2 ** (job.attempts - 1))
+                heapq.heappush(self._heap, (job.next_attempt_at, next(self._seq), job))
+                self._stats["retries"] += 1
+                self._cond.notify()
+            else:
+                job.state = JOB_FAILED
+                job.error = str(error)
+                self._stats["failed"] += 1
+            if not job.active:
+                job.finished_at = time.time()
+                job._password = None
+                job._on_success = None
+        if error is not None and self.logger is not None:
+            self.logger.warning("Scrape job %s for %s failed (attempt %s): %s", job.id, job.student_id, job.attempts, error)
+
+
+class _Flight:
+    def __init__(self, token: Optional[str]):
+        self.token = token
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution.
+
+    Callers arriving while a call for `key` is in flight wait for it and share its
+    result or exception. `token` guards sharing: a caller whose token differs (e.g. a
+    different password for the same student) waits for the flight, then runs its own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: dict = {}
+        self._stats = {"calls": 0, "executions": 0, "coalesced": 0}
+
+    def do(self, key: str, fn: Callable[[], Any], token: Optional[str] = None) -> Any:
+        with self._lock:
+            self._stats["calls"] += 1
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = _Flight(token)
+                    self._flights[key] = flight
+                    self._stats["executions"] += 1
+            if leader:
+                try:
+                    flight.result = fn()
+                except BaseException as exc:
+                    flight.error = exc
+                finally:
+                    with self._lock:
+                        del self._flights[key]
+                    flight.done.set()
+            else:
+                flight.done.wait()
+                if flight.token != token:
+                    continue
+                with self._lock:
+                    self._stats["coalesced"] += 1
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"in_flight": len(self._flights), **self._stats}
@@ -1,35 +1,78 @@
+import hashlib
+import hmac
 import json
 import math
+import mimetypes
 import os
 import secrets
 import shutil
 import string
+import struct
+import threading
 import time
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional
 from urllib.parse import quote
 import csv
 import io
 
+import attendance_analytics
+import attendance_events
+import attendance_store
+import build_assets
 import generate_schedule_json
-from flask import Flask, request, redirect, send_from_directory, abort, make_response, session, render_template
-from werkzeug.security import generate_password_hash, check_password_hash
+import password_hashing
+import schedule_changes
+import scrape_jobs
+import user_store
+from flask import Flask, Response, request, redirect, send_file, send_from_directory, abort, make_response, session, render_template
+from werkzeug.http import http_date
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 SCHEDULE_PATH = os.path.join(BASE_DIR, "schedule.json")
+ASSET_DIST_DIR = os.environ.get("ASSET_DIST_DIR", build_assets.DEFAULT_OUT_DIR)
 # Legacy scraper output location (SCRIPT/ schedule.json) to keep compatibility.
 app = Flask(__name__, static_folder=None)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "dev-secret-change-me")
 
 MAX_SCHEDULE_AGE_SECONDS = 7 * 24 * 60 * 60  # one week
+# Stale-while-revalidate: past the soft TTL a login is served the cached schedule and a
+# background refresh is queued; only past the hard TTL (or with no file) does it wait.
+SCHEDULE_SOFT_TTL_SECONDS = int(os.environ.get("SCHEDULE_SOFT_TTL_SECONDS", str(24 * 60 * 60)))
+SCHEDULE_HARD_TTL_SECONDS = int(os.environ.get("SCHEDULE_HARD_TTL_SECONDS", str(MAX_SCHEDULE_AGE_SECONDS)))
 USER_STORE_PATH = os.path.join(BASE_DIR, "users.json")
+# "json" (users.json, cached in memory) or "sqlite" (an empty database imports users.json).
+USER_BACKEND = os.environ.get("USER_BACKEND", "json").strip().lower()
+USER_DB_PATH = os.environ.get("USER_DB_PATH", os.path.join(BASE_DIR, "data", "users.sqlite3"))
+# werkzeug method for new hashes; stored hashes made another way are upgraded on login.
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt").strip()
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "0"))  # 0 = one per core
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", "0"))  # 0 = 4 per worker
+PASSWORD_CACHE_SECONDS = int(os.environ.get("PASSWORD_CACHE_SECONDS", "300"))
 CAMPUS_LAT = 13.720399
 CAMPUS_LNG = 100.453165
 CAMPUS_RADIUS_M = 300  # meters
 ATTENDANCE_DIR = os.path.join(BASE_DIR, "data", "attendance")
 ATTENDANCE_HISTORY_DIR = os.path.join(BASE_DIR, "data", "attendance_history")
+# "json" (one file per session, for development) or "sqlite" (WAL database).
+ATTENDANCE_BACKEND = os.environ.get("ATTENDANCE_BACKEND", "json").strip().lower()
+ATTENDANCE_ANALYTICS_PATH = os.path.join(BASE_DIR, "data", "attendance_analytics.json")
+# Live sessions are auto-stopped and archived past either limit; 0 disables the sweeper.
+ATTENDANCE_MAX_SESSION_SECONDS = int(os.environ.get("ATTENDANCE_MAX_SESSION_SECONDS", str(4 * 60 * 60)))
+ATTENDANCE_IDLE_SECONDS = int(os.environ.get("ATTENDANCE_IDLE_SECONDS", str(45 * 60)))
+ATTENDANCE_SWEEP_INTERVAL_SECONDS = int(os.environ.get("ATTENDANCE_SWEEP_INTERVAL_SECONDS", "60"))
+ATTENDANCE_DB_PATH = os.environ.get("ATTENDANCE_DB_PATH", os.path.join(BASE_DIR, "data", "attendance.sqlite3"))
 ALLOW_OFFCAMPUS = os.environ.get("ALLOW_OFFCAMPUS", "").strip().lower() in ("1", "true", "yes", "on")
+# Resolve chromedriver and launch pooled browsers at startup instead of on the first login.
+SCRAPER_PREWARM = os.environ.get("SCRAPER_PREWARM", "").strip().lower() in ("1", "true", "yes", "on")
+SCRAPE_WORKERS = int(os.environ.get("SCRAPE_WORKERS", "4"))  # concurrent background scrapes
+SCRAPE_MAX_ATTEMPTS = int(os.environ.get("SCRAPE_MAX_ATTEMPTS", "3"))
+# Live roster streams end after this long; EventSource reconnects with Last-Event-ID.
+ATTENDANCE_SSE_MAX_SECONDS = int(os.environ.get("ATTENDANCE_SSE_MAX_SECONDS", "300"))
+ATTENDANCE_SSE_HEARTBEAT_SECONDS = 15
+# Queued offline check-ins accepted per /checkin/batch request.
+ATTENDANCE_BATCH_MAX = int(os.environ.get("ATTENDANCE_BATCH_MAX", "50"))
 
 
 def haversine_distance_m(lat1, lon1, lat2, lon2):
@@ -68,171 +111,464 @@ def _legacy_schedule_path(student_id: str) -> str:
     return os.path.join(os.path.dirname(BASE_DIR), "SCRIPT", _schedule_filename(student_id))
 
 
-def _schedule_is_recent(student_id: str, max_age_seconds: int = MAX_SCHEDULE_AGE_SECONDS) -> bool:
-    """Return True if schedule file exists and is newer than max_age_seconds (defaults to one week)."""
-    schedule_path = _schedule_path(student_id)
-    if not os.path.isfile(schedule_path):
-        return False
+SCHEDULE_FRESH = "fresh"
+SCHEDULE_STALE = "stale"
+SCHEDULE_EXPIRED = "expired"
+SCHEDULE_MISSING = "missing"
+
+_schedule_cache_lock = threading.Lock()
+_schedule_cache_stats = {"hit": 0, "stale_hit": 0, "miss": 0}
+
+
+def _schedule_age(student_id: str) -> Optional[float]:
+    """Seconds since the schedule was last confirmed against the SIS (unchanged scrapes count)."""
     try:
-        age_seconds = time.time() - os.path.getmtime(schedule_path)
+        updated = os.path.getmtime(_schedule_path(student_id))
     except OSError:
-        return False
-    return age_seconds < max_age_seconds
+        return None
+    checked = schedule_changes.last_checked(student_id)
+    if checked is not None:
+        updated = max(updated, checked)
+    return max(0.0, time.time() - updated)
+
+
+def _schedule_freshness(student_id: str) -> str:
+    """Classify the cached schedule against the soft/hard TTLs."""
+    age = _schedule_age(student_id)
+    if age is None:
+        return SCHEDULE_MISSING
+    if age < SCHEDULE_SOFT_TTL_SECONDS:
+        return SCHEDULE_FRESH
+    if age < SCHEDULE_HARD_TTL_SECONDS:
+        return SCHEDULE_STALE
+    return SCHEDULE_EXPIRED
+
+
+def _record_schedule_lookup(freshness: str) -> None:
+    key = {SCHEDULE_FRESH: "hit", SCHEDULE_STALE: "stale_hit"}.get(freshness, "miss")
+    with _schedule_cache_lock:
+        _schedule_cache_stats[key] += 1
+
+
+def _schedule_cache_metrics() -> dict:
+    with _schedule_cache_lock:
+        stats = dict(_schedule_cache_stats)
+    total = sum(stats.values())
+    for key in ("hit", "stale_hit", "miss"):
+        stats[f"{key}_rate"] = round(stats[key] / total, 4) if total else 0.0
+    stats["lookups"] = total
+    return stats
+
+
+user_storage = (
+    user_store.SqliteUserStore(USER_DB_PATH)
+    if USER_BACKEND == "sqlite"
+    else user_store.JsonUserStore(USER_STORE_PATH, logger=app.logger)
+)
+if user_storage.name == "sqlite" and user_storage.count() == 0 and os.path.isfile(USER_STORE_PATH):
+    user_storage.import_json(user_store.JsonUserStore(USER_STORE_PATH, logger=app.logger))
+elif user_storage.name == "json" and user_storage.count() > user_store.JSON_USERS_SOFT_LIMIT:
+    app.logger.warning(
+        "users.json holds %s accounts; set USER_BACKEND=sqlite above %s",
+        user_storage.count(),
+        user_store.JSON_USERS_SOFT_LIMIT,
+    )
 
 
-def _load_users() -> dict:
-    if not os.path.isfile(USER_STORE_PATH):
-        return {}
-    try:
-        with open(USER_STORE_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        if isinstance(data, dict):
-            return data
-    except Exception:
-        app.logger.exception("Failed to read user store")
-    return {}
+attendance_bus = attendance_events.SessionEventBus()
+attendance_storage = (
+    attendance_store.SqliteAttendanceStore(ATTENDANCE_DB_PATH)
+    if ATTENDANCE_BACKEND == "sqlite"
+    else attendance_store.JsonAttendanceStore(ATTENDANCE_DIR, ATTENDANCE_HISTORY_DIR, logger=app.logger)
+)
 
 
-def _save_users(users: dict) -> None:
-    tmp_path = USER_STORE_PATH + ".tmp"
-    with open(tmp_path, "w", encoding="utf-8") as f:
-        json.dump(users, f, ensure_ascii=False, indent=2)
-    os.replace(tmp_path, USER_STORE_PATH)
+def _generate_session_token(length: int = 5) -> str:
+    alphabet = string.ascii_uppercase + string.digits
+    return "".join(secrets.choice(alphabet) for _ in range(length))
 
 
-def _ensure_attendance_dir() -> None:
-    os.makedirs(ATTENDANCE_DIR, exist_ok=True)
+attendance_stats = attendance_analytics.AttendanceAnalytics(ATTENDANCE_ANALYTICS_PATH, logger=app.logger)
+if not attendance_stats.loaded:
+    attendance_stats.rebuild(attendance_storage.list_history(None))
 
 
-def _ensure_attendance_history_dir() -> None:
-    os.makedirs(ATTENDANCE_HISTORY_DIR, exist_ok=True)
+def _load_attendance_session(session_id: str) -> Optional[dict]:
+    return attendance_storage.load_session(session_id)
 
 
-def _attendance_path(session_id: str) -> str:
-    return os.path.join(ATTENDANCE_DIR, f"{session_id}.json")
+def _save_attendance_session(session_id: str, payload: dict) -> None:
+    attendance_storage.save_session(session_id, payload)
 
 
-def _generate_session_token(length: int = 5) -> str:
-    alphabet = string.ascii_uppercase + string.digits
-    return "".join(secrets.choice(alphabet) for _ in range(length))
+# Check-in codes are TOTP-style (RFC 4226 truncation of HMAC-SHA1 over the window
+# counter): derived from a per-session secret and the current window, so issuing,
+# showing and validating a code needs no I/O. Codes from the previous
+# ATTENDANCE_CODE_GRACE_WINDOWS windows are still accepted.
+ATTENDANCE_CODE_WINDOW_SECONDS = int(os.environ.get("ATTENDANCE_CODE_WINDOW_SECONDS", "10"))
+ATTENDANCE_CODE_GRACE_WINDOWS = int(os.environ.get("ATTENDANCE_CODE_GRACE_WINDOWS", "1"))
+ATTENDANCE_CODE_DIGITS = 5
+# Oldest queued offline check-in accepted, measured from when it was made. This bounds
+# how long a code read off the screen stays usable, including for a stopped session.
+ATTENDANCE_OFFLINE_MAX_AGE_SECONDS = int(os.environ.get("ATTENDANCE_OFFLINE_MAX_AGE_SECONDS", str(5 * 60)))
 
+# Secrets of active sessions (session_id -> bytes), rebuilt from the attendance
+# store at startup, plus a per-window cache of code -> [session_id, ...] for O(1) check-in.
+_code_index_lock = threading.Lock()
+_session_secrets: dict = {}
+_window_codes: dict = {}
+# Sessions stopped less than ATTENDANCE_OFFLINE_MAX_AGE_SECONDS ago:
+# session_id -> (secret, started_at, stopped_at). In memory, like the index above.
+_stopped_secrets: dict = {}
 
-def _generate_code(length: int = 5) -> str:
-    alphabet = string.digits
-    return "".join(secrets.choice(alphabet) for _ in range(length))
 
+def _session_secret(session_id: str, attendance: dict) -> bytes:
+    secret = attendance.get("code_secret")
+    if secret:
+        return bytes.fromhex(secret)
+    # Sessions started before codes were time-derived have no stored secret.
+    return hmac.new(app.secret_key.encode("utf-8"), session_id.encode("utf-8"), hashlib.sha256).digest()
 
-def _load_attendance_session(session_id: str) -> Optional[dict]:
-    path = _attendance_path(session_id)
-    if not os.path.isfile(path):
-        return None
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        app.logger.exception("Failed to read attendance session %s", session_id)
-        return None
 
+def _code_window(now: Optional[float] = None) -> int:
+    return int((now if now is not None else time.time()) // ATTENDANCE_CODE_WINDOW_SECONDS)
 
-def _save_attendance_session(session_id: str, payload: dict) -> None:
-    _ensure_attendance_dir()
-    path = _attendance_path(session_id)
-    tmp_path = path + ".tmp"
-    with open(tmp_path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
-    os.replace(tmp_path, path)
 
+def _totp_code(secret: bytes, window: int) -> str:
+    digest = hmac.new(secret, struct.pack(">Q", window), hashlib.sha1).digest()
+    offset = digest[-1] & 0x0F
+    value = struct.unpack(">I", digest[offset : offset + 4])[0] & 0x7FFFFFFF
+    return str(value % 10**ATTENDANCE_CODE_DIGITS).zfill(ATTENDANCE_CODE_DIGITS)
 
-def _ensure_current_code(session_id: str, attendance: dict, now: Optional[float] = None) -> str:
-    now = now or time.time()
-    issued_at = float(attendance.get("code_issued_at") or 0)
-    current_code = attendance.get("current_code")
-    if not current_code or (now - issued_at) >= 10:
-        current_code = _generate_code()
-        attendance["current_code"] = current_code
-        attendance["code_issued_at"] = now
-        _save_attendance_session(session_id, attendance)
-    return current_code
-
-
-def _find_session_by_code(code: str) -> Optional[tuple]:
-    _ensure_attendance_dir()
-    for filename in os.listdir(ATTENDANCE_DIR):
-        if not filename.endswith(".json"):
+
+def _current_code(session_id: str, attendance: dict, now: Optional[float] = None) -> str:
+    return _totp_code(_session_secret(session_id, attendance), _code_window(now))
+
+
+def _code_expires_in(now: Optional[float] = None) -> float:
+    now = now if now is not None else time.time()
+    return round(ATTENDANCE_CODE_WINDOW_SECONDS - now % ATTENDANCE_CODE_WINDOW_SECONDS, 3)
+
+
+def _index_session(session_id: str, attendance: dict) -> None:
+    """Make an active session's codes resolvable (or drop a stopped session)."""
+    with _code_index_lock:
+        if attendance.get("active") is False:
+            _session_secrets.pop(session_id, None)
+        else:
+            _session_secrets[session_id] = _session_secret(session_id, attendance)
+        _window_codes.clear()
+
+
+def _evict_session_code(session_id: str, started_at: Optional[float] = None) -> None:
+    """Stop resolving a session's codes; its secret is kept while queued claims may still arrive."""
+    now = time.time()
+    with _code_index_lock:
+        secret = _session_secrets.pop(session_id, None)
+        if secret is not None:
+            _window_codes.clear()
+            if ATTENDANCE_OFFLINE_MAX_AGE_SECONDS > 0:
+                _stopped_secrets[session_id] = (secret, started_at, now)
+        for sid in [sid for sid, (_, _, stopped) in _stopped_secrets.items() if now - stopped > ATTENDANCE_OFFLINE_MAX_AGE_SECONDS]:
+            del _stopped_secrets[sid]
+
+
+def _find_stopped_session_by_code(code: str, claimed_at: float, now: Optional[float] = None) -> Optional[str]:
+    """
+    The recently stopped session whose code was `code` at claimed_at,
+    if the claim predates its stop. Ambiguous codes resolve to none, as for live ones.
+    """
+    now = now if now is not None else time.time()
+    window = _code_window(claimed_at)
+    with _code_index_lock:
+        candidates = list(_stopped_secrets.items())
+    matches = set()
+    for session_id, (secret, started_at, stopped_at) in candidates:
+        if now - stopped_at > ATTENDANCE_OFFLINE_MAX_AGE_SECONDS or claimed_at > stopped_at:
             continue
-        session_id = filename.rsplit(".", 1)[0]
-        attendance = _load_attendance_session(session_id)
-        if not attendance:
+        if started_at is not None and claimed_at < started_at - ATTENDANCE_CODE_WINDOW_SECONDS:
             continue
-        current = _ensure_current_code(session_id, attendance)
-        if current == code:
+        for w in range(window, window - ATTENDANCE_CODE_GRACE_WINDOWS - 1, -1):
+            if hmac.compare_digest(_totp_code(secret, w), code):
+                matches.add(session_id)
+    return matches.pop() if len(matches) == 1 else None
+
+
+def _rebuild_code_index() -> int:
+    """Load the secret of every active session in the attendance store."""
+    with _code_index_lock:
+        _session_secrets.clear()
+        _window_codes.clear()
+    for session_id, attendance in attendance_storage.active_sessions():
+        _index_session(session_id, attendance)
+    return len(_session_secrets)
+
+
+def _codes_for_window(window: int) -> dict:
+    with _code_index_lock:
+        codes = _window_codes.get(window)
+        if codes is None:
+            codes = {}
+            for session_id, secret in _session_secrets.items():
+                codes.setdefault(_totp_code(secret, window), []).append(session_id)
+            _window_codes[window] = codes
+            while len(_window_codes) > ATTENDANCE_CODE_GRACE_WINDOWS + 2:
+                del _window_codes[min(_window_codes)]
+        return codes
+
+
+def _find_session_by_code(code: str, now: Optional[float] = None) -> Optional[tuple]:
+    """
+    The active session showing `code` now or within the grace windows, as
+    (session_id, attendance). A code shared by two live sessions in the same window
+    resolves to neither; the student simply enters the next code.
+    """
+    window = _code_window(now)
+    for w in range(window, window - ATTENDANCE_CODE_GRACE_WINDOWS - 1, -1):
+        matches = _codes_for_window(w).get(code) or []
+        if len(matches) > 1:
+            return None
+        if matches:
+            session_id = matches[0]
+            attendance = _load_attendance_session(session_id)
+            if not attendance or attendance.get("active") is False:
+                _evict_session_code(session_id, _session_started_at(attendance) if attendance else None)
+                return None
             return session_id, attendance
     return None
 
 
-def _find_history_file(clean_id: str) -> Optional[str]:
-    """Locate an archived attendance history file by session id (in filename or contents)."""
-    _ensure_attendance_history_dir()
-    for filename in os.listdir(ATTENDANCE_HISTORY_DIR):
-        if not filename.endswith(".json"):
-            continue
-        if clean_id in filename:
-            return os.path.join(ATTENDANCE_HISTORY_DIR, filename)
-    # Fallback: scan contents
-    for filename in os.listdir(ATTENDANCE_HISTORY_DIR):
-        if not filename.endswith(".json"):
+# Last check-in or teacher view per live session seen by this process (time.time()),
+# for the idle sweep. The sweep also reads the store's last_checkin_at, so a check-in
+# recorded by any server process keeps a session alive; a teacher view only counts in
+# the process that served it, which the page's 3 s polling reaches often enough.
+# Sessions not seen since this process started count from the process start.
+_session_activity_lock = threading.Lock()
+_session_activity: dict = {}
+_PROCESS_STARTED_AT = time.time()
+
+
+def _touch_session(session_id: str) -> None:
+    with _session_activity_lock:
+        _session_activity[session_id] = time.time()
+
+
+def _session_started_at(attendance: dict) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(attendance.get("timestamp") or "").replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+
+_sweep_lock = threading.Lock()
+_sweep_stats = {
+    "sweeps": 0,
+    "expired_max_duration": 0,
+    "expired_idle": 0,
+    "pruned_stopped": 0,
+    "errors": 0,
+    "last_sweep_at": None,
+    "last_duration_ms": 0.0,
+    "max_duration_ms": 0.0,
+    "total_duration_ms": 0.0,
+}
+
+
+def _sweep_attendance_sessions(now: Optional[float] = None) -> dict:
+    """Auto-stop sessions past ATTENDANCE_MAX_SESSION_SECONDS or idle past ATTENDANCE_IDLE_SECONDS."""
+    now = now or time.time()
+    started = time.perf_counter()
+    expired = {"max_duration": 0, "idle": 0}
+    errors = 0
+    for session_id, attendance in list(attendance_storage.active_sessions()):
+        started_at = _session_started_at(attendance) or _PROCESS_STARTED_AT
+        with _session_activity_lock:
+            seen_here = _session_activity.get(session_id, 0.0)
+        last_seen = max(float(attendance.get("last_checkin_at") or 0), seen_here, started_at, _PROCESS_STARTED_AT)
+        if now - started_at >= ATTENDANCE_MAX_SESSION_SECONDS:
+            reason = "max_duration"
+        elif now - last_seen >= ATTENDANCE_IDLE_SECONDS:
+            reason = "idle"
+        else:
             continue
-        path = os.path.join(ATTENDANCE_HISTORY_DIR, filename)
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            if (data.get("session_id") or "") == clean_id:
-                return path
+            if _stop_and_archive_session(session_id, reason) is None:
+                continue  # stopped by its teacher meanwhile
+            expired[reason] += 1
+            app.logger.info("Auto-stopped attendance session %s (%s)", session_id, reason)
         except Exception:
-            continue
-    return None
+            errors += 1
+            app.logger.exception("Failed to auto-stop attendance session %s", session_id)
+    pruned = attendance_storage.prune_stopped()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with _sweep_lock:
+        _sweep_stats["sweeps"] += 1
+        _sweep_stats["expired_max_duration"] += expired["max_duration"]
+        _sweep_stats["expired_idle"] += expired["idle"]
+        _sweep_stats["pruned_stopped"] += pruned
+        _sweep_stats["errors"] += errors
+        _sweep_stats["last_sweep_at"] = now
+        _sweep_stats["last_duration_ms"] = round(elapsed_ms, 3)
+        _sweep_stats["max_duration_ms"] = round(max(_sweep_stats["max_duration_ms"], elapsed_ms), 3)
+        _sweep_stats["total_duration_ms"] = round(_sweep_stats["total_duration_ms"] + elapsed_ms, 3)
+    return {**expired, "pruned_stopped": pruned, "errors": errors}
+
+
+def _sweeper_loop() -> None:
+    while True:
+        time.sleep(ATTENDANCE_SWEEP_INTERVAL_SECONDS)
+        try:
+            _sweep_attendance_sessions()
+        except Exception:
+            app.logger.exception("Attendance sweep failed")
+
+
+def start_attendance_sweeper() -> None:
+    if ATTENDANCE_SWEEP_INTERVAL_SECONDS > 0:
+        threading.Thread(target=_sweeper_loop, name="attendance-sweeper", daemon=True).start()
+
+
+password_hasher = password_hashing.PasswordHasher(
+    PASSWORD_HASH_METHOD,
+    workers=PASSWORD_HASH_WORKERS or None,
+    max_pending=PASSWORD_HASH_MAX_PENDING or None,
+    cache_seconds=PASSWORD_CACHE_SECONDS,
+)
 
 
 def get_user(student_id: str) -> Optional[dict]:
-    users = _load_users()
-    return users.get(student_id)
+    return user_storage.get(student_id)
 
 
 def create_user(student_id: str, password: str) -> dict:
-    users = _load_users()
     record = {
         "student_id": student_id,
-        "password_hash": generate_password_hash(password),
+        "password_hash": password_hasher.hash(password),
         "created_at": time.time(),
     }
-    users[student_id] = record
-    _save_users(users)
+    user_storage.save(record)
     return record
 
 
 def verify_local_password(student_id: str, password: str) -> bool:
+    """Check a password (raises HasherBusy when every hashing slot is taken)."""
     user = get_user(student_id)
     if not user:
         return False
-    return check_password_hash(user.get("password_hash", ""), password)
+    pwhash = user.get("password_hash", "")
+    if not password_hasher.verify(pwhash, password):
+        return False
+    if password_hasher.needs_rehash(pwhash):
+        try:
+            user["password_hash"] = password_hasher.hash(password)
+            user_storage.save(user)
+        except password_hashing.HasherBusy:
+            pass  # upgraded on a quieter login
+    return True
+
+
+# Concurrent scrapes of one student (double-submitted logins, several tabs) share one run.
+schedule_flights = scrape_jobs.SingleFlight()
 
 
 def fetch_and_cache_schedule_from_sis(student_id: str, password: str) -> str:
     """
     Run the SIS scraper to verify credentials and refresh schedule_{student_id}.json.
-    Removes any stale file before regenerating.
+    Concurrent calls for the same student and password wait on a single scrape. The
+    existing file is only replaced (atomically) once a scrape succeeds.
     """
-    schedule_path = _schedule_path(student_id)
-    if os.path.isfile(schedule_path):
-        try:
-            os.remove(schedule_path)
-        except OSError:
-            app.logger.warning("Could not remove existing schedule file for %s", student_id)
+    token = hashlib.sha256(password.encode("utf-8")).hexdigest()
+
+    def _scrape() -> str:
+        out_path = generate_schedule_json.run_scraper(student_id, password)
+        if not os.path.isfile(out_path):
+            raise RuntimeError(f"Scraper did not create {out_path}")
+        return out_path
+
+    return schedule_flights.do(student_id, _scrape, token=token)
+
+
+# Logins enqueue scrapes here instead of running them on the request thread.
+# Rejected SIS credentials fail the job immediately; anything else is retried.
+scrape_queue = scrape_jobs.ScrapeJobQueue(
+    fetch_and_cache_schedule_from_sis,
+    workers=SCRAPE_WORKERS,
+    max_attempts=SCRAPE_MAX_ATTEMPTS,
+    retryable=lambda exc: not isinstance(exc, generate_schedule_json.SISLoginError),
+    logger=app.logger,
+)
+
+
+# -------- Built assets (python build_assets.py) --------
+# Fingerprinted files never change under their URL, so the browser may keep them for a
+# year without asking; only the pages that reference them are revalidated.
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+ASSET_MIMETYPES = {".glb": "model/gltf-binary"}
+
+_asset_manifest_lock = threading.Lock()
+_asset_manifest_state = {"stamp": None, "manifest": {"assets": {}, "pages": {}}, "by_file": {}}
+
+
+def _asset_manifest() -> tuple:
+    """(manifest, fingerprinted file -> entry), re-read when dist/manifest.json changes."""
+    path = os.path.join(ASSET_DIST_DIR, build_assets.MANIFEST_NAME)
+    try:
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+    except OSError:
+        stamp = None
+    with _asset_manifest_lock:
+        state = _asset_manifest_state
+        if stamp != state["stamp"]:
+            manifest = build_assets.load_manifest(ASSET_DIST_DIR)
+            state["manifest"] = manifest
+            state["by_file"] = {entry["file"]: entry for entry in manifest["assets"].values()}
+            state["stamp"] = stamp
+        return state["manifest"], state["by_file"]
+
+
+def asset_url(name: str) -> str:
+    """URL of a front-end file: its fingerprinted build when there is one, else the source route."""
+    entry = _asset_manifest()[0]["assets"].get(name.lstrip("/"))
+    return f"{build_assets.ASSET_URL_PREFIX}{entry['file']}" if entry else "/" + name.lstrip("/")
+
+
+app.jinja_env.globals["asset_url"] = asset_url
 
-    out_path = generate_schedule_json.run_scraper(student_id, password)
-    if not os.path.isfile(out_path):
-        raise RuntimeError(f"Scraper did not create {out_path}")
-    return out_path
+
+def _send_page(filename: str):
+    """A top-level page, from the build (asset references rewritten) when one exists."""
+    if filename in (_asset_manifest()[0].get("pages") or {}) and os.path.isfile(os.path.join(ASSET_DIST_DIR, filename)):
+        resp = send_from_directory(ASSET_DIST_DIR, filename)
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp
+    return send_from_directory(BASE_DIR, filename)
+
+
+@app.route("/assets/<path:filename>", methods=["GET"])
+def serve_asset(filename: str):
+    entry = _asset_manifest()[1].get(filename)
+    if entry is None:
+        abort(404, description="Unknown asset")
+    path = os.path.join(ASSET_DIST_DIR, entry["file"])
+    encoding = "identity"
+    # Byte ranges (resumed model downloads) always address the uncompressed file.
+    for candidate, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if request.range is None and candidate in entry.get("encodings", {}) and request.accept_encodings[candidate] > 0:
+            encoding, path = candidate, path + suffix
+            break
+    if not os.path.isfile(path):
+        abort(404, description="Asset missing from the build; re-run build_assets.py")
+    ext = os.path.splitext(entry["file"])[1].lower()
+    mimetype = ASSET_MIMETYPES.get(ext) or mimetypes.guess_type(entry["file"])[0] or "application/octet-stream"
+    etag = entry["sha256"] if encoding == "identity" else f"{entry['sha256']}-{encoding}"
+    resp = send_file(path, mimetype=mimetype, etag=etag, conditional=True, max_age=None)
+    resp.headers.pop("Content-Disposition", None)
+    if encoding != "identity":
+        resp.headers["Content-Encoding"] = encoding
+    resp.headers["Cache-Control"] = ASSET_CACHE_CONTROL
+    resp.headers["Vary"] = "Accept-Encoding"
+    return resp
 
 
 @app.route("/", methods=["GET"])
@@ -242,11 +578,11 @@ def serve_login_page():
     login_path = os.path.join(BASE_DIR, "login.html")
 
     if sid and os.path.isfile(dashboard_path):
-        return send_from_directory(BASE_DIR, "index.html")
+        return _send_page("index.html")
 
     if not os.path.isfile(login_path):
         abort(404, description="login.html not found in project root")
-    return send_from_directory(BASE_DIR, "login.html")
+    return _send_page("login.html")
 
 
 @app.route("/dashboard", methods=["GET"])
@@ -254,7 +590,7 @@ def serve_dashboard():
     dashboard_path = os.path.join(BASE_DIR, "index.html")
     if not os.path.isfile(dashboard_path):
         abort(404, description="index.html not found in project root")
-    return send_from_directory(BASE_DIR, "index.html")
+    return _send_page("index.html")
 
 
 @app.route("/images/<path:filename>", methods=["GET"])
@@ -281,12 +617,134 @@ def serve_js():
     return send_from_directory(BASE_DIR, "app.js")
 
 
+# The campus model is large: answer Range/If-Range so interrupted downloads resume, and
+# validate with a content-hash ETag so a cached copy costs one 304.
+MODEL_CACHE_CONTROL = "public, no-cache"
+
+_model_etag_lock = threading.Lock()
+_model_etags: dict = {}  # path -> ((mtime_ns, size), sha256 hex)
+
+
+def _model_etag(path: str) -> str:
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _model_etag_lock:
+        cached = _model_etags.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    with _model_etag_lock:
+        _model_etags[path] = (stamp, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def _send_model(filename: str):
+    model_path = os.path.join(BASE_DIR, filename)
+    if not os.path.isfile(model_path):
+        abort(404, description=f"{filename} not found")
+    # conditional=True makes werkzeug answer If-None-Match with 304 and Range with 206.
+    resp = send_file(model_path, mimetype="model/gltf-binary", etag=_model_etag(model_path), conditional=True, max_age=None)
+    resp.headers.pop("Content-Disposition", None)
+    resp.headers["Accept-Ranges"] = "bytes"
+    resp.headers["Cache-Control"] = MODEL_CACHE_CONTROL
+    return resp
+
+
 @app.route("/prototype.glb", methods=["GET"])
 def serve_model():
-    model_path = os.path.join(BASE_DIR, "prototype.glb")
-    if not os.path.isfile(model_path):
-        abort(404, description="prototype.glb not found")
-    return send_from_directory(BASE_DIR, "prototype.glb")
+    return _send_model("prototype.glb")
+
+
+@app.route("/prototype.preview.glb", methods=["GET"])
+def serve_model_preview():
+    """Low-detail model the dashboard renders while prototype.glb downloads (python model_preview.py)."""
+    return _send_model("prototype.preview.glb")
+
+
+# Schedule JSON is served from the compact/precompressed copies schedule_changes writes
+# beside each file, with the content hash as ETag. The browser may keep a private copy
+# but must revalidate it (a 304 costs no body), and the response varies by encoding and
+# by the session cookie that decides whose schedule it is.
+SCHEDULE_CACHE_CONTROL = "private, no-cache"
+SCHEDULE_VARY = "Accept-Encoding, Cookie"
+
+_schedule_variant_lock = threading.Lock()
+_schedule_variants: dict = {}  # json path -> (mtime_ns, size, meta)
+
+
+def _schedule_variant_meta(json_path: str) -> Optional[dict]:
+    """ETag, Last-Modified and variant files for json_path, (re)building stale variants."""
+    try:
+        st = os.stat(json_path)
+    except OSError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _schedule_variant_lock:
+        cached = _schedule_variants.get(json_path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        paths = schedule_changes.variant_paths(json_path)
+        if schedule_changes.variants_current(json_path):
+            with open(paths["identity"], "rb") as f:
+                etag = hashlib.sha256(f.read()).hexdigest()
+        else:
+            # Files written before variants existed (or copied in by hand).
+            try:
+                with open(json_path, "r", encoding="utf-8") as f:
+                    etag = schedule_changes.write_variants(json_path, json.load(f))
+            except (OSError, ValueError):
+                app.logger.exception("Failed to build schedule variants for %s", json_path)
+                return None
+        meta = {"etag": etag, "last_modified": int(st.st_mtime), "paths": paths}
+        _schedule_variants[json_path] = (stamp, meta)
+        return meta
+
+
+def _if_none_match_hits(etag: str) -> bool:
+    header = request.headers.get("If-None-Match", "")
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        # Every encoding of one document shares the content hash.
+        if tag.strip('"').split("-", 1)[0] == etag:
+            return True
+    return False
+
+
+def _schedule_response(json_path: str):
+    meta = _schedule_variant_meta(json_path)
+    if meta is None:
+        abort(500, description="Schedule could not be read")
+    encoding = "identity"
+    for candidate in ("br", "gzip"):
+        if candidate in meta["paths"] and request.accept_encodings[candidate] > 0:
+            encoding = candidate
+            break
+    etag = f'"{meta["etag"]}"' if encoding == "identity" else f'"{meta["etag"]}-{encoding}"'
+
+    if request.headers.get("If-None-Match"):
+        not_modified = _if_none_match_hits(meta["etag"])
+    else:
+        since = request.if_modified_since
+        not_modified = since is not None and meta["last_modified"] <= int(since.timestamp())
+    if not_modified:
+        resp = Response(status=304)
+    else:
+        resp = send_file(meta["paths"][encoding], mimetype="application/json", conditional=False, etag=False)
+        resp.headers.pop("Content-Disposition", None)
+        if encoding != "identity":
+            resp.headers["Content-Encoding"] = encoding
+    resp.headers["ETag"] = etag
+    resp.headers["Last-Modified"] = http_date(meta["last_modified"])
+    resp.headers["Cache-Control"] = SCHEDULE_CACHE_CONTROL
+    resp.headers["Vary"] = SCHEDULE_VARY
+    return resp
 
 
 @app.route("/schedule.json", methods=["GET"])
@@ -296,9 +754,7 @@ def serve_default_schedule():
         abort(401, description="Not authenticated")
     if not os.path.isfile(SCHEDULE_PATH):
         abort(404, description="schedule.json not found")
-    resp = send_from_directory(BASE_DIR, "schedule.json")
-    resp.headers["Cache-Control"] = "no-store, must-revalidate"
-    return resp
+    return _schedule_response(SCHEDULE_PATH)
 
 
 @app.route("/schedule/<student_id>.json", methods=["GET"])
@@ -316,11 +772,40 @@ def serve_schedule(student_id: str):
     if not os.path.isfile(schedule_path):
         abort(404, description=f"{filename} not found")
 
-    resp = send_from_directory(BASE_DIR, filename)
-    resp.headers["Cache-Control"] = "no-store, must-revalidate"
+    resp = _schedule_response(schedule_path)
+    age = _schedule_age(authed_id)
+    resp.headers["X-Schedule-Freshness"] = _schedule_freshness(authed_id)
+    if age is not None:
+        resp.headers["X-Schedule-Age"] = str(int(age))
     return resp
 
 
+@app.get("/api/schedule/changes")
+def schedule_change_log():
+    """
+    What changed between scrapes of the signed-in student's schedule.
+    Optional ?since=<unix time> returns only changes recorded after it.
+    """
+    authed_id = _clean_student_id(session.get("sid", ""))
+    if not authed_id:
+        return {"ok": False, "error": "Not authenticated"}, 401
+    try:
+        since = float(request.args.get("since", "0") or 0)
+    except ValueError:
+        return {"ok": False, "error": "since must be a unix timestamp"}, 400
+
+    log = schedule_changes.load_log(authed_id) or {}
+    changes = [c for c in log.get("changes", []) if c.get("at", 0) > since]
+    return {
+        "ok": True,
+        "student_id": authed_id,
+        "hash": log.get("hash", ""),
+        "checked_at": log.get("checked_at"),
+        "changed_at": log.get("changed_at"),
+        "changes": changes,
+    }
+
+
 @app.get("/dev/teacher-login")
 def dev_teacher_login():
     """
@@ -333,6 +818,61 @@ def dev_teacher_login():
     return {"ok": True, "teacher_id": session["teacher_id"]}
 
 
+def _sweep_metrics() -> dict:
+    with _sweep_lock:
+        stats = dict(_sweep_stats)
+    stats["avg_duration_ms"] = round(stats["total_duration_ms"] / stats["sweeps"], 3) if stats["sweeps"] else 0.0
+    stats["interval_s"] = ATTENDANCE_SWEEP_INTERVAL_SECONDS
+    return stats
+
+
+@app.get("/dev/metrics")
+def dev_metrics():
+    """Dev-only helper: runtime counters for the scraper, attendance and user store subsystems."""
+    pool = generate_schedule_json.current_browser_pool()
+    return {
+        "ok": True,
+        "scraper_pool": pool.stats() if pool else None,
+        "scrape_stages": generate_schedule_json.stage_timings.stats(),
+        "scrape_jobs": scrape_queue.stats(),
+        "scrape_single_flight": schedule_flights.stats(),
+        "schedule_cache": _schedule_cache_metrics(),
+        "attendance_backend": attendance_storage.name,
+        "attendance_live_sessions": len(_session_secrets),
+        "attendance_events": attendance_bus.stats(),
+        "attendance_sweeper": _sweep_metrics(),
+        "users": user_storage.stats(),
+        "password_hashing": password_hasher.stats(),
+    }
+
+
+@app.get("/api/scrape-jobs/<job_id>")
+def scrape_job_status(job_id: str):
+    """Poll a login-triggered scrape. Completing a first-login job signs the student in."""
+    authed_id = _clean_student_id(session.get("sid", ""))
+    pending_id = _clean_student_id(session.get("pending_sid", ""))
+    if not authed_id and not pending_id:
+        return {"ok": False, "error": "Not authenticated"}, 401
+
+    job = scrape_queue.get(_clean_session_token(job_id))
+    if job is None or job.student_id not in (authed_id, pending_id):
+        return {"ok": False, "error": "Job not found"}, 404
+
+    resp = make_response({"ok": True, "job": job.to_dict()})
+    # Only the job this browser's own first login submitted may sign it in.
+    if job.student_id == pending_id and not authed_id and job.id == session.get("pending_job"):
+        if job.state == scrape_jobs.JOB_DONE:
+            session.pop("pending_sid", None)
+            session.pop("pending_job", None)
+            session["sid"] = job.student_id
+            session["student_id"] = job.student_id
+            resp.set_cookie("sid", job.student_id, max_age=86400, secure=False, httponly=False, samesite="Lax")
+        elif job.state == scrape_jobs.JOB_FAILED:
+            session.pop("pending_sid", None)
+            session.pop("pending_job", None)
+    return resp
+
+
 @app.get("/teacher")
 def teacher_dashboard():
     if "teacher_id" not in session:
@@ -371,28 +911,232 @@ def student_checkin():
         return {"ok": False, "error": "Attendance session not found or code expired."}, 404
 
     session_id, attendance = lookup
-    current_code = _ensure_current_code(session_id, attendance)
-    if session_token != current_code:
-        return {"ok": False, "error": "Invalid or expired code."}, 400
-
-    students = attendance.get("students")
-    if not isinstance(students, dict):
-        students = {}
-        attendance["students"] = students
-
     raw_name = payload.get("name") or session.get("student_name") or ""
     name = raw_name.strip() if isinstance(raw_name, str) else ""
     if not name:
         name = student_id
 
     checkin_time = datetime.now().strftime("%H:%M")
-    students[student_id] = {"name": name, "status": "present", "time": checkin_time}
-    attendance.setdefault("session_id", session_token)
-    _save_attendance_session(session_id, attendance)
+    record = {"name": name, "status": "present", "time": checkin_time}
+    try:
+        attendance_storage.record_checkin(session_id, student_id, record)
+    except KeyError:
+        return {"ok": False, "error": "Attendance session has ended."}, 404
+    _touch_session(session_id)
+    attendance_bus.publish(session_id, "checkin", {"id": student_id, **record})
 
     return {"ok": True, "message": "Attendance recorded"}
 
 
+def _parse_offline_claim(item, student_id: str, clock_offset: float) -> tuple:
+    """
+    Parse one queued attempt {"student_id", "code", "at": client ms, "lat", "lng"}.
+    Returns ((code, claimed_at, lat, lng), None) or (None, error). claimed_at is on the
+    server clock: the client's own send time is subtracted out, so a skewed phone clock
+    still lands in the right code window.
+
+    Nothing in a claim is trusted beyond the code itself: the time and location are
+    whatever the client says, so the caller only accepts claims made within
+    ATTENDANCE_OFFLINE_MAX_AGE_SECONDS, which bounds how long a code read off the
+    teacher's screen stays usable. student_id only keeps a queue left on a shared
+    device from being credited to the next account that logs in.
+    """
+    if not isinstance(item, dict) or not isinstance(item.get("code"), str):
+        return None, "Malformed check-in."
+    if _clean_student_id(item.get("student_id") or "") != student_id:
+        return None, "Check-in was queued by another account."
+    code = _clean_session_token(item["code"])
+    try:
+        claimed_at = int(item.get("at")) / 1000 + clock_offset
+        lat = float(item["lat"]) if item.get("lat") is not None else None
+        lng = float(item["lng"]) if item.get("lng") is not None else None
+    except (TypeError, ValueError):
+        return None, "Malformed check-in."
+    if not code:
+        return None, "Malformed check-in."
+    return (code, claimed_at, lat, lng), None
+
+
+@app.post("/api/student/attendance/checkin/batch")
+def student_checkin_batch():
+    """
+    Apply check-ins the page queued while offline. Each one is checked against the
+    code window that was current at the time it was made (and the campus radius when
+    a location was captured); the accepted ones are written in one store call.
+    Claims older than ATTENDANCE_OFFLINE_MAX_AGE_SECONDS are refused; fresher ones for
+    a session stopped since they were made are added to its archive.
+    """
+    student_id = _clean_student_id(session.get("student_id") or session.get("sid") or "")
+    if not student_id:
+        return {"ok": False, "error": "Not authenticated"}, 401
+
+    payload = request.get_json(silent=True) or {}
+    items = payload.get("checkins")
+    if not isinstance(items, list) or not items:
+        return {"ok": False, "error": "checkins must be a non-empty list"}, 400
+    if len(items) > ATTENDANCE_BATCH_MAX:
+        return {"ok": False, "error": f"At most {ATTENDANCE_BATCH_MAX} check-ins per request"}, 413
+
+    now = time.time()
+    try:
+        clock_offset = now - int(payload.get("sent_at")) / 1000
+    except (TypeError, ValueError):
+        clock_offset = 0.0
+    raw_name = session.get("student_name") or ""
+    name = (raw_name.strip() if isinstance(raw_name, str) else "") or student_id
+
+    results = [None] * len(items)
+    parsed = []
+    for index, item in enumerate(items):
+        claim, error = _parse_offline_claim(item, student_id, clock_offset)
+        if error:
+            results[index] = {"index": index, "ok": False, "error": error}
+        else:
+            parsed.append((index, *claim))
+
+    # Earliest attempt per session wins, matching what a live check-in would have recorded.
+    accepted = {}
+    late = {}  # session_id -> (record, result) for sessions stopped since the claim
+    for index, code, claimed_at, lat, lng in sorted(parsed, key=lambda p: p[2]):
+        result = {"index": index, "ok": False}
+        results[index] = result
+        if claimed_at > now + ATTENDANCE_CODE_WINDOW_SECONDS:
+            result["error"] = "Check-in time is in the future."
+            continue
+        if now - claimed_at > ATTENDANCE_OFFLINE_MAX_AGE_SECONDS:
+            result["error"] = "Check-in was queued too long ago."
+            continue
+        if not ALLOW_OFFCAMPUS and (lat is None or lng is None or not is_on_campus(lat, lng)):
+            result["error"] = "Check-in location is not on campus."
+            continue
+        checkin_time = datetime.fromtimestamp(min(claimed_at, now)).strftime("%H:%M")
+        lookup = _find_session_by_code(code, now=min(claimed_at, now))
+        if not lookup:
+            stopped_id = _find_stopped_session_by_code(code, claimed_at, now)
+            if stopped_id is None:
+                result["error"] = "Attendance session not found or code expired."
+            elif stopped_id in late or stopped_id in accepted:
+                result.update(ok=True, session_id=stopped_id, already_recorded=True)
+            else:
+                result.update(ok=True, session_id=stopped_id)
+                late[stopped_id] = ({"name": name, "status": "present", "time": checkin_time}, result)
+            continue
+        session_id, attendance = lookup
+        started_at = _session_started_at(attendance)
+        if started_at is not None and claimed_at < started_at - ATTENDANCE_CODE_WINDOW_SECONDS:
+            result["error"] = "Attendance session not found or code expired."
+            continue
+        result.update(ok=True, session_id=session_id)
+        if student_id in (attendance.get("students") or {}) or session_id in accepted:
+            result["already_recorded"] = True
+            continue
+        accepted[session_id] = {"name": name, "status": "present", "time": checkin_time}
+
+    if accepted:
+        try:
+            attendance_storage.record_checkins([(sid, student_id, record) for sid, record in accepted.items()])
+        except KeyError:
+            # A session was stopped between validation and the write; the whole batch is retryable.
+            return {"ok": False, "error": "Attendance session was stopped; retry."}, 409
+        for session_id, record in accepted.items():
+            _touch_session(session_id)
+            attendance_bus.publish(session_id, "checkin", {"id": student_id, **record})
+
+    recorded = len(accepted)
+    for session_id, (record, result) in late.items():
+        try:
+            added = attendance_storage.record_late_checkin(session_id, student_id, record)
+        except KeyError:
+            # Stopped but not archived yet; the page sends the claim again.
+            return {"ok": False, "error": "Attendance session was stopped; retry."}, 409
+        if not added:
+            result["already_recorded"] = True
+            continue
+        recorded += 1
+        _record_late_analytics(session_id, student_id, record)
+
+    return {"ok": True, "recorded": recorded, "results": results}
+
+
+def _record_late_analytics(session_id: str, student_id: str, record: dict) -> None:
+    try:
+        archived = attendance_storage.load_history(session_id)
+        if archived is not None and not attendance_stats.record_checkin(archived, student_id, record):
+            attendance_stats.rebuild(attendance_storage.list_history(None))
+    except Exception:
+        app.logger.exception("Failed to update attendance analytics for %s", session_id)
+
+
+def _attendance_status_payload(session_id: str, attendance: dict) -> dict:
+    student_list = []
+    for sid, info in (attendance.get("students") or {}).items():
+        record = info if isinstance(info, dict) else {}
+        name = str(record.get("name") or sid)
+        status = str(record.get("status") or "pending")
+        time_value = str(record.get("time") or "")
+        student_list.append({"id": sid, "name": name, "status": status, "time": time_value})
+
+    student_list.sort(key=lambda s: (s.get("name") or s["id"]).lower())
+    return {
+        "session_id": session_id,
+        "students": student_list,
+        "current_code": _current_code(session_id, attendance),
+        "code_expires_in": _code_expires_in(),
+        "active": attendance.get("active") is not False,
+    }
+
+
+def _sse(event: str, data: dict, event_id: Optional[str] = None) -> str:
+    lines = [f"id: {event_id}"] if event_id else []
+    lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+    return "\n".join(lines) + "\n\n"
+
+
+def _attendance_event_stream(session_id: str, attendance: dict, cursor: int, last_event_id: str):
+    """Generator behind teacher_session_events; runs outside the request context."""
+    attendance_bus.stream_opened()
+    try:
+        yield "retry: 3000\n\n"
+        seq = attendance_bus.parse_id(last_event_id)
+        replay = attendance_bus.events_after(session_id, seq) if seq is not None else None
+        if replay is None:
+            seq = cursor
+            yield _sse("snapshot", _attendance_status_payload(session_id, attendance), attendance_bus.format_id(seq))
+            if attendance.get("active") is False:
+                return
+            replay = attendance_bus.events_after(session_id, seq) or []
+
+        # Codes are derived from the clock, so rotation is announced without any I/O.
+        secret = _session_secret(session_id, attendance)
+        window = _code_window()
+        deadline = time.monotonic() + ATTENDANCE_SSE_MAX_SECONDS
+        last_sent = time.monotonic()
+        pending = replay
+        while True:
+            for event_seq, event, data in pending:
+                seq = event_seq
+                yield _sse(event, data, attendance_bus.format_id(event_seq))
+                last_sent = time.monotonic()
+                if event == "stopped":
+                    return
+            now = time.time()
+            if _code_window(now) != window:
+                window = _code_window(now)
+                yield _sse("code", {"current_code": _totp_code(secret, window), "code_expires_in": _code_expires_in(now)})
+                last_sent = time.monotonic()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if time.monotonic() - last_sent >= ATTENDANCE_SSE_HEARTBEAT_SECONDS:
+                yield ": ping\n\n"
+                last_sent = time.monotonic()
+            timeout = min(_code_expires_in(), ATTENDANCE_SSE_HEARTBEAT_SECONDS, remaining)
+            pending = attendance_bus.wait(session_id, seq, max(timeout, 0.05))
+    finally:
+        attendance_bus.stream_closed()
+
+
 @app.get("/api/teacher/attendance/<session_id>/status")
 def teacher_session_status(session_id):
     teacher_id = (session.get("teacher_id") or "").strip()
@@ -411,18 +1155,43 @@ def teacher_session_status(session_id):
     if file_teacher_id and file_teacher_id != teacher_id:
         return {"ok": False, "error": "Not authorized for this session."}, 403
 
-    students_dict = attendance.get("students") or {}
-    current_code = _ensure_current_code(clean_session_id, attendance)
-    student_list = []
-    for sid, info in students_dict.items():
-        record = info if isinstance(info, dict) else {}
-        name = str(record.get("name") or sid)
-        status = str(record.get("status") or "pending")
-        time_value = str(record.get("time") or "")
-        student_list.append({"id": sid, "name": name, "status": status, "time": time_value})
+    _touch_session(clean_session_id)
+    return _attendance_status_payload(clean_session_id, attendance)
 
-    student_list.sort(key=lambda s: (s.get("name") or s["id"]).lower())
-    return {"session_id": clean_session_id, "students": student_list, "current_code": current_code}
+
+@app.get("/api/teacher/attendance/<session_id>/events")
+def teacher_session_events(session_id):
+    """
+    Server-Sent Events for a live session: a "snapshot" (same shape as /status) on
+    connect, then "checkin" and "stopped" events plus a "code" event each window.
+    Reconnects with Last-Event-ID replay what was missed instead of a new snapshot.
+    """
+    teacher_id = (session.get("teacher_id") or "").strip()
+    if not teacher_id:
+        return {"ok": False, "error": "Not authenticated"}, 401
+
+    clean_session_id = _clean_session_token(session_id)
+    if not clean_session_id:
+        return {"ok": False, "error": "session_id is required"}, 400
+
+    # Take the cursor before loading, so nothing published in between is missed.
+    cursor = attendance_bus.current_seq()
+    attendance = _load_attendance_session(clean_session_id)
+    if attendance is None:
+        return {"ok": False, "error": "Attendance session not found."}, 404
+
+    file_teacher_id = (attendance.get("teacher_id") or "").strip()
+    if file_teacher_id and file_teacher_id != teacher_id:
+        return {"ok": False, "error": "Not authorized for this session."}, 403
+
+    _touch_session(clean_session_id)
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id", "")
+    stream = _attendance_event_stream(clean_session_id, attendance, cursor, last_event_id)
+    return Response(
+        stream,
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post("/api/teacher/attendance/start")
@@ -438,17 +1207,14 @@ def start_session():
     course_code = (payload.get("course_code") or payload.get("courseCode") or "").strip()
     section = (payload.get("section") or "").strip()
 
-    # Generate a short, human-friendly token and ensure it is unique on disk.
-    _ensure_attendance_dir()
+    # Generate a short, human-friendly token and ensure it is unique in the store.
     session_id = _generate_session_token()
     attempts = 0
-    while os.path.exists(_attendance_path(session_id)) and attempts < 5:
+    while _load_attendance_session(session_id) is not None and attempts < 5:
         session_id = _generate_session_token()
         attempts += 1
 
     timestamp = datetime.utcnow().replace(microsecond=0).isoformat()
-    code = _generate_code()
-    issued_at = time.time()
     attendance_record = {
         "session_id": session_id,
         "course_id": course_id,
@@ -457,13 +1223,44 @@ def start_session():
         "section": section,
         "teacher_id": teacher_id,
         "timestamp": timestamp,
-        "current_code": code,
-        "code_issued_at": issued_at,
+        "code_secret": secrets.token_hex(20),
         "active": True,
         "students": {},
     }
     _save_attendance_session(session_id, attendance_record)
-    return {"session_id": session_id, "token": session_id, "current_code": code}
+    _index_session(session_id, attendance_record)
+    return {
+        "session_id": session_id,
+        "token": session_id,
+        "current_code": _current_code(session_id, attendance_record),
+        "code_expires_in": _code_expires_in(),
+    }
+
+
+def _stop_and_archive_session(session_id: str, reason: str) -> Optional[str]:
+    """
+    Mark a session stopped, archive it and notify listeners. Returns stopped_at, or None
+    when another caller (the sweeper, a second /stop) stopped it first; that caller
+    archives it, so nothing else happens here.
+    """
+    stopped_at = datetime.utcnow().replace(microsecond=0).isoformat()
+    stopped = attendance_storage.stop_session(session_id, {"stopped_at": stopped_at, "stopped_reason": reason})
+    if stopped is None:
+        return None
+    _evict_session_code(session_id, _session_started_at(stopped))
+    with _session_activity_lock:
+        _session_activity.pop(session_id, None)
+
+    archived = {k: v for k, v in stopped.items() if k != "code_secret"}
+    attendance_storage.archive_session(session_id, archived)
+    # Analytics reads the archive as written, the same document a rebuild would see.
+    archived = attendance_storage.load_history(session_id) or archived
+    try:
+        attendance_stats.record_session(archived)
+    except Exception:
+        app.logger.exception("Failed to update attendance analytics for %s", session_id)
+    attendance_bus.publish(session_id, "stopped", {"stopped_at": stopped_at, "reason": reason}, closes=True)
+    return stopped_at
 
 
 @app.post("/api/teacher/attendance/stop")
@@ -485,58 +1282,73 @@ def stop_session():
     if (attendance.get("teacher_id") or "").strip() and attendance.get("teacher_id") != teacher_id:
         return {"ok": False, "error": "Not authorized for this session."}, 403
 
-    stopped_at = datetime.utcnow().replace(microsecond=0).isoformat()
-    attendance["active"] = False
-    attendance["stopped_at"] = stopped_at
-    _save_attendance_session(session_id, attendance)
-
-    _ensure_attendance_history_dir()
-    course_code = _clean_session_token(attendance.get("course_code") or attendance.get("course_id") or "course")
-    section = _clean_session_token(attendance.get("section") or "sec")
-    date_str = datetime.utcnow().strftime("%Y%m%d")
-    archive_name = f"{course_code or 'course'}_{section or 'sec'}_{date_str}_{session_id}.json"
-    archive_path = os.path.join(ATTENDANCE_HISTORY_DIR, archive_name)
-    tmp_path = archive_path + ".tmp"
-    with open(tmp_path, "w", encoding="utf-8") as f:
-        json.dump(attendance, f, ensure_ascii=False, indent=2)
-    os.replace(tmp_path, archive_path)
-
+    stopped_at = _stop_and_archive_session(session_id, "teacher")
+    if stopped_at is None:
+        return {"ok": False, "error": "Attendance session was already stopped."}, 409
     return {"ok": True, "message": "Session stopped and archived", "session_id": session_id, "stopped_at": stopped_at}
 
 
+def _history_filters(args) -> tuple:
+    """(filters for query_history, error message) from course/section/from/to query args."""
+    filters = {
+        "course_code": (args.get("course") or "").strip(),
+        "section": (args.get("section") or "").strip(),
+        "date_from": (args.get("from") or "").strip(),
+        "date_to": (args.get("to") or "").strip(),
+    }
+    for key in ("date_from", "date_to"):
+        if filters[key]:
+            try:
+                datetime.strptime(filters[key], "%Y-%m-%d")
+            except ValueError:
+                return filters, "from/to must be YYYY-MM-DD"
+    return filters, ""
+
+
+def _iter_history_entries(teacher_id: str, filters: dict, page_size: int = 200):
+    """Every matching catalog entry, newest first, fetched one page at a time."""
+    cursor = ""
+    while True:
+        entries, cursor = attendance_storage.query_history(teacher_id, cursor=cursor, limit=page_size, **filters)
+        yield from entries
+        if not cursor:
+            return
+
+
 @app.get("/api/teacher/attendance/history")
 def attendance_history():
+    """
+    Archived sessions from the history catalog, newest first, without student maps.
+    Query: course, section, from/to (YYYY-MM-DD), cursor (from next_cursor), limit.
+    """
     teacher_id = (session.get("teacher_id") or "").strip()
     if not teacher_id:
         return {"ok": False, "error": "Not authenticated"}, 401
 
-    _ensure_attendance_history_dir()
-    records = []
-    for filename in os.listdir(ATTENDANCE_HISTORY_DIR):
-        if not filename.endswith(".json"):
-            continue
-        path = os.path.join(ATTENDANCE_HISTORY_DIR, filename)
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            if data.get("teacher_id") and data.get("teacher_id") != teacher_id:
-                continue
-            records.append(
-                {
-                    "session_id": data.get("session_id") or filename.rsplit(".", 1)[0],
-                    "course_title": data.get("course_title") or "",
-                    "course_code": data.get("course_code") or data.get("course_id") or "",
-                    "section": data.get("section") or "",
-                    "timestamp": data.get("timestamp") or "",
-                    "stopped_at": data.get("stopped_at") or "",
-                    "students": data.get("students") or {},
-                }
-            )
-        except Exception:
-            continue
-
-    records.sort(key=lambda r: r.get("stopped_at") or r.get("timestamp") or "", reverse=True)
-    return {"ok": True, "history": records}
+    try:
+        limit = min(max(int(request.args.get("limit", "50")), 1), 200)
+    except ValueError:
+        return {"ok": False, "error": "limit must be an integer"}, 400
+    filters, error = _history_filters(request.args)
+    if error:
+        return {"ok": False, "error": error}, 400
+
+    entries, next_cursor = attendance_storage.query_history(
+        teacher_id, cursor=(request.args.get("cursor") or "").strip(), limit=limit, **filters
+    )
+    records = [
+        {
+            "session_id": entry["session_id"],
+            "course_title": entry.get("course_title") or "",
+            "course_code": entry.get("course_code") or entry.get("course_id") or "",
+            "section": entry.get("section") or "",
+            "timestamp": entry.get("timestamp") or "",
+            "stopped_at": entry.get("stopped_at") or "",
+            "head_count": entry.get("head_count", 0),
+        }
+        for entry in entries
+    ]
+    return {"ok": True, "history": records, "next_cursor": next_cursor}
 
 
 @app.get("/api/teacher/attendance/history/<session_id>")
@@ -549,17 +1361,10 @@ def attendance_history_detail(session_id):
     if not clean_id:
         return {"ok": False, "error": "session_id is required"}, 400
 
-    target_file = _find_history_file(clean_id)
-
-    if not target_file or not os.path.isfile(target_file):
+    data = attendance_storage.load_history(clean_id)
+    if data is None:
         return {"ok": False, "error": "History not found"}, 404
 
-    try:
-        with open(target_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except Exception:
-        return {"ok": False, "error": "Failed to read history"}, 500
-
     file_teacher = (data.get("teacher_id") or "").strip()
     if file_teacher and file_teacher != teacher_id:
         return {"ok": False, "error": "Not authorized"}, 403
@@ -603,16 +1408,10 @@ def attendance_history_export(session_id):
     if not clean_id:
         return {"ok": False, "error": "session_id is required"}, 400
 
-    target_file = _find_history_file(clean_id)
-    if not target_file or not os.path.isfile(target_file):
+    data = attendance_storage.load_history(clean_id)
+    if data is None:
         return {"ok": False, "error": "History not found"}, 404
 
-    try:
-        with open(target_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except Exception:
-        return {"ok": False, "error": "Failed to read history"}, 500
-
     file_teacher = (data.get("teacher_id") or "").strip()
     if file_teacher and file_teacher != teacher_id:
         return {"ok": False, "error": "Not authorized"}, 403
@@ -648,9 +1447,168 @@ def attendance_history_export(session_id):
     return resp
 
 
+def _analytics_term(args) -> Optional[str]:
+    """The term= query arg (e.g. "2026-08"), the current term when absent, None for "all"."""
+    term = (args.get("term") or "").strip()
+    if term.lower() == "all":
+        return None
+    return term or attendance_analytics.current_term()
+
+
+@app.get("/api/teacher/analytics/courses")
+def analytics_courses():
+    """Courses/sections with archived sessions visible to the signed-in teacher. Query: term ("all" for every kept term)."""
+    teacher_id = (session.get("teacher_id") or "").strip()
+    if not teacher_id:
+        return {"ok": False, "error": "Not authenticated"}, 401
+    term = _analytics_term(request.args)
+    return {"ok": True, "term": term, "courses": attendance_stats.courses(teacher_id, term)}
+
+
+@app.get("/api/teacher/analytics/<course_code>")
+def analytics_course(course_code):
+    """Per-student attendance rate, streaks and late arrivals. Query: section, term."""
+    teacher_id = (session.get("teacher_id") or "").strip()
+    if not teacher_id:
+        return {"ok": False, "error": "Not authenticated"}, 401
+    section = (request.args.get("section") or "").strip()
+    report = attendance_stats.course_report(course_code, section, teacher_id, _analytics_term(request.args))
+    if report is None:
+        return {"ok": False, "error": "No analytics for this course/section."}, 404
+    return {"ok": True, **report}
+
+
+@app.get("/api/teacher/analytics/<course_code>/at-risk")
+def analytics_at_risk(course_code):
+    """Students below an attendance rate. Query: section, term, threshold (0-1, default 0.8)."""
+    teacher_id = (session.get("teacher_id") or "").strip()
+    if not teacher_id:
+        return {"ok": False, "error": "Not authenticated"}, 401
+    try:
+        threshold = float(request.args.get("threshold", "0.8"))
+    except ValueError:
+        return {"ok": False, "error": "threshold must be a number between 0 and 1"}, 400
+    if threshold > 1:
+        threshold /= 100.0  # accept percentages too
+    section = (request.args.get("section") or "").strip()
+    term = _analytics_term(request.args)
+    students = attendance_stats.at_risk(course_code, section, threshold, teacher_id, term)
+    if students is None:
+        return {"ok": False, "error": "No analytics for this course/section."}, 404
+    return {
+        "ok": True,
+        "course_code": course_code,
+        "section": section,
+        "term": term or attendance_analytics.current_term(),
+        "threshold": threshold,
+        "students": students,
+    }
+
+
+class _EchoWriter:
+    """File-like target that hands back what csv.writer writes, for streaming rows."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def _export_rows(teacher_id: str, filters: dict, fmt: str):
+    """One line per check-in, walking archives one at a time (newest first)."""
+    writer = csv.writer(_EchoWriter())
+    if fmt == "csv":
+        yield writer.writerow(["session_id", "course_code", "section", "timestamp", "student_id", "name", "status", "time"])
+    for entry in _iter_history_entries(teacher_id, filters):
+        data = attendance_storage.load_history(entry["session_id"])
+        if data is None:
+            continue
+        base = {
+            "session_id": entry["session_id"],
+            "course_code": data.get("course_code") or data.get("course_id") or "",
+            "section": data.get("section") or "",
+            "timestamp": data.get("timestamp") or "",
+        }
+        for sid, info in (data.get("students") or {}).items():
+            record = info if isinstance(info, dict) else {}
+            row = {
+                **base,
+                "student_id": sid,
+                "name": record.get("name") or sid,
+                "status": record.get("status") or "pending",
+                "time": record.get("time") or "",
+            }
+            if fmt == "csv":
+                yield writer.writerow(list(row.values()))
+            else:
+                yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def _export_pivot(teacher_id: str, filters: dict, fmt: str):
+    """
+    One row per student, one column per session (oldest first), plus attendance %.
+    Keeps only the session list and a presence bitmask per student, never the archives.
+    """
+    sessions = [entry["session_id"] for entry in _iter_history_entries(teacher_id, filters)]
+    sessions.reverse()
+    presence: dict = {}  # student_id -> [name, bitmask over sessions]
+    for index, session_id in enumerate(sessions):
+        data = attendance_storage.load_history(session_id) or {}
+        for sid, info in (data.get("students") or {}).items():
+            record = info if isinstance(info, dict) else {}
+            if (record.get("status") or "present") != "present":
+                continue
+            slot = presence.setdefault(sid, [record.get("name") or sid, 0])
+            slot[1] |= 1 << index
+
+    total = len(sessions)
+    writer = csv.writer(_EchoWriter())
+    if fmt == "csv":
+        yield writer.writerow(["student_id", "name", *sessions, "present", "total", "attendance_pct"])
+    for sid in sorted(presence, key=lambda k: (presence[k][0] or k).lower()):
+        name, mask = presence[sid]
+        present = bin(mask).count("1")
+        pct = round(100.0 * present / total, 1) if total else 0.0
+        if fmt == "csv":
+            marks = [1 if mask >> i & 1 else 0 for i in range(total)]
+            yield writer.writerow([sid, name, *marks, present, total, pct])
+        else:
+            attended = [session_id for i, session_id in enumerate(sessions) if mask >> i & 1]
+            row = {"student_id": sid, "name": name, "attended": attended, "present": present, "total": total, "attendance_pct": pct}
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+@app.get("/api/teacher/attendance/export")
+def attendance_bulk_export():
+    """
+    Stream archived sessions as one file.
+    Query: format=csv|ndjson, mode=rows|pivot, plus the history filters (course,
+    section, from, to). rows = one line per check-in; pivot = one line per student.
+    """
+    teacher_id = (session.get("teacher_id") or "").strip()
+    if not teacher_id:
+        return {"ok": False, "error": "Not authenticated"}, 401
+
+    fmt = (request.args.get("format") or "csv").strip().lower()
+    mode = (request.args.get("mode") or "rows").strip().lower()
+    if fmt not in ("csv", "ndjson") or mode not in ("rows", "pivot"):
+        return {"ok": False, "error": "format must be csv|ndjson and mode rows|pivot"}, 400
+    filters, error = _history_filters(request.args)
+    if error:
+        return {"ok": False, "error": error}, 400
+
+    generate = _export_pivot if mode == "pivot" else _export_rows
+    label = "_".join(v for v in (filters["course_code"], filters["section"], filters["date_from"], filters["date_to"]) if v)
+    filename = f"attendance_{mode}{'_' + _clean_session_token(label) if label else ''}.{fmt}"
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return Response(
+        generate(teacher_id, filters, fmt),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}", "Cache-Control": "no-store"},
+    )
+
+
 @app.route("/login", methods=["POST"])
 def login():
-    # Accept credentials, run the scraper, then redirect back to "/".
+    # Accept credentials, queue a scrape if the schedule needs one, then redirect back to "/".
     raw_student_id = (request.form.get("studentId") or "").strip()
     password = request.form.get("password") or ""
     role = (request.form.get("role") or "student").strip().lower()
@@ -672,24 +1630,48 @@ def login():
         abort(400, description="studentId is invalid")
 
     user = get_user(student_id)
-    try:
-        if user:
-            if not verify_local_password(student_id, password):
-                abort(401, description="Invalid credentials")
-            if not _schedule_is_recent(student_id):
-                fetch_and_cache_schedule_from_sis(student_id, password)
-        else:
-            # First login: verify against SIS and create a local account.
-            fetch_and_cache_schedule_from_sis(student_id, password)
-            create_user(student_id, password)
-    except Exception as exc:
-        app.logger.exception("Failed to authenticate or refresh schedule")
-        abort(401, description="Invalid credentials or failed to fetch schedule")
-
-    session["sid"] = student_id
-    session["student_id"] = student_id
-    resp = make_response(redirect(f"/?sid={quote(student_id)}"))
-    resp.set_cookie("sid", student_id, max_age=86400, secure=False, httponly=False, samesite="Lax")
+    job = None
+    refresh_job = None
+    freshness = SCHEDULE_MISSING
+    if user:
+        try:
+            verified = verify_local_password(student_id, password)
+        except password_hashing.HasherBusy:
+            resp = make_response("Too many sign-ins right now; please try again in a moment.", 503)
+            resp.headers["Retry-After"] = "2"
+            return resp
+        if not verified:
+            abort(401, description="Invalid credentials")
+        freshness = _schedule_freshness(student_id)
+        if freshness == SCHEDULE_STALE:
+            # Serve the cached schedule now; the dashboard picks up the refresh later.
+            refresh_job = scrape_queue.submit(student_id, password)
+        elif freshness != SCHEDULE_FRESH:
+            job = scrape_queue.submit(student_id, password)
+        session.pop("pending_sid", None)
+        session.pop("pending_job", None)
+        session["sid"] = student_id
+        session["student_id"] = student_id
+    else:
+        # First login: the SIS scrape verifies the credentials; the local account is
+        # created and the session signed in once the job succeeds (see scrape_job_status).
+        job = scrape_queue.submit(student_id, password, on_success=lambda: create_user(student_id, password))
+        session.pop("sid", None)
+        session.pop("student_id", None)
+        session["pending_sid"] = student_id
+        session["pending_job"] = job.id
+
+    _record_schedule_lookup(freshness)
+
+    target = f"/?sid={quote(student_id)}&freshness={freshness}"
+    if job is not None:
+        target += f"&job={quote(job.id)}"
+    if refresh_job is not None:
+        target += f"&refresh={quote(refresh_job.id)}"
+    resp = make_response(redirect(target))
+    if session.get("sid") == student_id:
+        # A first login gets the cookie from scrape_job_status once its job is done.
+        resp.set_cookie("sid", student_id, max_age=86400, secure=False, httponly=False, samesite="Lax")
     return resp
 
 
@@ -704,6 +1686,13 @@ def logout():
     return resp
 
 
+_rebuild_code_index()
+start_attendance_sweeper()
+
+if SCRAPER_PREWARM:
+    generate_schedule_json.get_browser_pool()
+
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", "5000"))
     app.run(host="0.0.0.0", port=port, debug=True)
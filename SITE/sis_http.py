@@ -0,0 +1,150 @@
+"""
+Browserless SIS scraper: replays the login/timetable/grade flow with plain HTTP.
+
+The SIS is a classic ASP site, so the whole Selenium flow reduces to a form post to
+login.asp followed by GETs of the dynamic "avs…" links. Pages are parsed offline with
+BeautifulSoup and handed to sis_parsers, the same parsers the Selenium engine uses,
+so both engines return identical rows.
+"""
+import time
+from typing import List, Optional
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+import generate_schedule_json as gsj
+from sis_parsers import html_to_tables, parse_grade_tables, parse_timetable_tables
+
+HTTP_TIMEOUT = 20  # seconds per request
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+# One connection pool shared by every scrape; cookies stay per-session (per student).
+_ADAPTER = HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=1)
+
+
+# Shared with the Selenium engine, which raises it for the same condition.
+SISLoginError = gsj.SISLoginError
+
+
+# -------- HTTP flow --------
+class SISHttpScraper:
+    """Same steps as AxiomFlowToPython, without a browser."""
+
+    def __init__(self, creds: gsj.Credentials, base_url: str = gsj.DEFAULT_BASE_URL):
+        self.creds = creds
+        self.base_url = base_url
+        self.http = requests.Session()
+        self.http.mount("http://", _ADAPTER)
+        self.http.mount("https://", _ADAPTER)
+        self.http.headers["User-Agent"] = USER_AGENT
+        self.timings: dict = {}
+
+    def _get(self, url: str, **kwargs) -> requests.Response:
+        resp = self.http.get(url, timeout=HTTP_TIMEOUT, **kwargs)
+        resp.raise_for_status()
+        return resp
+
+    @staticmethod
+    def _soup(resp: requests.Response) -> BeautifulSoup:
+        # Let BeautifulSoup honour the page's <meta charset> (the SIS serves Thai code pages).
+        return BeautifulSoup(resp.content, "html.parser")
+
+    @staticmethod
+    def _link_by_image(soup: BeautifulSoup, base: str, image: str) -> Optional[str]:
+        img = soup.find("img", src=lambda s: bool(s) and image in s)
+        anchor = img.find_parent("a") if img else None
+        if anchor is None or not anchor.get("href"):
+            return None
+        return urljoin(base, anchor["href"])
+
+    @staticmethod
+    def _link_by_href(soup: BeautifulSoup, base: str, fragment: str) -> Optional[str]:
+        anchor = soup.find("a", href=lambda h: bool(h) and fragment in h)
+        return urljoin(base, anchor["href"]) if anchor else None
+
+    def login(self) -> BeautifulSoup:
+        resp = self._get(self.base_url)
+        soup = self._soup(resp)
+        form = None
+        field = soup.find("input", attrs={"name": "f_uid"})
+        if field is not None:
+            form = field.find_parent("form")
+        if form is None:
+            raise RuntimeError("Login form (f_uid) not found on SIS login page")
+
+        data = {}
+        for inp in form.find_all("input"):
+            name = inp.get("name")
+            if not name:
+                continue
+            kind = (inp.get("type") or "text").lower()
+            if kind in ("checkbox", "radio") and not inp.has_attr("checked"):
+                continue
+            if kind in ("image", "button", "reset"):
+                continue
+            data[name] = inp.get("value") or ""
+        data["f_uid"] = self.creds.username
+        data["f_pwd"] = self.creds.password
+
+        action = urljoin(resp.url, form.get("action") or resp.url)
+        if (form.get("method") or "get").lower() == "post":
+            resp = self.http.post(action, data=data, timeout=HTTP_TIMEOUT)
+        else:
+            resp = self.http.get(action, params=data, timeout=HTTP_TIMEOUT)
+        resp.raise_for_status()
+        soup = self._soup(resp)
+        if soup.find("input", attrs={"name": "f_uid"}) is not None:
+            raise SISLoginError("SIS rejected the credentials")
+
+        # Follow the dynamic Go Back link (avsXXXXXXXX) to the student menu, if present.
+        go_back = self._link_by_image(soup, resp.url, "goback_1.gif")
+        if go_back:
+            resp = self._get(go_back)
+            soup = self._soup(resp)
+        self._menu_url = resp.url
+        return soup
+
+    def fetch_timetable(self, menu: BeautifulSoup) -> List[List[str]]:
+        url = self._link_by_image(menu, self._menu_url, "time_table_1.gif") or gsj.TIMETABLE_URL
+        resp = self._get(url)
+        self._timetable_page = self._soup(resp)
+        self._timetable_url = resp.url
+        return parse_timetable_tables(html_to_tables(self._timetable_page))
+
+    def fetch_grades(self, menu: BeautifulSoup) -> List[List[str]]:
+        # Mirror the browser: Go Back from the timetable, then the Grade Results icon.
+        url = None
+        back = self._link_by_image(self._timetable_page, self._timetable_url, "goback_1.gif")
+        if back:
+            resp = self._get(back)
+            page = self._soup(resp)
+            url = self._link_by_image(page, resp.url, "grade_1.gif") or self._link_by_href(page, resp.url, "grade.asp")
+        if not url:
+            url = self._link_by_image(menu, self._menu_url, "grade_1.gif") or self._link_by_href(
+                menu, self._menu_url, "grade.asp"
+            )
+        if not url:
+            raise RuntimeError("Could not find the grade results link")
+        return parse_grade_tables(html_to_tables(self._soup(self._get(url))))
+
+    def run(self) -> tuple[List[List[str]], List[List[str]]]:
+        self.timings = {}
+        try:
+            started = time.perf_counter()
+            menu = self.login()
+            self.timings["login"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            timetable = self.fetch_timetable(menu)
+            self.timings["timetable"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            grades = self.fetch_grades(menu)
+            self.timings["grades"] = time.perf_counter() - started
+            return timetable, grades
+        finally:
+            # Drop this student's cookies; the shared connection pool stays open.
+            self.http.cookies.clear()
+            gsj.stage_timings.record("http", self.timings)
@@ -0,0 +1,486 @@
+"""
+Browser-independent parsers for SIS registrar pages.
+
+Everything here is pure Python over either raw HTML or a table snapshot (the
+structure DOM_SNAPSHOT_JS returns from a live browser), so the Selenium engine, the
+HTTP engine and offline re-parsing of saved pages all share one implementation.
+
+A corpus of saved pages with golden outputs lives in data/sis_corpus/:
+  python sis_parsers.py --check        # compare every page against its golden file
+  python sis_parsers.py --update       # rewrite golden files from the current parsers
+  python sis_parsers.py --bench [N]    # parse throughput in pages/second
+
+tests/test_sis_parsers.py runs the same comparison under pytest.
+"""
+import json
+import os
+import re
+import sys
+import time
+from typing import List, Optional, Union
+
+from bs4 import BeautifulSoup
+from bs4.element import NavigableString, Tag
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(BASE_DIR, "data", "sis_corpus")
+
+# A page as raw HTML, a parsed soup, or already-resolved snapshot tables.
+PageInput = Union[str, bytes, BeautifulSoup, List[List[dict]]]
+
+
+def _normalize_code(code: str) -> str:
+    return (code or "").upper().replace(" ", "").strip()
+
+
+# -------- Table snapshot parsing --------
+def _visible_text(text: Optional[str]) -> str:
+    """Approximate WebElement.text: non-breaking spaces become spaces, lines are trimmed."""
+    if not text:
+        return ""
+    lines = (ln.strip() for ln in text.replace("\xa0", " ").splitlines())
+    return "\n".join(lines).strip()
+
+
+def resolve_dom_snapshot(snapshot: dict) -> List[List[dict]]:
+    """
+    Expand the indexed DOM_SNAPSHOT_JS payload into tables of row dicts:
+      row  = {"text": str, "cells": [cell, ...], "tds": [cell, ...]}
+      cell = {"tag": "td"|"th", "text": str, "colspan": str|None, "a_text": str|None, "a_title": str|None}
+    """
+    if not snapshot:
+        return []
+    cells = []
+    for c in snapshot.get("cells") or []:
+        cells.append(
+            {
+                "tag": c.get("tag") or "td",
+                "text": _visible_text(c.get("text")),
+                "colspan": c.get("colspan"),
+                "a_text": _visible_text(c.get("a_text")) if c.get("a_text") is not None else None,
+                "a_title": c.get("a_title"),
+            }
+        )
+    rows = [
+        {
+            "text": _visible_text(r.get("text")),
+            "cells": [cells[i] for i in r.get("cells") or []],
+            "tds": [cells[i] for i in r.get("tds") or []],
+        }
+        for r in snapshot.get("rows") or []
+    ]
+    return [[rows[i] for i in table] for table in snapshot.get("tables") or []]
+
+
+def parse_largest_table(tables: List[List[dict]]) -> List[List[str]]:
+    """Text of the table with the most direct th/td cells, as a 2D list."""
+    best = None
+    max_cells = 0
+    for rows in tables:
+        count = sum(len(r["cells"]) for r in rows)
+        if count > max_cells:
+            max_cells = count
+            best = rows
+    result: List[List[str]] = []
+    for r in best or []:
+        row = [c["text"] for c in r["cells"]]
+        if any(cell for cell in row):
+            result.append(row)
+    return result
+
+
+def _slot_to_hhmm(slot_idx: int, base_hour: int = 9, minutes_per_slot: int = 5) -> str:
+    total_minutes = base_hour * 60 + slot_idx * minutes_per_slot
+    return f"{total_minutes // 60:02d}:{total_minutes % 60:02d}"
+
+
+def expand_rooms(rooms_str: str) -> List[str]:
+    """Expand shorthand room ranges: "308-9" -> ["308", "309"], "201-202" -> ["201", "202"]."""
+    room_parts = rooms_str.split("-") if rooms_str else []
+    if not room_parts:
+        return []
+    base = room_parts[0]
+    rooms: List[str] = [base]
+    for p in room_parts[1:]:
+        if len(p) < len(base):
+            rooms.append(base[: len(base) - len(p)] + p)
+        else:
+            rooms.append(p)
+    # Deduplicate preserving order
+    seen = set()
+    ordered = []
+    for r in rooms:
+        if r not in seen:
+            seen.add(r)
+            ordered.append(r)
+    return ordered
+
+
+def _format_location(cell_text: str, course_code: str) -> str:
+    """Format "B-ROOM" / "B-ROOM-ROOM" cell text as "Building B Room R1, R2"."""
+    # Lines inside the cell often are:
+    #   <code> (from link)
+    #   (x) y, B-ROOM or B-ROOM-ROOM
+    #   B   (building number again on its own line)
+    lines = [ln.strip() for ln in cell_text.splitlines() if ln.strip()]
+
+    # Building: prefer last non-empty line numeric
+    building = ""
+    if lines:
+        nums = re.findall(r"\d+", lines[-1])
+        if nums:
+            building = nums[-1]
+
+    # Find a hyphen group in the cell that is NOT the course code
+    hyphen_groups = re.findall(r"\b\d+-\d+(?:-\d+)?\b", cell_text)
+    hyphen_groups = [g for g in hyphen_groups if _normalize_code(g) != _normalize_code(course_code)]
+
+    rooms_display = ""
+    if hyphen_groups:
+        candidate = hyphen_groups[0]
+        # Remove building prefix if present
+        if building and candidate.startswith(f"{building}-"):
+            rooms_str = candidate[len(building) + 1 :]
+        else:
+            parts = candidate.split("-", 1)
+            rooms_str = parts[1] if len(parts) > 1 else candidate
+
+        rooms_display = ", ".join(expand_rooms(rooms_str))
+
+    if building and rooms_display:
+        return f"Building {building} Room {rooms_display}"
+    if building:
+        return f"Building {building}"
+    if rooms_display:
+        return f"Room {rooms_display}"
+    return ""
+
+
+def parse_timetable_tables(tables: List[List[dict]]) -> List[List[str]]:
+    """
+    Build [day, location, course_name, start_time, end_time, course_code] rows from the
+    weekly grid (the table whose second row is the DAY/TIME header).
+
+    - Derives start/end from cell colspans (5-min slots) starting 09:00.
+    - Extracts course name from the anchor title; code from anchor text.
+    - Formats location as "Building X Room YYY" from text like "2-202" or "2-308-9".
+
+    When several tables match, the one with the fewest rows is used. The Selenium-only
+    parser this replaced took the first match, which on a page that wraps the grid in
+    a layout table is the wrapper: its rows include the grid's, so every class came
+    out twice, once with nonsense times.
+    """
+    candidates = []
+    for trs in tables:
+        if len(trs) < 3:
+            continue
+        header_txt = " ".join(trs[1]["text"].split()).upper()
+        if "DAY/TIME" in header_txt and "9:00-10:00" in header_txt:
+            candidates.append(trs)
+    if not candidates:
+        return []
+    # A layout table wrapping the grid matches too (its rows include the grid's rows);
+    # the grid itself is the candidate with the fewest rows.
+    grid = min(candidates, key=len)
+
+    out: List[List[str]] = [["day", "location", "course_name", "start_time", "end_time", "course_code"]]
+    day_names = {"MON": "Mon", "TUE": "Tue", "WED": "Wed", "THU": "Thu", "FRI": "Fri", "SAT": "Sat", "SUN": "Sun"}
+
+    for tr in grid:
+        tds = tr["tds"]
+        if not tds:
+            continue
+        # Identify day cell (first td often with day label)
+        day_cell_text = tds[0]["text"].upper()
+        day_key = next((key for key in day_names if key in day_cell_text), None)
+        if not day_key:
+            continue
+        day_label = day_names[day_key]
+
+        # current slot index from 09:00, counted after the day label cell
+        current_slot = 0
+        for td in tds[1:]:
+            try:
+                span = int(td["colspan"] or "1")
+            except Exception:
+                span = 1
+
+            # A class block typically has a link with the course code and colored background
+            if td["a_text"] is not None:
+                course_code = td["a_text"].strip()
+                course_name = td["a_title"] or ""
+                location = _format_location(td["text"], course_code)
+                out.append(
+                    [
+                        day_label,
+                        location,
+                        course_name,
+                        _slot_to_hhmm(current_slot),
+                        _slot_to_hhmm(current_slot + span),
+                        course_code,
+                    ]
+                )
+
+            # advance slots by the colspan regardless
+            current_slot += span
+
+    return out
+
+
+_EXAM_HEADER_KEYWORDS = ("COURSECODE", "COURSENAME", "GROUP", "MIDTERM", "FINALS", "SEAT")
+
+
+def parse_exam_tables(tables: List[List[dict]]) -> List[List[str]]:
+    """Rows [coursecode, coursename, group, midterm, finals, seat] from the EXAM TIMETABLE grid."""
+    for trs in tables:
+        if not trs:
+            continue
+        # Look for header keywords in either of the first two rows
+        headers = [" ".join(tr["text"].split()).upper() for tr in trs[:2]]
+        header_idx = next((i for i, h in enumerate(headers) if all(k in h for k in _EXAM_HEADER_KEYWORDS)), None)
+        if header_idx is None:
+            continue
+        rows_out: List[List[str]] = [["coursecode", "coursename", "group", "midterm", "finals", "seat"]]
+        for tr in trs[header_idx + 1 :]:
+            tds = tr["tds"]
+            if len(tds) < 6:
+                continue
+            vals = [td["text"].strip().replace("\xa0", " ") for td in tds[:6]]
+            # Normalize course code cell (remove surrounding spaces)
+            vals[0] = vals[0].replace(" ", "")
+            rows_out.append(vals)
+        return rows_out
+    return []
+
+
+def parse_grade_tables(tables: List[List[dict]]) -> List[List[str]]:
+    """
+    Rows [section, coursecode, coursename, credit, grade] from every grade table.
+    Sections include 'TRANSFER COURSE' and 'SEMESTER X/YYYY'.
+    """
+    rows_out: List[List[str]] = [["section", "coursecode", "coursename", "credit", "grade"]]
+    for trs in tables:
+        # Identify if this table is a grade table by header presence
+        header_found = False
+        section_label = ""
+        start_idx = 0
+        for idx, tr in enumerate(trs):
+            txt = tr["text"].strip().upper()
+            if not txt:
+                continue
+            # Section row often has bold title and colspan=4
+            if ("TRANSFER COURSE" in txt) or ("SEMESTER" in txt):
+                section_label = tr["text"].strip()
+                continue
+            # Header row with column labels
+            if ("COURSECODE" in txt) and ("COURSENAME" in txt) and ("CREDIT" in txt) and ("GRADE" in txt):
+                header_found = True
+                start_idx = idx + 1
+                break
+        if not header_found:
+            continue
+
+        # Collect subsequent data rows until a row that looks like a new section/header
+        for tr in trs[start_idx:]:
+            tds = [c for c in tr["cells"] if c["tag"] == "td"]
+            if len(tds) < 4:
+                continue
+            text_up = tr["text"].strip().upper()
+            if ("COURSECODE" in text_up and "COURSENAME" in text_up) or ("SEMESTER" in text_up) or ("TRANSFER COURSE" in text_up):
+                break
+
+            code = tds[0]["text"].strip().lstrip("\xa0 ")
+            name = tds[1]["text"].strip()
+            credit = tds[2]["text"].strip()
+            grade = tds[3]["text"].strip().lstrip("\xa0 ")
+            if not (code or name or credit or grade):
+                continue
+            rows_out.append([section_label, code, name, credit, grade])
+    return rows_out
+
+
+# -------- HTML -> table snapshot --------
+_BLOCK_TAGS = {"p", "div", "table", "tbody", "thead", "tfoot", "tr", "li", "ul", "ol", "form", "center", "h1", "h2", "h3", "h4"}
+
+
+def _inner_text(el: Tag) -> str:
+    """Rough HTMLElement.innerText: collapse whitespace, <br> and block tags break lines, cells tab-separate."""
+    parts: List[str] = []
+
+    def walk(node):
+        for child in node.children:
+            if isinstance(child, NavigableString):
+                if child.__class__.__name__ in ("Comment", "Doctype", "Declaration", "ProcessingInstruction"):
+                    continue
+                parts.append(re.sub(r"[ \t\r\n\f]+", " ", str(child)))
+            elif isinstance(child, Tag):
+                if child.name in ("script", "style"):
+                    continue
+                if child.name == "br":
+                    parts.append("\n")
+                    continue
+                block = child.name in _BLOCK_TAGS
+                if block:
+                    parts.append("\n")
+                walk(child)
+                if block:
+                    parts.append("\n")
+                elif child.name in ("td", "th"):
+                    parts.append("\t")
+
+    walk(el)
+    return "".join(parts)
+
+
+def html_to_tables(html: Union[str, bytes, BeautifulSoup]) -> List[List[dict]]:
+    """Parse an SIS page into the resolved table structure used by the parse_* functions."""
+    soup = html if isinstance(html, BeautifulSoup) else BeautifulSoup(html, "html.parser")
+    trs = soup.find_all("tr")
+    cells = soup.find_all(["td", "th"])
+    tr_index = {id(el): i for i, el in enumerate(trs)}
+    cell_index = {id(el): i for i, el in enumerate(cells)}
+
+    snapshot_cells = []
+    for c in cells:
+        a = c.find("a")
+        snapshot_cells.append(
+            {
+                "tag": c.name,
+                "text": _inner_text(c),
+                "colspan": c.get("colspan"),
+                "a_text": _inner_text(a) if a is not None else None,
+                "a_title": a.get("title") if a is not None else None,
+            }
+        )
+    snapshot = {
+        "tables": [[tr_index[id(tr)] for tr in t.find_all("tr")] for t in soup.find_all("table")],
+        "rows": [
+            {
+                "text": _inner_text(tr),
+                "cells": [cell_index[id(c)] for c in tr.find_all(["td", "th"], recursive=False)],
+                "tds": [cell_index[id(c)] for c in tr.find_all("td")],
+            }
+            for tr in trs
+        ],
+        "cells": snapshot_cells,
+    }
+    return resolve_dom_snapshot(snapshot)
+
+
+# -------- Public entry points --------
+def _tables(page: PageInput) -> List[List[dict]]:
+    if isinstance(page, list):
+        return page
+    return html_to_tables(page)
+
+
+def parse_timetable(page: PageInput) -> List[List[str]]:
+    """[day, location, course_name, start_time, end_time, course_code] rows from a timetable page."""
+    return parse_timetable_tables(_tables(page))
+
+
+def parse_exams(page: PageInput) -> List[List[str]]:
+    """[coursecode, coursename, group, midterm, finals, seat] rows from a timetable page."""
+    return parse_exam_tables(_tables(page))
+
+
+def parse_grades(page: PageInput) -> List[List[str]]:
+    """[section, coursecode, coursename, credit, grade] rows from a grade results page."""
+    return parse_grade_tables(_tables(page))
+
+
+def parse_page(page: PageInput) -> dict:
+    """Run every parser over one page (tables are extracted once)."""
+    tables = _tables(page)
+    return {
+        "timetable": parse_timetable_tables(tables),
+        "exams": parse_exam_tables(tables),
+        "grades": parse_grade_tables(tables),
+    }
+
+
+# -------- Golden corpus --------
+def _corpus_pages(corpus_dir: str = CORPUS_DIR) -> List[str]:
+    if not os.path.isdir(corpus_dir):
+        return []
+    return sorted(os.path.join(corpus_dir, f) for f in os.listdir(corpus_dir) if f.endswith(".html"))
+
+
+def _golden_path(page_path: str) -> str:
+    return page_path[: -len(".html")] + ".golden.json"
+
+
+def check_corpus(update: bool = False, corpus_dir: str = CORPUS_DIR) -> List[str]:
+    """Parse every corpus page and compare with its golden file; returns the mismatching pages."""
+    failures = []
+    for path in _corpus_pages(corpus_dir):
+        with open(path, "rb") as f:
+            result = parse_page(f.read())
+        golden = _golden_path(path)
+        if update:
+            with open(golden, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+                f.write("\n")
+            continue
+        try:
+            with open(golden, "r", encoding="utf-8") as f:
+                expected = json.load(f)
+        except FileNotFoundError:
+            failures.append(os.path.basename(path))
+            continue
+        if result != expected:
+            failures.append(os.path.basename(path))
+    return failures
+
+
+def benchmark_parse(rounds: int = 50, corpus_dir: str = CORPUS_DIR) -> dict:
+    """Parse the whole corpus `rounds` times; reports pages/second for HTML and pre-extracted input."""
+    pages = []
+    for path in _corpus_pages(corpus_dir):
+        with open(path, "rb") as f:
+            pages.append(f.read())
+    if not pages:
+        return {"pages": 0}
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for html in pages:
+            parse_page(html)
+    html_elapsed = time.perf_counter() - started
+
+    extracted = [html_to_tables(html) for html in pages]
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for tables in extracted:
+            parse_page(tables)
+    tables_elapsed = time.perf_counter() - started
+
+    total = rounds * len(pages)
+    return {
+        "pages": total,
+        "html_pages_per_s": round(total / html_elapsed, 1),
+        "snapshot_pages_per_s": round(total / tables_elapsed, 1),
+    }
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if "--bench" in args:
+        idx = args.index("--bench")
+        rounds = int(args[idx + 1]) if len(args) > idx + 1 and args[idx + 1].isdigit() else 50
+        print(json.dumps(benchmark_parse(rounds), indent=2))
+    elif "--update" in args:
+        check_corpus(update=True)
+        print(f"Updated golden files in {CORPUS_DIR}")
+    elif "--check" in args:
+        failed = check_corpus()
+        pages = len(_corpus_pages())
+        if failed:
+            print(f"{len(failed)}/{pages} corpus pages differ from golden output: {', '.join(failed)}")
+            sys.exit(1)
+        print(f"All {pages} corpus pages match their golden output.")
+    else:
+        # Parse arbitrary saved pages: python sis_parsers.py page.html [...]
+        for path in args:
+            with open(path, "rb") as f:
+                print(json.dumps(parse_page(f.read()), ensure_ascii=False, indent=2))
@@ -0,0 +1,44 @@
+"""Concurrent check-ins lose nothing, on either attendance backend."""
+import threading
+
+import pytest
+
+import bench_attendance
+
+BACKENDS = ("json", "sqlite")
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_parallel_checkins_through_server_are_all_kept(backend):
+    outcome = bench_attendance.stress(100, backend)
+    assert outcome["accepted"] == outcome["recorded"] == outcome["archived"] == 100
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_checkins_racing_a_stop_are_archived_or_refused(tmp_path, backend):
+    store = bench_attendance._open_store(backend, str(tmp_path))
+    store.save_session("S", {"session_id": "S", "active": True, "timestamp": "2026-10-17T02:00:00", "students": {}})
+    accepted = []
+    barrier = threading.Barrier(41)
+
+    def check_in(n):
+        barrier.wait()
+        try:
+            store.record_checkin("S", f"66{n:08d}", {"name": "", "status": "present", "time": "09:00"})
+        except KeyError:
+            return
+        accepted.append(f"66{n:08d}")
+
+    def stop():
+        barrier.wait()
+        store.archive_session("S", store.stop_session("S", {"stopped_at": "2026-10-17T03:00:00"}))
+
+    threads = [threading.Thread(target=check_in, args=(n,)) for n in range(40)] + [threading.Thread(target=stop)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(store.load_history("S")["students"]) == sorted(accepted)
+    with pytest.raises(KeyError):
+        store.record_checkin("S", "late", {"name": "", "status": "present", "time": "09:30"})
@@ -0,0 +1,37 @@
+"""The SIS parsers against the saved pages in data/sis_corpus/ and their golden output."""
+import json
+import os
+
+import pytest
+
+import sis_parsers
+
+PAGES = sis_parsers._corpus_pages()
+
+
+def test_corpus_is_present():
+    assert PAGES
+
+
+@pytest.mark.parametrize("path", PAGES, ids=os.path.basename)
+def test_page_matches_golden_output(path):
+    with open(path, "rb") as f:
+        result = sis_parsers.parse_page(f.read())
+    with open(sis_parsers._golden_path(path), "r", encoding="utf-8") as f:
+        assert result == json.load(f)
+
+
+def test_check_corpus_reports_no_mismatch():
+    assert sis_parsers.check_corpus() == []
+
+
+def test_timetable_inside_layout_table_is_parsed_once():
+    # The layout table wrapping the grid matches the DAY/TIME header too, and lists
+    # the grid's rows among its own; the grid (fewest rows) must win.
+    with open(os.path.join(sis_parsers.CORPUS_DIR, "time_table_nested_layout.html"), "rb") as f:
+        rows = sis_parsers.parse_timetable(f.read())
+    classes = rows[1:]
+    assert classes
+    # Each class meets once a week on this page; the wrapper would add a garbled copy of each.
+    assert len({row[5] for row in classes}) == len(classes)
+    assert all("09:00" <= row[3] < row[4] <= "21:00" for row in classes)
